@@ -11,9 +11,117 @@ SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY", "")
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
 SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET", "")
+SUPABASE_JWKS_URL = os.getenv(
+    "SUPABASE_JWKS_URL",
+    f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json" if SUPABASE_URL else "",
+)
+
+# Verified tokens are cached until they expire; with the revocation check on,
+# each new token is also confirmed with Supabase Auth once
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+AUTH_REVOCATION_CHECK = os.getenv("AUTH_REVOCATION_CHECK", "false").lower() == "true"
+
+# Rate limits are kept per signed-in user (per IP otherwise) in this storage:
+# "memory://" is per process, "redis://host:6379" shares them across workers
+# (needs the redis package). LLM routes also draw on a per-user budget of
+# estimated prompt tokens per minute
+RATE_LIMIT_STORAGE_URI = os.getenv("RATE_LIMIT_STORAGE_URI", "memory://")
+RATE_LIMIT_STRATEGY = os.getenv("RATE_LIMIT_STRATEGY", "sliding-window-counter")
+RATE_LIMIT_LLM_TOKENS_PER_MINUTE = int(os.getenv("RATE_LIMIT_LLM_TOKENS_PER_MINUTE", "100000"))
 
 LLM_PROVIDER = os.getenv("LLM_PROVIDER", "groq")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
 GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+
+# Comma-separated provider list (e.g. "groq,gemini,anthropic"); by default
+# LLM_PROVIDER plus every other provider with an API key. Calls go to the
+# fastest healthy one; a provider that errors or gives no first token within
+# LLM_FALLBACK_TIMEOUT_SECONDS hands over to the next. With LLM_HEDGE a slow
+# primary (past its p95 time to first token, LLM_HEDGE_DELAY_SECONDS until
+# measured) is raced against the next provider, for at most
+# LLM_HEDGE_MAX_RATIO of calls
+LLM_PROVIDERS = os.getenv("LLM_PROVIDERS", "")
+LLM_FALLBACK_TIMEOUT_SECONDS = float(os.getenv("LLM_FALLBACK_TIMEOUT_SECONDS", "30"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "false").lower() == "true"
+LLM_HEDGE_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DELAY_SECONDS", "2"))
+LLM_HEDGE_MAX_RATIO = float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1"))
+# A provider's circuit opens when its error rate (EWMA) reaches this, sheds
+# traffic for the cooldown, then closes after this many good probe calls
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "10"))
+LLM_BREAKER_PROBES = int(os.getenv("LLM_BREAKER_PROBES", "3"))
+
+# "topology" = LLM omits coordinates and the server lays out the graph,
+# "coordinates" = LLM places nodes itself (positioning rules in the prompt)
+LLM_LAYOUT_MODE = os.getenv("LLM_LAYOUT_MODE", "topology")
+
+# Modify prompts on large graphs only include the part relevant to the
+# request: a LLM_CONTEXT_HOPS-deep neighbourhood capped at this many tokens
+LLM_CONTEXT_TOKEN_BUDGET = int(os.getenv("LLM_CONTEXT_TOKEN_BUDGET", "3000"))
+LLM_CONTEXT_HOPS = int(os.getenv("LLM_CONTEXT_HOPS", "1"))
+
+# Exact-match LLM response cache (identical prompt, graph and history);
+# LLM_CACHE_TTL_SECONDS=0 disables it
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+# Identical streams in flight share one upstream call, which is paused while
+# its slowest reader is this many events behind
+LLM_STREAM_MAX_LAG = int(os.getenv("LLM_STREAM_MAX_LAG", "128"))
+
+# Iteration edits are appended to an op log; after this many ops the log is
+# folded into a fresh nodes/edges snapshot
+ITERATION_SNAPSHOT_EVERY = int(os.getenv("ITERATION_SNAPSHOT_EVERY", "50"))
+
+# Dashboard thumbnails are drawn from at most this many nodes per project
+PREVIEW_MAX_NODES = int(os.getenv("PREVIEW_MAX_NODES", "64"))
+
+# Read-through cache of loaded iterations (in-process LRU), dropped on every
+# write; with several workers it needs a shared CacheBackend to stay current
+ITERATION_CACHE_MAX_ENTRIES = int(os.getenv("ITERATION_CACHE_MAX_ENTRIES", "256"))
+ITERATION_CACHE_TTL_SECONDS = float(os.getenv("ITERATION_CACHE_TTL_SECONDS", "600"))
+
+# JSON bodies at least this large are sent brotli/gzip-compressed when the
+# client accepts it (SSE streams never are)
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+
+# SSE token frames are merged over this window (ms) or until this many
+# bytes; SSE_COALESCE_MS=0 sends every token as it arrives
+SSE_COALESCE_MS = float(os.getenv("SSE_COALESCE_MS", "40"))
+SSE_COALESCE_BYTES = int(os.getenv("SSE_COALESCE_BYTES", "1024"))
+# Comment frame sent on idle streams so proxies keep the connection open
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+# Last-Event-ID resume: frames kept per stream, streams kept, and how long
+# a stream keeps generating with no client attached before the upstream
+# LLM call is cancelled
+SSE_REPLAY_FRAMES = int(os.getenv("SSE_REPLAY_FRAMES", "256"))
+SSE_REPLAY_STREAMS = int(os.getenv("SSE_REPLAY_STREAMS", "512"))
+SSE_RESUME_GRACE_SECONDS = float(os.getenv("SSE_RESUME_GRACE_SECONDS", "2"))
+
+# Connection pool of the provider SDK clients, built once in the app lifespan.
+# With LLM_WARMUP the pool connects at startup so the first request after a
+# deploy does not pay for DNS/TLS setup
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20"))
+LLM_HTTP_KEEPALIVE_SECONDS = float(os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", "60"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true"
+LLM_WARMUP = os.getenv("LLM_WARMUP", "true").lower() == "true"
+LLM_WARMUP_TIMEOUT_SECONDS = float(os.getenv("LLM_WARMUP_TIMEOUT_SECONDS", "5"))
+
+# Upstream LLM calls in flight at once; the rest queue fairly per client
+# (streams ahead of reviews) and get a 429 with Retry-After when they would
+# not start within LLM_QUEUE_TIMEOUT_SECONDS or LLM_MAX_QUEUE are waiting
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "256"))
+
+# Client-side pacing per provider and model. Budgets follow the providers'
+# rate-limit headers; LLM_QUOTA_RPM/TPM (0 = unknown) are the starting
+# limits until then, and the only ones for Gemini, which sends none. A
+# 429/529 is retried up to LLM_RETRY_ATTEMPTS times with jittered backoff
+# while the call can still go out within LLM_RETRY_BUDGET_SECONDS
+LLM_QUOTA_RPM = float(os.getenv("LLM_QUOTA_RPM", "0"))
+LLM_QUOTA_TPM = float(os.getenv("LLM_QUOTA_TPM", "0"))
+LLM_RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", "3"))
+LLM_RETRY_BUDGET_SECONDS = float(os.getenv("LLM_RETRY_BUDGET_SECONDS", "20"))
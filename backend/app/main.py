@@ -1,23 +1,45 @@
 from __future__ import annotations
 import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
-from app.config import CORS_ORIGINS
+from app.config import CORS_ORIGINS, LLM_WARMUP, RESPONSE_COMPRESS_MIN_BYTES
 from app.routes.graph import router as graph_router
 from app.routes.persistence import router as persistence_router
 from app.routes.projects import router as projects_router
-from app.middleware.errors import error_handler
-from app.middleware.rate_limit import limiter
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.errors import error_handler, overloaded_handler
+from app.middleware.rate_limit import limiter, rate_limit_exceeded_handler
+from app.responses import FastJSONResponse
+from app.services.llm import close_provider, flights, get_provider, open_provider, response_cache, scheduler
+from app.services.projects import iteration_cache
+from app.services.scheduler import Overloaded
+from app.services.sse import replays
 
 logging.basicConfig(level=logging.INFO)
 
-app = FastAPI(title="Arch API", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Provider SDK clients (and their connection pools) live for the process
+    await open_provider(warmup=LLM_WARMUP)
+    yield
+    await close_provider()
+
+
+app = FastAPI(
+    title="Arch API",
+    version="0.1.0",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan,
+)
 
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
+app.add_exception_handler(Overloaded, overloaded_handler)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,7 +47,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Retry-After"],
 )
+app.add_middleware(CompressionMiddleware, minimum_size=RESPONSE_COMPRESS_MIN_BYTES)
 
 app.middleware("http")(error_handler)
 
@@ -36,4 +60,19 @@ app.include_router(projects_router)
 
 @app.get("/health")
 async def health():
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "provider": get_provider().snapshot(),
+        "prompt_cache": get_provider().cache_stats.snapshot(),
+        "response_cache": response_cache.snapshot(),
+        "single_flight": flights.snapshot(),
+        "scheduler": scheduler.snapshot(),
+        "iteration_cache": iteration_cache.snapshot(),
+        "sse": replays.snapshot(),
+    }
+
+
+@app.get("/health/providers")
+async def provider_health():
+    """Routing state: per-provider latency/error EWMAs and circuit breakers."""
+    return get_provider().snapshot()
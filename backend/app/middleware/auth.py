@@ -1,35 +1,143 @@
 from __future__ import annotations
+import asyncio
+import hashlib
 import logging
+import time
+from collections import OrderedDict
+
+import jwt
 from fastapi import Request, HTTPException
-from supabase import create_client
-from app.config import SUPABASE_URL, SUPABASE_KEY
+from supabase import acreate_client, AsyncClient
+
+from app.config import (
+    AUTH_CACHE_MAX_ENTRIES,
+    AUTH_REVOCATION_CHECK,
+    SUPABASE_JWKS_URL,
+    SUPABASE_JWT_SECRET,
+    SUPABASE_KEY,
+    SUPABASE_URL,
+)
 
 logger = logging.getLogger(__name__)
 
-_client = None
+_client: AsyncClient | None = None
+_client_lock = asyncio.Lock()
 
-def _get_client():
+
+async def _get_client() -> AsyncClient:
     global _client
     if _client is None:
-        if not SUPABASE_URL or not SUPABASE_KEY:
-            raise RuntimeError("SUPABASE_URL and SUPABASE_KEY must be set")
-        _client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        async with _client_lock:
+            if _client is None:
+                if not SUPABASE_URL or not SUPABASE_KEY:
+                    raise RuntimeError("SUPABASE_URL and SUPABASE_KEY must be set")
+                _client = await acreate_client(SUPABASE_URL, SUPABASE_KEY)
     return _client
 
 
+# ── Local verification ────────────────────────────────────
+
+_ASYMMETRIC_ALGORITHMS = ["RS256", "ES256"]
+_jwks_client = jwt.PyJWKClient(SUPABASE_JWKS_URL, cache_keys=True) if SUPABASE_JWKS_URL else None
+
+
+async def _verify_locally(token: str) -> dict | None:
+    """Check signature, expiry and audience. HS256 tokens are verified with
+    SUPABASE_JWT_SECRET, RS256/ES256 tokens against the project's JWKS.
+    Returns None when no key is configured for the token's algorithm."""
+    alg = jwt.get_unverified_header(token).get("alg")
+    if alg == "HS256" and SUPABASE_JWT_SECRET:
+        key = SUPABASE_JWT_SECRET
+    elif alg in _ASYMMETRIC_ALGORITHMS and _jwks_client:
+        # PyJWKClient fetches over blocking HTTP, but only on a key cache miss
+        key = (await asyncio.to_thread(_jwks_client.get_signing_key_from_jwt, token)).key
+    else:
+        return None
+    return jwt.decode(
+        token, key, algorithms=[alg], audience="authenticated",
+        options={"require": ["exp", "sub"]},
+    )
+
+
+async def _verify_remotely(token: str) -> str:
+    """Ask Supabase Auth about the token (also catches revoked sessions)."""
+    client = await _get_client()
+    response = await client.auth.get_user(token)
+    if not response.user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return response.user.id
+
+
+# ── Verified token cache ──────────────────────────────────
+# sha256(token) -> (exp, user_id); entries expire with the token itself
+
+_verified: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+
+def _cached_user(token_hash: str) -> str | None:
+    entry = _verified.get(token_hash)
+    if entry is None:
+        return None
+    exp, user_id = entry
+    if exp <= time.time():
+        del _verified[token_hash]
+        return None
+    _verified.move_to_end(token_hash)
+    return user_id
+
+
+def _remember(token_hash: str, exp: float, user_id: str) -> None:
+    _verified[token_hash] = (exp, user_id)
+    _verified.move_to_end(token_hash)
+    while len(_verified) > AUTH_CACHE_MAX_ENTRIES:
+        _verified.popitem(last=False)
+
+
 async def get_current_user(request: Request) -> str:
-    """Validate Supabase JWT and return user_id."""
+    """Validate Supabase JWT and return user_id.
+
+    Tokens are verified locally (SUPABASE_JWT_SECRET or the project JWKS)
+    and then cached until they expire. AUTH_REVOCATION_CHECK=true also asks
+    Supabase once per new token. Tokens that cannot be verified locally are
+    checked with Supabase on every request, as before.
+    """
+    user_id = await _authenticate(request)
+    # Rate limits are kept per user (see rate_limit_key)
+    request.state.user_id = user_id
+    return user_id
+
+
+async def get_optional_user(request: Request) -> str | None:
+    """user_id for a valid bearer token, else None; for public routes."""
+    if not request.headers.get("Authorization", "").startswith("Bearer "):
+        return None
+    try:
+        return await get_current_user(request)
+    except HTTPException:
+        return None
+
+
+async def _authenticate(request: Request) -> str:
     auth_header = request.headers.get("Authorization", "")
     if not auth_header.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
 
     token = auth_header[7:]
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    user_id = _cached_user(token_hash)
+    if user_id is not None:
+        return user_id
+
     try:
-        client = _get_client()
-        response = client.auth.get_user(token)
-        if not response.user:
+        claims = await _verify_locally(token)
+        if claims is None:
+            return await _verify_remotely(token)
+
+        user_id = claims["sub"]
+        if AUTH_REVOCATION_CHECK and await _verify_remotely(token) != user_id:
             raise HTTPException(status_code=401, detail="Invalid token")
-        return response.user.id
+        _remember(token_hash, float(claims["exp"]), user_id)
+        return user_id
     except HTTPException:
         raise
     except Exception as e:
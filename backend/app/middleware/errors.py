@@ -3,6 +3,8 @@ import logging
 from fastapi import Request
 from fastapi.responses import JSONResponse
 
+from app.services.scheduler import Overloaded
+
 logger = logging.getLogger(__name__)
 
 
@@ -15,3 +17,12 @@ async def error_handler(request: Request, call_next):
             status_code=500,
             content={"detail": "Internal server error"},
         )
+
+
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """No LLM capacity within the queue deadline: 429, not a slow 502."""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
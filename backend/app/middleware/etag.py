@@ -0,0 +1,76 @@
+from __future__ import annotations
+import hashlib
+
+import orjson
+
+from fastapi import Request, Response
+
+# Clients may keep a copy but must revalidate it (If-None-Match) before use
+REVALIDATE = "private, no-cache"
+
+
+def version_etag(version: int) -> str:
+    """Strong ETag for a resource with a server-assigned version."""
+    return f'"v{version}"'
+
+
+def content_etag(payload) -> str:
+    """Strong ETag from the JSON content, for resources without a version."""
+    raw = orjson.dumps(payload, option=orjson.OPT_SORT_KEYS, default=str)
+    return '"' + hashlib.sha256(raw).hexdigest()[:32] + '"'
+
+
+# Content codings CompressionMiddleware may apply
+_CODINGS = ("br", "gzip")
+
+
+def encoded_etag(etag: str, coding: str) -> str:
+    """ETag of the ``coding``-compressed representation of ``etag``'s body.
+
+    Each encoding is a different representation and must not share a
+    strong validator with the others, so its name is appended (``"v12"``
+    becomes ``"v12-br"``). Weak ETags are kept as they are.
+    """
+    if etag.startswith("W/") or not etag.endswith('"'):
+        return etag
+    return f'{etag[:-1]}-{coding}"'
+
+
+def _identity_etag(tag: str) -> str:
+    """``tag`` without the suffix added by encoded_etag."""
+    for coding in _CODINGS:
+        suffix = f'-{coding}"'
+        if tag.endswith(suffix):
+            return tag[: -len(suffix)] + '"'
+    return tag
+
+
+def not_modified(request: Request, etag: str) -> Response | None:
+    """A 304 response when If-None-Match matches ``etag``, else None.
+
+    Tags of any compressed representation of ``etag`` match as well.
+    """
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return None
+    # Weak comparison, as RFC 9110 specifies for If-None-Match
+    candidates = {_identity_etag(tag.strip().removeprefix("W/")) for tag in header.split(",")}
+    if "*" in candidates or etag in candidates:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": REVALIDATE})
+    return None
+
+
+def if_match_version(request: Request) -> int | None:
+    """Version required by the If-Match header, or None when there is none.
+
+    ``*`` only requires that the resource exists and is treated as absent.
+    The ETag of a compressed representation names the same version. An
+    ETag this server did not issue can never match, so it yields -1.
+    """
+    header = request.headers.get("If-Match")
+    if not header or header.strip() == "*":
+        return None
+    tag = _identity_etag(header.split(",")[0].strip())
+    if tag.startswith('"v') and tag.endswith('"') and tag[2:-1].isdigit():
+        return int(tag[2:-1])
+    return -1
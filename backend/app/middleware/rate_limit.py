@@ -1,6 +1,96 @@
 from __future__ import annotations
+import logging
+import math
+import time
 
+from fastapi import Request
+from fastapi.responses import JSONResponse
 from slowapi import Limiter
+from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
 
-limiter = Limiter(key_func=get_remote_address)
+from app.config import (
+    RATE_LIMIT_LLM_TOKENS_PER_MINUTE,
+    RATE_LIMIT_STORAGE_URI,
+    RATE_LIMIT_STRATEGY,
+)
+from app.services.sse import replays
+
+logger = logging.getLogger(__name__)
+
+# Cost unit of the shared LLM budget, in estimated prompt tokens
+_TOKENS_PER_UNIT = 1000
+_LLM_UNITS = max(1, RATE_LIMIT_LLM_TOKENS_PER_MINUTE // _TOKENS_PER_UNIT)
+
+# Per-user budget shared by every route that calls the LLM
+LLM_BUDGET = f"{_LLM_UNITS}/minute"
+
+
+def rate_limit_key(request: Request) -> str:
+    """The authenticated user (see get_current_user), else the client IP.
+
+    Users behind one NAT get a budget each; anonymous clients share their
+    address's.
+    """
+    user_id = getattr(request.state, "user_id", None)
+    if user_id:
+        return f"user:{user_id}"
+    return f"ip:{get_remote_address(request)}"
+
+
+def llm_cost(request: Request) -> int:
+    """Estimated prompt tokens of a request, in budget units.
+
+    The body (prompt, history, graph) is what ends up in the prompt, at
+    roughly 4 bytes per token, so it is judged by Content-Length without
+    reading it. Capped at the whole budget so the largest request still
+    fits into an empty one; a body of unknown size (chunked, or a bad
+    header) is charged that cap.
+    """
+    try:
+        size = int(request.headers["content-length"])
+    except (KeyError, ValueError):
+        return _LLM_UNITS
+    return min(_LLM_UNITS, max(1, math.ceil(size / 4 / _TOKENS_PER_UNIT)))
+
+
+def stream_cost(request: Request) -> int:
+    """llm_cost for the SSE routes, where resuming a stream is free.
+
+    A Last-Event-ID that names a stream still in the replay buffer only
+    re-attaches to it and calls no LLM; any other request pays in full.
+    """
+    last_event_id = request.headers.get("Last-Event-ID")
+    if last_event_id and replays.find(last_event_id) is not None:
+        return 0
+    return llm_cost(request)
+
+
+def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded) -> JSONResponse:
+    """429 with Retry-After set to when the exhausted window frees up."""
+    retry_after = 60
+    current = getattr(request.state, "view_rate_limit", None)
+    if current is not None:
+        try:
+            reset, _ = request.app.state.limiter.limiter.get_window_stats(current[0], *current[1])
+            retry_after = max(1, math.ceil(reset - time.time()))
+        except Exception as e:
+            logger.warning(f"Rate limit window unavailable: {e}")
+    return JSONResponse(
+        {"error": f"Rate limit exceeded: {exc.detail}"},
+        status_code=429,
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+# Counters live in RATE_LIMIT_STORAGE_URI: "memory://" keeps them per
+# process (the local stand-in for development and tests); a shared store
+# such as "redis://host:6379" enforces limits across all workers. If the
+# shared store goes away, each worker falls back to memory until it is back.
+limiter = Limiter(
+    key_func=rate_limit_key,
+    storage_uri=RATE_LIMIT_STORAGE_URI,
+    strategy=RATE_LIMIT_STRATEGY,
+    key_prefix="arch",
+    in_memory_fallback_enabled=not RATE_LIMIT_STORAGE_URI.startswith("memory://"),
+)
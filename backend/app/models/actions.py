@@ -1,6 +1,6 @@
 from __future__ import annotations
 from typing import Annotated, Literal, Optional, Union
-from pydantic import BaseModel, Discriminator, Tag
+from pydantic import BaseModel, Discriminator, Field, Tag
 
 from .graph import NodeData, EdgeData, Position
 
@@ -9,7 +9,7 @@ class AddNodeAction(BaseModel):
     op: Literal["add_node"]
     id: str
     type: str
-    position: Position
+    position: Optional[Position] = None  # None = placed by the layout engine
     data: NodeData
 
 
@@ -36,6 +36,11 @@ class AddEdgeAction(BaseModel):
     source: str
     target: str
     data: Optional[EdgeData] = None
+    # React Flow handles; only sent by the canvas, never by the LLM
+    source_handle: Optional[str] = Field(None, alias="sourceHandle")
+    target_handle: Optional[str] = Field(None, alias="targetHandle")
+
+    model_config = {"populate_by_name": True}
 
 
 class RemoveEdgeAction(BaseModel):
@@ -13,7 +13,7 @@ class GraphSaveRequest(BaseModel):
 
 class GraphSummary(BaseModel):
     id: str
-    name: str
+    name: str = ""
     node_count: int = Field(alias="nodeCount", default=0)
     edge_count: int = Field(alias="edgeCount", default=0)
     version: int = 1
@@ -37,6 +37,9 @@ class GraphDetail(BaseModel):
 
 class GraphListResponse(BaseModel):
     graphs: list[GraphSummary]
+    next_cursor: Optional[str] = Field(alias="nextCursor", default=None)
+
+    model_config = {"populate_by_name": True}
 
 
 class GraphSaveResponse(BaseModel):
@@ -0,0 +1,58 @@
+"""Response classes: orjson-encoded JSON and server-sent events."""
+from __future__ import annotations
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.types import Receive, Scope, Send
+from pydantic import BaseModel
+
+
+def _default(obj: Any) -> Any:
+    # Models nested inside plain dicts/lists
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json", by_alias=True)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by orjson.
+
+    A Pydantic model is dumped straight to JSON bytes by pydantic-core (by
+    alias), so routes that return a model wrapped in this response skip
+    FastAPI's validate -> dict -> jsonable_encoder pass entirely.
+    """
+
+    def __init__(self, content: Any, *args, exclude_unset: bool = False, **kwargs):
+        self.exclude_unset = exclude_unset
+        super().__init__(content, *args, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.__pydantic_serializer__.to_json(
+                content, by_alias=True, exclude_unset=self.exclude_unset
+            )
+        return orjson.dumps(content, default=_default)
+
+
+class EventStreamResponse(StreamingResponse):
+    """text/event-stream response that stops as soon as the client leaves.
+
+    StreamingResponse only listens for ``http.disconnect`` on servers that
+    report ASGI spec < 2.4; on newer ones it notices a closed connection at
+    the next write, which for a stream waiting on a slow model can be a
+    heartbeat interval away. This always listens. The frame iterator is
+    also closed however the response ends, so its cleanup (cancelling the
+    upstream LLM call) runs right away instead of at garbage collection.
+    """
+
+    media_type = "text/event-stream"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        scope = {**scope, "asgi": {**scope.get("asgi", {}), "spec_version": "2.0"}}
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            aclose = getattr(self.body_iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
@@ -1,8 +1,8 @@
 from __future__ import annotations
-import json
 import logging
-from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import StreamingResponse
+from collections import Counter
+from typing import AsyncIterator, Callable
+from fastapi import APIRouter, Depends, HTTPException, Request
 
 from app.models.api import (
     GenerateRequest,
@@ -13,6 +13,9 @@ from app.models.api import (
     ReviewResponse,
     ArchReview,
 )
+from app.models.actions import GraphAction, MoveNodeAction
+from app.config import SSE_COALESCE_BYTES, SSE_COALESCE_MS
+from app.models.graph import GraphState
 from app.services.llm import (
     call_llm_generate,
     call_llm_modify,
@@ -21,17 +24,25 @@ from app.services.llm import (
     stream_llm_modify,
 )
 from app.services.providers.base import (
+    StreamEvent,
     TokenEvent,
     ToolCallStartEvent,
     ToolCallEndEvent,
+    ActionEvent,
     DoneEvent,
 )
-from app.services.validator import validate_actions
-from app.middleware.rate_limit import limiter
+from app.services.layout import GraphLayout, apply_layout
+from app.services.scheduler import Overloaded
+from app.services.sse import HEARTBEAT, coalesce_tokens, encode_event, encode_token, replays
+from app.services.validator import GraphValidator, validate_actions
+from app.middleware.auth import get_optional_user
+from app.middleware.rate_limit import LLM_BUDGET, limiter, llm_cost, rate_limit_key, stream_cost
+from app.responses import EventStreamResponse
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/api")
+# Signed-in callers are rate limited (and queued) per user rather than per IP
+router = APIRouter(prefix="/api", dependencies=[Depends(get_optional_user)])
 
 
 # ── Non-streaming endpoints (preserved) ───────────────────
@@ -39,11 +50,15 @@ router = APIRouter(prefix="/api")
 
 @router.post("/generate", response_model=GenerateResponse)
 @limiter.limit("10/minute")
+@limiter.shared_limit(LLM_BUDGET, scope="llm", cost=llm_cost)
 async def generate_graph(request: Request, req: GenerateRequest):
     try:
-        ai_response = await call_llm_generate(req.prompt)
+        ai_response = await call_llm_generate(req.prompt, user=rate_limit_key(request))
+        ai_response = apply_layout(ai_response, current_graph=None)
         ai_response = validate_actions(ai_response, current_graph=None)
         return GenerateResponse(ai_response=ai_response)
+    except Overloaded:
+        raise
     except Exception as e:
         logger.error(f"Generate failed: {e}")
         raise HTTPException(status_code=502, detail=f"AI generation failed: {str(e)}")
@@ -51,12 +66,16 @@ async def generate_graph(request: Request, req: GenerateRequest):
 
 @router.post("/modify", response_model=ModifyResponse)
 @limiter.limit("15/minute")
+@limiter.shared_limit(LLM_BUDGET, scope="llm", cost=llm_cost)
 async def modify_graph(request: Request, req: ModifyRequest):
     try:
         history = [{"role": m.role, "content": m.content} for m in req.history]
-        ai_response = await call_llm_modify(req.graph, req.prompt, history)
+        ai_response = await call_llm_modify(req.graph, req.prompt, history, user=rate_limit_key(request))
+        ai_response = apply_layout(ai_response, current_graph=req.graph)
         ai_response = validate_actions(ai_response, current_graph=req.graph)
         return ModifyResponse(ai_response=ai_response)
+    except Overloaded:
+        raise
     except Exception as e:
         logger.error(f"Modify failed: {e}")
         raise HTTPException(status_code=502, detail=f"AI modification failed: {str(e)}")
@@ -65,50 +84,165 @@ async def modify_graph(request: Request, req: ModifyRequest):
 # ── SSE streaming endpoints (new) ─────────────────────────
 
 
+async def _stream_sse(events: AsyncIterator[StreamEvent], current_graph: GraphState | None) -> AsyncIterator[bytes]:
+    """Translate provider stream events into SSE frames.
+
+    Actions are fed to a GraphValidator one at a time and emitted as
+    ``action`` frames the moment they are accepted. Nodes without a position
+    go out at a provisional spot; once the stream ends the layout is solved
+    and ``move_node`` frames carry them to their final place. The closing
+    ``done`` frame only carries the summary, the IDs of the actions already
+    sent and what the validator dropped.
+    """
+    validator = GraphValidator(current_graph)
+    layout = GraphLayout(current_graph)
+    # Actions the provider streamed, by (op, id): the final response repeats them
+    streamed: Counter[tuple[str, str]] = Counter()
+
+    def accept(action: GraphAction) -> bytes | None:
+        # The validator may still shift the placed copy off a collision; a
+        # rejected one leaves its provisional spot free
+        action = layout.place(action)
+        if not validator.feed(action).accepted:
+            return None
+        layout.observe(action)
+        return encode_event({"type": "action", "action": action.model_dump(mode="json", by_alias=True)})
+
+    async for event in coalesce_tokens(events, SSE_COALESCE_MS / 1000, SSE_COALESCE_BYTES):
+        if isinstance(event, TokenEvent):
+            yield encode_token(event.token)
+        elif isinstance(event, ToolCallStartEvent):
+            yield encode_event({"type": "tool_start", "name": event.tool_name, "input": event.tool_input})
+        elif isinstance(event, ToolCallEndEvent):
+            yield encode_event({"type": "tool_end", "name": event.tool_name, "output": event.tool_output})
+        elif isinstance(event, ActionEvent):
+            streamed[event.action.op, event.action.id] += 1
+            frame = accept(event.action)
+            if frame:
+                yield frame
+        elif isinstance(event, DoneEvent):
+            # Anything the provider did not stream (e.g. demo mode) goes out now
+            for action in event.response.actions:
+                if streamed[action.op, action.id]:
+                    streamed[action.op, action.id] -= 1
+                    continue
+                frame = accept(action)
+                if frame:
+                    yield frame
+            for node_id, position in layout.solve().items():
+                frame = accept(MoveNodeAction(op="move_node", id=node_id, position=position))
+                if frame:
+                    yield frame
+            report = validator.finish()
+            yield encode_event({
+                "type": "done",
+                "response": {
+                    "thought_process": event.response.thought_process,
+                    "summary": event.response.summary,
+                    # A node placed by the layout also has a move_node
+                    "action_ids": list(dict.fromkeys(a.id for a in report.accepted)),
+                    "dropped": [{"id": d.action.id, "reason": d.reason} for d in report.dropped],
+                },
+            })
+
+
+async def _sse_response(request: Request, event_generator: Callable[[], AsyncIterator[bytes]]) -> EventStreamResponse:
+    """Stream ``event_generator()`` through a replay buffer.
+
+    A request carrying Last-Event-ID re-attaches to that stream instead of
+    starting a new generation, and gets every frame after the given id.
+
+    A new stream only sends its headers once the first frame (not a
+    heartbeat) is ready, i.e. once its LLM call got a scheduler slot (or
+    hit the cache), so a call shed by the scheduler still gets a 429 with
+    Retry-After; one shed later gets an error frame.
+    """
+    # Proxies (nginx) must not buffer the stream either
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    last_event_id = request.headers.get("Last-Event-ID")
+    if last_event_id:
+        resumed = replays.resume(last_event_id)
+        if resumed is None:
+            async def gone():
+                yield encode_event({"type": "error", "message": "Stream can no longer be resumed"})
+            frames = gone()
+        else:
+            stream, after = resumed
+            frames = stream.read(after)
+        return EventStreamResponse(frames, headers=headers)
+
+    shed: list[Overloaded] = []
+
+    async def admitted():
+        sent = False
+        try:
+            async for frame in event_generator():
+                sent = True
+                yield frame
+        except Overloaded as e:
+            if not sent:
+                # The call never got a slot and no headers went out yet
+                shed.append(e)
+                return
+            yield encode_event({"type": "error", "message": str(e)})
+
+    frames = replays.start(admitted()).read(0)
+    # A heartbeat only means the call is still queued: keep the headers back
+    first = HEARTBEAT
+    while first == HEARTBEAT:
+        first = await anext(frames, None)
+    if shed:
+        await frames.aclose()
+        raise shed[0]
+
+    async def body():
+        try:
+            if first is not None:
+                yield first
+            async for frame in frames:
+                yield frame
+        finally:
+            await frames.aclose()
+
+    return EventStreamResponse(body(), headers=headers)
+
+
 @router.post("/generate/stream")
 @limiter.limit("10/minute")
+@limiter.shared_limit(LLM_BUDGET, scope="llm", cost=stream_cost)
 async def generate_stream(request: Request, req: GenerateRequest):
     async def event_generator():
         try:
             history = [{"role": m.role, "content": m.content} for m in req.history]
-            async for event in stream_llm_generate(req.prompt, history):
-                if isinstance(event, TokenEvent):
-                    yield f"data: {json.dumps({'type': 'token', 'token': event.token})}\n\n"
-                elif isinstance(event, ToolCallStartEvent):
-                    yield f"data: {json.dumps({'type': 'tool_start', 'name': event.tool_name, 'input': event.tool_input})}\n\n"
-                elif isinstance(event, ToolCallEndEvent):
-                    yield f"data: {json.dumps({'type': 'tool_end', 'name': event.tool_name, 'output': event.tool_output})}\n\n"
-                elif isinstance(event, DoneEvent):
-                    validated = validate_actions(event.response, current_graph=None)
-                    yield f"data: {json.dumps({'type': 'done', 'response': validated.model_dump(mode='json', by_alias=True)})}\n\n"
+            events = stream_llm_generate(req.prompt, history, user=rate_limit_key(request))
+            async for frame in _stream_sse(events, current_graph=None):
+                yield frame
+        except Overloaded:
+            raise
         except Exception as e:
             logger.error(f"Stream generate failed: {e}")
-            yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+            yield encode_event({"type": "error", "message": str(e)})
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    return await _sse_response(request, event_generator)
 
 
 @router.post("/modify/stream")
 @limiter.limit("15/minute")
+@limiter.shared_limit(LLM_BUDGET, scope="llm", cost=stream_cost)
 async def modify_stream(request: Request, req: ModifyRequest):
     async def event_generator():
         try:
             history = [{"role": m.role, "content": m.content} for m in req.history]
-            async for event in stream_llm_modify(req.graph, req.prompt, history):
-                if isinstance(event, TokenEvent):
-                    yield f"data: {json.dumps({'type': 'token', 'token': event.token})}\n\n"
-                elif isinstance(event, ToolCallStartEvent):
-                    yield f"data: {json.dumps({'type': 'tool_start', 'name': event.tool_name, 'input': event.tool_input})}\n\n"
-                elif isinstance(event, ToolCallEndEvent):
-                    yield f"data: {json.dumps({'type': 'tool_end', 'name': event.tool_name, 'output': event.tool_output})}\n\n"
-                elif isinstance(event, DoneEvent):
-                    validated = validate_actions(event.response, current_graph=req.graph)
-                    yield f"data: {json.dumps({'type': 'done', 'response': validated.model_dump(mode='json', by_alias=True)})}\n\n"
+            events = stream_llm_modify(req.graph, req.prompt, history, user=rate_limit_key(request))
+            async for frame in _stream_sse(events, current_graph=req.graph):
+                yield frame
+        except Overloaded:
+            raise
         except Exception as e:
             logger.error(f"Stream modify failed: {e}")
-            yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+            yield encode_event({"type": "error", "message": str(e)})
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    return await _sse_response(request, event_generator)
 
 
 # ── Review endpoint ───────────────────────────────────────
@@ -116,11 +250,14 @@ async def modify_stream(request: Request, req: ModifyRequest):
 
 @router.post("/review", response_model=ReviewResponse)
 @limiter.limit("5/minute")
+@limiter.shared_limit(LLM_BUDGET, scope="llm", cost=llm_cost)
 async def review_architecture(request: Request, req: ReviewRequest):
     try:
-        review_data = await call_llm_review(req.graph)
+        review_data = await call_llm_review(req.graph, user=rate_limit_key(request))
         review = ArchReview(**review_data)
         return ReviewResponse(review=review)
+    except Overloaded:
+        raise
     except Exception as e:
         logger.error(f"Review failed: {e}")
         raise HTTPException(status_code=502, detail=f"Architecture review failed: {str(e)}")
@@ -1,6 +1,6 @@
 from __future__ import annotations
 import logging
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 
 from app.models.persistence import (
     GraphSaveRequest,
@@ -8,30 +8,53 @@ from app.models.persistence import (
     GraphDetail,
     GraphListResponse,
 )
-from app.services.persistence import save_graph, get_graph, list_graphs, delete_graph
+from app.services.pagination import parse_fields
+from app.services.persistence import (
+    GRAPH_FIELDS,
+    PreconditionFailed,
+    save_graph,
+    get_graph,
+    list_graphs,
+    delete_graph,
+)
+from app.middleware.etag import REVALIDATE, if_match_version, not_modified, version_etag
+from app.middleware.auth import get_optional_user
 from app.middleware.rate_limit import limiter
+from app.responses import FastJSONResponse
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/api")
+# Signed-in callers are rate limited per user rather than per IP
+router = APIRouter(prefix="/api", dependencies=[Depends(get_optional_user)])
 
 
 @router.post("/graphs", response_model=GraphSaveResponse)
 @limiter.limit("30/minute")
-async def save(request: Request, req: GraphSaveRequest):
+async def save(request: Request, response: Response, req: GraphSaveRequest):
     try:
-        return save_graph(req)
+        saved = await save_graph(req, expected_version=if_match_version(request))
+        response.headers["ETag"] = version_etag(saved.version)
+        return saved
+    except PreconditionFailed as e:
+        raise HTTPException(status_code=412, detail=str(e))
     except Exception as e:
         logger.error(f"Save failed: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to save graph: {str(e)}")
 
 
-@router.get("/graphs", response_model=GraphListResponse)
+@router.get("/graphs", response_model=GraphListResponse, response_model_exclude_unset=True)
 @limiter.limit("30/minute")
-async def list_all(request: Request):
+async def list_all(
+    request: Request,
+    limit: int = Query(50, ge=1, le=100),
+    cursor: str | None = None,
+    fields: str | None = None,
+):
     try:
-        graphs = list_graphs()
-        return GraphListResponse(graphs=graphs)
+        graphs, next_page = await list_graphs(limit, cursor, parse_fields(fields, set(GRAPH_FIELDS)))
+        return FastJSONResponse(GraphListResponse(graphs=graphs, next_cursor=next_page), exclude_unset=True)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"List failed: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to list graphs: {str(e)}")
@@ -41,17 +64,23 @@ async def list_all(request: Request):
 @limiter.limit("30/minute")
 async def load(request: Request, graph_id: str):
     try:
-        return get_graph(graph_id)
+        graph = await get_graph(graph_id)
     except Exception as e:
         logger.error(f"Load failed: {e}")
         raise HTTPException(status_code=404, detail=f"Graph not found: {str(e)}")
 
+    etag = version_etag(graph.version)
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+    return FastJSONResponse(graph, headers={"ETag": etag, "Cache-Control": REVALIDATE})
+
 
 @router.delete("/graphs/{graph_id}")
 @limiter.limit("30/minute")
 async def remove(request: Request, graph_id: str):
     try:
-        delete_graph(graph_id)
+        await delete_graph(graph_id)
         return {"ok": True}
     except Exception as e:
         logger.error(f"Delete failed: {e}")
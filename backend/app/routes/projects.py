@@ -1,10 +1,14 @@
 from __future__ import annotations
 import logging
-from fastapi import APIRouter, HTTPException, Request, Depends
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Query, Request, Response, Depends
+from pydantic import BaseModel, Field
 
 from app.middleware.auth import get_current_user
+from app.middleware.etag import REVALIDATE, content_etag, if_match_version, not_modified, version_etag
 from app.middleware.rate_limit import limiter
+from app.models.actions import GraphAction
+from app.responses import FastJSONResponse
+from app.services.pagination import parse_fields
 from app.services import projects as svc
 
 logger = logging.getLogger(__name__)
@@ -35,13 +39,21 @@ class SaveIterationRequest(BaseModel):
     edges: list
 
 
+class PatchIterationRequest(BaseModel):
+    actions: list[GraphAction]
+    # Seq the client's edit is based on; omit to apply unconditionally
+    base_seq: int | None = Field(None, alias="baseSeq")
+
+    model_config = {"populate_by_name": True}
+
+
 # ── Projects ─────────────────────────────────────────────
 
 @router.post("/projects")
 @limiter.limit("30/minute")
 async def create_project(request: Request, req: CreateProjectRequest, user_id: str = Depends(get_current_user)):
     try:
-        return svc.create_project(user_id, req.name, req.description)
+        return await svc.create_project(user_id, req.name, req.description)
     except Exception as e:
         logger.error(f"Create project failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -49,20 +61,36 @@ async def create_project(request: Request, req: CreateProjectRequest, user_id: s
 
 @router.get("/projects")
 @limiter.limit("30/minute")
-async def list_projects(request: Request, user_id: str = Depends(get_current_user)):
+async def list_projects(
+    request: Request,
+    limit: int = Query(50, ge=1, le=100),
+    cursor: str | None = None,
+    fields: str | None = None,
+    user_id: str = Depends(get_current_user),
+):
     try:
-        projects = svc.list_projects(user_id)
-        return {"projects": projects}
+        projects, next_cursor = await svc.list_projects(
+            user_id, limit, cursor, parse_fields(fields, set(svc.PROJECT_FIELDS))
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"List projects failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    page = {"projects": projects, "nextCursor": next_cursor}
+    etag = content_etag(page)
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+    return FastJSONResponse(page, headers={"ETag": etag, "Cache-Control": REVALIDATE})
+
 
 @router.patch("/projects/{project_id}")
 @limiter.limit("30/minute")
 async def update_project(request: Request, project_id: str, req: UpdateProjectRequest, user_id: str = Depends(get_current_user)):
     try:
-        svc.update_project(project_id, user_id, req.name, req.description)
+        await svc.update_project(project_id, user_id, req.name, req.description)
         return {"ok": True}
     except Exception as e:
         logger.error(f"Update project failed: {e}")
@@ -73,7 +101,7 @@ async def update_project(request: Request, project_id: str, req: UpdateProjectRe
 @limiter.limit("30/minute")
 async def delete_project(request: Request, project_id: str, user_id: str = Depends(get_current_user)):
     try:
-        svc.delete_project(project_id, user_id)
+        await svc.delete_project(project_id, user_id)
         return {"ok": True}
     except Exception as e:
         logger.error(f"Delete project failed: {e}")
@@ -86,7 +114,7 @@ async def delete_project(request: Request, project_id: str, user_id: str = Depen
 @limiter.limit("30/minute")
 async def create_iteration(request: Request, project_id: str, req: CreateIterationRequest, user_id: str = Depends(get_current_user)):
     try:
-        return svc.create_iteration(project_id, req.name, req.nodes, req.edges)
+        return await svc.create_iteration(project_id, req.name, req.nodes, req.edges)
     except Exception as e:
         logger.error(f"Create iteration failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -96,18 +124,45 @@ async def create_iteration(request: Request, project_id: str, req: CreateIterati
 @limiter.limit("60/minute")
 async def get_iteration(request: Request, iteration_id: str, user_id: str = Depends(get_current_user)):
     try:
-        return svc.get_iteration(iteration_id)
+        iteration = await svc.get_iteration(iteration_id)
     except Exception as e:
         logger.error(f"Get iteration failed: {e}")
         raise HTTPException(status_code=404, detail=str(e))
 
+    # Every write advances seq, so it identifies the content
+    etag = version_etag(iteration["seq"])
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+    return FastJSONResponse(iteration, headers={"ETag": etag, "Cache-Control": REVALIDATE})
+
 
 @router.put("/iterations/{iteration_id}")
 @limiter.limit("60/minute")
-async def save_iteration(request: Request, iteration_id: str, req: SaveIterationRequest, user_id: str = Depends(get_current_user)):
+async def save_iteration(request: Request, response: Response, iteration_id: str, req: SaveIterationRequest, user_id: str = Depends(get_current_user)):
+    if_match = if_match_version(request)
     try:
-        svc.save_iteration(iteration_id, req.nodes, req.edges)
-        return {"ok": True}
+        seq = await svc.save_iteration(iteration_id, req.nodes, req.edges, expected_seq=if_match)
+        response.headers["ETag"] = version_etag(seq)
+        return {"ok": True, "seq": seq}
+    except svc.ConflictError as e:
+        raise HTTPException(status_code=409 if if_match is None else 412, detail=str(e))
     except Exception as e:
         logger.error(f"Save iteration failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.patch("/iterations/{iteration_id}")
+@limiter.limit("120/minute")
+async def patch_iteration(request: Request, response: Response, iteration_id: str, req: PatchIterationRequest, user_id: str = Depends(get_current_user)):
+    # If-Match is the header form of baseSeq and fails with 412 instead of 409
+    if_match = if_match_version(request)
+    try:
+        seq = await svc.patch_iteration(iteration_id, req.actions, req.base_seq if if_match is None else if_match)
+        response.headers["ETag"] = version_etag(seq)
+        return {"ok": True, "seq": seq}
+    except svc.ConflictError as e:
+        raise HTTPException(status_code=409 if if_match is None else 412, detail=str(e))
+    except Exception as e:
+        logger.error(f"Patch iteration failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
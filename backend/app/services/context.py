@@ -0,0 +1,128 @@
+"""Relevance-pruned graph context for modify prompts on large graphs."""
+from __future__ import annotations
+import json
+import math
+import re
+from collections import Counter, deque
+
+from app.config import LLM_CONTEXT_HOPS, LLM_CONTEXT_TOKEN_BUDGET
+from app.models.graph import GraphState, GraphNode
+
+# Rough prompt-size estimate; good enough to keep a budget, not for billing
+_CHARS_PER_TOKEN = 4
+# id/position/punctuation overhead per encoded node and edge
+_NODE_OVERHEAD = 40
+_EDGE_OVERHEAD = 30
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "the", "and", "for", "with", "add", "to", "a", "an", "of", "in", "on", "it",
+    "make", "use", "can", "you", "please", "into", "from", "that", "this", "all",
+    "node", "nodes", "edge", "edges", "new", "more", "some", "should", "would",
+}
+
+
+def _terms(text: str) -> set[str]:
+    return {w for w in _WORD.findall(text.lower()) if len(w) > 1 and w not in _STOPWORDS}
+
+
+def _node_terms(node: GraphNode) -> set[str]:
+    parts = [node.id.replace("_", " "), node.data.label, node.data.node_type.replace("_", " ")]
+    if node.data.tech:
+        parts.append(node.data.tech)
+    return _terms(" ".join(parts))
+
+
+def _node_cost(node: GraphNode) -> int:
+    return len(json.dumps(node.data.model_dump(by_alias=True, exclude_none=True))) + _NODE_OVERHEAD
+
+
+def select_context(
+    graph: GraphState,
+    prompt: str,
+    history: list[dict[str, str]] | None = None,
+    token_budget: int = LLM_CONTEXT_TOKEN_BUDGET,
+    hops: int = LLM_CONTEXT_HOPS,
+) -> tuple[GraphState, str | None]:
+    """Pick the part of the graph relevant to a modify request.
+
+    Nodes are scored by the prompt terms (and, with half the weight, recent
+    history terms) found in their label, tech, type or ID, each weighted by
+    how rare the term is across the graph. The best matches seed a
+    ``hops``-deep neighbourhood over the edges, which is then filled
+    nearest-first until ``token_budget`` is reached.
+
+    Returns the subgraph and a one-line summary of what was left out, or the
+    whole graph and None when it already fits the budget.
+    """
+    budget = token_budget * _CHARS_PER_TOKEN
+    cost = {n.id: _node_cost(n) for n in graph.nodes}
+    edge_cost = {e.id: _EDGE_OVERHEAD + (len(json.dumps(e.data.model_dump(exclude_none=True))) if e.data else 0)
+                 for e in graph.edges}
+    if sum(cost.values()) + sum(edge_cost.values()) <= budget:
+        return graph, None
+
+    weights: dict[str, float] = {}
+    for msg in (history or [])[-5:]:
+        for term in _terms(msg["content"]):
+            weights[term] = 1.0
+    for term in _terms(prompt):
+        weights[term] = 2.0
+
+    nodes = {n.id: n for n in graph.nodes}
+    adjacency: dict[str, list[tuple[str, str]]] = {n.id: [] for n in graph.nodes}
+    for e in graph.edges:
+        if e.source in adjacency and e.target in adjacency:
+            adjacency[e.source].append((e.target, e.id))
+            adjacency[e.target].append((e.source, e.id))
+
+    # Terms shared by many nodes ("service") say little about which one is meant
+    node_terms = {v: _node_terms(n) for v, n in nodes.items()}
+    frequency = Counter(t for terms in node_terms.values() for t in terms if t in weights)
+    score = {
+        v: sum(weights[t] * math.log(1 + len(nodes) / frequency[t]) for t in terms if t in weights)
+        for v, terms in node_terms.items()
+    }
+    best = max(score.values(), default=0.0)
+    seeds = sorted((v for v in nodes if best > 0 and score[v] >= best / 2), key=lambda v: -score[v])
+    if not seeds:
+        # Nothing matched (e.g. "improve performance"): start from the hubs
+        seeds = sorted(nodes, key=lambda v: -len(adjacency[v]))[:1]
+        hops = max(hops, 2)
+
+    # Multi-source BFS, so every node gets its distance to the nearest seed
+    distance = {v: 0 for v in seeds}
+    queue = deque(seeds)
+    while queue:
+        v = queue.popleft()
+        if distance[v] >= hops:
+            continue
+        for w, _ in adjacency[v]:
+            if w not in distance:
+                distance[w] = distance[v] + 1
+                queue.append(w)
+
+    selected: set[str] = set()
+    selected_edges: set[str] = set()
+    used = 0
+    for v in sorted(distance, key=lambda v: (distance[v], -score[v])):
+        new_edges = [eid for w, eid in adjacency[v] if w in selected and eid not in selected_edges]
+        extra = cost[v] + sum(edge_cost[eid] for eid in new_edges)
+        if used + extra > budget and selected:
+            break
+        selected.add(v)
+        selected_edges.update(new_edges)
+        used += extra
+
+    subgraph = GraphState(
+        nodes=[n for n in graph.nodes if n.id in selected],
+        edges=[e for e in graph.edges if e.id in selected_edges],
+    )
+
+    omitted = Counter(n.data.node_type for n in graph.nodes if n.id not in selected)
+    breakdown = ", ".join(f"{count} {node_type}" for node_type, count in omitted.most_common())
+    summary = (
+        f"{sum(omitted.values())} more nodes ({breakdown}) and "
+        f"{len(graph.edges) - len(selected_edges)} more edges exist but are not shown because they look unrelated to this request."
+    )
+    return subgraph, summary
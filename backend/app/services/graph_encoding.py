@@ -0,0 +1,99 @@
+"""Token-lean graph encoding for LLM prompts."""
+from __future__ import annotations
+import json
+import re
+from dataclasses import dataclass, field
+
+from app.models.actions import AIResponse, GraphAction
+from app.models.graph import GraphState
+
+# Words that mean the user cares about where things are on the canvas
+_LAYOUT_WORDS = re.compile(
+    r"\b(layout|position|positions|move|arrange|rearrange|align|spacing|overlap\w*|"
+    r"left|right|above|below|beside|next to|top|bottom|grid|tidy|reorganize)\b",
+    re.IGNORECASE,
+)
+
+
+def is_layout_request(prompt: str) -> bool:
+    """True when the prompt is about placement, so positions must be sent."""
+    return bool(_LAYOUT_WORDS.search(prompt))
+
+
+@dataclass
+class IdAliases:
+    """Short per-request aliases (n1, e1, ...) for long node and edge IDs."""
+    to_alias: dict[str, str] = field(default_factory=dict)
+    to_real: dict[str, str] = field(default_factory=dict)
+    _counters: dict[str, int] = field(default_factory=dict)
+
+    def add(self, real_id: str, prefix: str, taken: set[str]) -> str:
+        n = self._counters.get(prefix, 0)
+        while True:
+            n += 1
+            alias = f"{prefix}{n}"
+            if alias not in taken:
+                break
+        self._counters[prefix] = n
+        # Only alias when it actually saves characters
+        if len(alias) >= len(real_id):
+            alias = real_id
+        self.to_alias[real_id] = alias
+        self.to_real[alias] = real_id
+        return alias
+
+    def real(self, alias: str) -> str:
+        return self.to_real.get(alias, alias)
+
+    def resolve(self, action: GraphAction) -> GraphAction:
+        """Map alias references in an action back to real IDs, in place."""
+        action.id = self.real(action.id)
+        if action.op == "add_edge":
+            action.source = self.real(action.source)
+            action.target = self.real(action.target)
+        return action
+
+    def resolve_response(self, response: AIResponse) -> AIResponse:
+        for action in response.actions:
+            self.resolve(action)
+        return response
+
+
+def encode_graph(
+    graph: GraphState,
+    include_positions: bool = False,
+    use_aliases: bool = True,
+    reserved_ids: set[str] | None = None,
+) -> tuple[str, IdAliases]:
+    """Serialize a graph for a prompt without whitespace, nulls or render-only fields.
+
+    Returns the encoded text and the alias table needed to map IDs in the
+    model's actions back to the real ones. ``reserved_ids`` are never used
+    as aliases (pass the full graph's IDs when encoding a subgraph).
+    """
+    aliases = IdAliases()
+    taken = {n.id for n in graph.nodes} | {e.id for e in graph.edges} | (reserved_ids or set())
+    ref = (lambda real_id, prefix: aliases.add(real_id, prefix, taken)) if use_aliases else (lambda real_id, _: real_id)
+
+    nodes = []
+    for n in graph.nodes:
+        node: dict = {"id": ref(n.id, "n"), "data": n.data.model_dump(by_alias=True, exclude_none=True)}
+        if include_positions:
+            node["position"] = {"x": round(n.position.x), "y": round(n.position.y)}
+        nodes.append(node)
+
+    edges = []
+    for e in graph.edges:
+        edge: dict = {
+            "id": ref(e.id, "e"),
+            "source": aliases.to_alias.get(e.source, e.source),
+            "target": aliases.to_alias.get(e.target, e.target),
+        }
+        if e.data:
+            data = e.data.model_dump(exclude_none=True)
+            if data:
+                edge["data"] = data
+        edges.append(edge)
+
+    text = json.dumps({"nodes": nodes, "edges": edges}, separators=(",", ":"), ensure_ascii=False)
+    return text, aliases
@@ -0,0 +1,264 @@
+from __future__ import annotations
+import logging
+from collections import deque
+
+from app.models.actions import AIResponse, GraphAction
+from app.models.graph import GraphState, Position
+from app.services.validator import SpatialHash
+
+logger = logging.getLogger(__name__)
+
+# Grid unit used by the frontend and the old prompt positioning rules
+GRID_X = 250
+GRID_Y = 200
+
+# Left-to-right tier of each node type
+TIERS: dict[str, int] = {
+    "gateway": 0,
+    "load_balancer": 1,
+    "service": 2,
+    "cache": 3,
+    "queue": 3,
+    "database": 3,
+}
+
+
+class GraphLayout:
+    """Layered (Sugiyama-style) layout for nodes the LLM left unplaced.
+
+    Actions are observed in order to track the resulting topology. Nodes
+    added without a position get a provisional spot in their tier column
+    right away (so they can be streamed), and solve() computes the final
+    layered positions once the edges are known. The spot is only taken
+    once the placed action is observed, so callers can validate it first:
+
+    1. layering: longest path over the edges, never left of the node's tier;
+       edges pointing to a lower tier are reversed and cycles are broken
+    2. ordering: one barycenter sweep each way to reduce crossings
+    3. coordinates: GRID_X per layer, GRID_Y per row, columns centred
+
+    Nodes that already have a position stay put. New nodes attached to
+    them are placed next to their neighbour instead of on the global grid.
+    """
+
+    def __init__(self, current_graph: GraphState | None = None):
+        self._types: dict[str, str] = {}
+        self._edges: dict[str, tuple[str, str]] = {}
+        self._fixed: dict[str, tuple[float, float]] = {}
+        self._pending: dict[str, Position] = {}
+        self._column_rows: dict[int, int] = {}
+        # (node ID, tier) of the spot the last place() offered
+        self._offer: tuple[str, int] | None = None
+        self._origin_x = 0.0
+
+        if current_graph:
+            for n in current_graph.nodes:
+                self._types[n.id] = n.data.node_type
+                self._fixed[n.id] = (n.position.x, n.position.y)
+            for e in current_graph.edges:
+                self._edges[e.id] = (e.source, e.target)
+            if self._fixed:
+                self._origin_x = max(x for x, _ in self._fixed.values()) + GRID_X
+
+    def place(self, action: GraphAction) -> GraphAction:
+        """A copy of an add_node without a position, at a provisional spot.
+
+        Other actions are returned as they are. The spot stays free until
+        the copy is passed to observe().
+        """
+        self._offer = None
+        if action.op != "add_node" or action.position is not None:
+            return action
+        tier = TIERS.get(action.data.node_type, TIERS["service"])
+        row = self._column_rows.get(tier, 0)
+        self._offer = (action.id, tier)
+        return action.model_copy(update={"position": Position(x=self._origin_x + tier * GRID_X, y=row * GRID_Y)})
+
+    def observe(self, action: GraphAction) -> None:
+        """Record the topology change of an accepted action."""
+        match action.op:
+            case "add_node":
+                self._types[action.id] = action.data.node_type
+                if self._offer is not None and self._offer[0] == action.id:
+                    tier = self._offer[1]
+                    self._column_rows[tier] = self._column_rows.get(tier, 0) + 1
+                    self._pending[action.id] = action.position
+                else:
+                    self._fixed[action.id] = (action.position.x, action.position.y)
+                self._offer = None
+            case "remove_node":
+                self._types.pop(action.id, None)
+                self._fixed.pop(action.id, None)
+                self._pending.pop(action.id, None)
+            case "move_node":
+                self._fixed[action.id] = (action.position.x, action.position.y)
+                self._pending.pop(action.id, None)
+            case "add_edge":
+                self._edges[action.id] = (action.source, action.target)
+            case "remove_edge":
+                self._edges.pop(action.id, None)
+
+    def solve(self) -> dict[str, Position]:
+        """Return final positions for the nodes placed by place() that moved."""
+        if not self._pending:
+            return {}
+
+        order = list(self._types)
+        index = {v: i for i, v in enumerate(order)}
+        tier = {v: TIERS.get(self._types[v], TIERS["service"]) for v in order}
+        succ: dict[str, list[str]] = {v: [] for v in order}
+        pred: dict[str, list[str]] = {v: [] for v in order}
+        for source, target in self._edges.values():
+            if source not in index or target not in index or source == target:
+                continue
+            if tier[source] > tier[target]:
+                source, target = target, source
+            succ[source].append(target)
+            pred[target].append(source)
+
+        layer, topo = _assign_layers(order, index, tier, succ, pred)
+
+        if not self._fixed:
+            positions = _layered_coordinates(topo, layer, succ, pred)
+        else:
+            positions = self._anchored_coordinates(topo, layer, succ, pred)
+
+        return {
+            v: Position(x=x, y=y)
+            for v, (x, y) in positions.items()
+            if v in self._pending and (self._pending[v].x, self._pending[v].y) != (x, y)
+        }
+
+    def _anchored_coordinates(
+        self,
+        topo: list[str],
+        layer: dict[str, int],
+        succ: dict[str, list[str]],
+        pred: dict[str, list[str]],
+    ) -> dict[str, tuple[float, float]]:
+        """Place new nodes next to an already placed neighbour."""
+        taken = SpatialHash()
+        placed: dict[str, tuple[float, float]] = {}
+        for v, (x, y) in self._fixed.items():
+            if v in layer:
+                taken.insert(v, x, y)
+                placed[v] = (x, y)
+
+        min_x = min(x for x, _ in placed.values()) if placed else 0.0
+        below = max(y for _, y in placed.values()) + 2 * GRID_Y if placed else 0.0
+        fan: dict[str, int] = {}
+
+        for v in topo:
+            if v in placed:
+                continue
+            anchor = next((u for u in pred[v] + succ[v] if u in placed), None)
+            if anchor is not None:
+                ax, ay = placed[anchor]
+                k = fan.get(anchor, 0)
+                fan[anchor] = k + 1
+                # Alternate below/above the anchor: 0, +1, -1, +2, -2, ...
+                offset = (k + 1) // 2 * (1 if k % 2 else -1)
+                x = ax + (layer[v] - layer[anchor]) * GRID_X
+                y = ay + offset * GRID_Y
+            else:
+                x = min_x + layer[v] * GRID_X
+                y = below
+            x, y = taken.find_free(x, y)
+            taken.insert(v, x, y)
+            placed[v] = (x, y)
+        return placed
+
+
+def _assign_layers(
+    order: list[str],
+    index: dict[str, int],
+    tier: dict[str, int],
+    succ: dict[str, list[str]],
+    pred: dict[str, list[str]],
+) -> tuple[dict[str, int], list[str]]:
+    """Longest-path layering (Kahn's algorithm), floored at each node's tier.
+
+    When only cycles remain, the unprocessed node with the lowest tier is
+    forced out and its remaining incoming edges are ignored.
+    """
+    indegree = {v: len(pred[v]) for v in order}
+    ready = deque(v for v in order if indegree[v] == 0)
+    fallback = sorted(order, key=lambda v: (tier[v], index[v]))
+    fallback_at = 0
+    layer = dict(tier)
+    done: set[str] = set()
+    topo: list[str] = []
+
+    while len(topo) < len(order):
+        if ready:
+            v = ready.popleft()
+        else:
+            while fallback[fallback_at] in done:
+                fallback_at += 1
+            v = fallback[fallback_at]
+        if v in done:
+            continue
+        done.add(v)
+        topo.append(v)
+        for w in succ[v]:
+            if w in done:
+                continue  # back edge of a broken cycle
+            if layer[v] + 1 > layer[w]:
+                layer[w] = layer[v] + 1
+            indegree[w] -= 1
+            if indegree[w] == 0:
+                ready.append(w)
+
+    # Compact away empty layers (e.g. no load balancer in the graph)
+    used = sorted(set(layer.values()))
+    column = {l: i for i, l in enumerate(used)}
+    return {v: column[l] for v, l in layer.items()}, topo
+
+
+def _layered_coordinates(
+    topo: list[str],
+    layer: dict[str, int],
+    succ: dict[str, list[str]],
+    pred: dict[str, list[str]],
+) -> dict[str, tuple[float, float]]:
+    columns: list[list[str]] = [[] for _ in range(max(layer.values()) + 1)]
+    for v in topo:
+        columns[layer[v]].append(v)
+
+    row = {v: i for col in columns for i, v in enumerate(col)}
+
+    def sweep(cols: list[list[str]], neighbours: dict[str, list[str]]) -> None:
+        for col in cols:
+            def barycenter(v: str) -> float:
+                ns = neighbours[v]
+                return sum(row[u] for u in ns) / len(ns) if ns else row[v]
+            col.sort(key=barycenter)
+            for i, v in enumerate(col):
+                row[v] = i
+
+    sweep(columns[1:], pred)
+    sweep(columns[-2::-1], succ)
+
+    tallest = max(len(col) for col in columns)
+    positions: dict[str, tuple[float, float]] = {}
+    for x, col in enumerate(columns):
+        top = (tallest - len(col)) / 2
+        for i, v in enumerate(col):
+            positions[v] = (float(x * GRID_X), (top + i) * GRID_Y)
+    return positions
+
+
+def apply_layout(response: AIResponse, current_graph: GraphState | None = None) -> AIResponse:
+    """Fill in positions for every add_node the LLM sent without one."""
+    layout = GraphLayout(current_graph)
+    placed = []
+    for action in response.actions:
+        action = layout.place(action)
+        layout.observe(action)
+        placed.append(action)
+    response.actions = placed
+    positions = layout.solve()
+    for action in response.actions:
+        if action.op == "add_node" and action.id in positions:
+            action.position = positions[action.id]
+    return response
@@ -1,20 +1,61 @@
 from __future__ import annotations
+import asyncio
 import json
 import logging
 import os
+import re
+from string import Template
 from typing import AsyncIterator
 
-from app.config import ANTHROPIC_API_KEY, ANTHROPIC_MODEL
+from app.config import (
+    ANTHROPIC_API_KEY,
+    ANTHROPIC_MODEL,
+    LLM_BREAKER_COOLDOWN_SECONDS,
+    LLM_BREAKER_ERROR_RATE,
+    LLM_BREAKER_PROBES,
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_TTL_SECONDS,
+    LLM_FALLBACK_TIMEOUT_SECONDS,
+    LLM_HEDGE,
+    LLM_HEDGE_DELAY_SECONDS,
+    LLM_HEDGE_MAX_RATIO,
+    LLM_HTTP2,
+    LLM_HTTP_KEEPALIVE_SECONDS,
+    LLM_HTTP_MAX_CONNECTIONS,
+    LLM_HTTP_MAX_KEEPALIVE,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_QUEUE,
+    LLM_QUEUE_TIMEOUT_SECONDS,
+    LLM_QUOTA_RPM,
+    LLM_QUOTA_TPM,
+    LLM_RETRY_ATTEMPTS,
+    LLM_RETRY_BUDGET_SECONDS,
+    LLM_STREAM_MAX_LAG,
+    LLM_LAYOUT_MODE,
+    LLM_PROVIDERS,
+    LLM_WARMUP_TIMEOUT_SECONDS,
+)
 from app.models.actions import AIResponse
 from app.models.graph import GraphState
 from app.services.providers.base import (
+    HttpPool,
     LLMProvider,
+    Prompt,
     StreamEvent,
     TokenEvent,
     ToolCallStartEvent,
     ToolCallEndEvent,
+    ActionEvent,
     DoneEvent,
+    IncrementalActionParser,
 )
+from app.services.providers.quota import QuotaPacer
+from app.services.context import select_context
+from app.services.graph_encoding import IdAliases, encode_graph, is_layout_request
+from app.services.cache_backend import MemoryCacheBackend
+from app.services.response_cache import ResponseCache
+from app.services.scheduler import BACKGROUND, INTERACTIVE, Scheduler
+from app.services.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -22,39 +63,125 @@ logger = logging.getLogger(__name__)
 # ── Provider factory ───────────────────────────────────────
 
 
-def _create_provider() -> LLMProvider | None:
-    """Create LLM provider based on environment configuration.
+def _pacer(name: str, model: str) -> QuotaPacer:
+    return QuotaPacer(
+        f"{name}:{model}",
+        requests_per_minute=LLM_QUOTA_RPM,
+        tokens_per_minute=LLM_QUOTA_TPM,
+        max_retries=LLM_RETRY_ATTEMPTS,
+        retry_budget=LLM_RETRY_BUDGET_SECONDS,
+    )
 
-    Default is Gemini (free tier). Falls back to Anthropic if
-    LLM_PROVIDER=anthropic is set.  Returns None when no API key
-    is configured (demo mode).
-    """
-    provider_name = os.getenv("LLM_PROVIDER", "groq")
 
-    if provider_name == "anthropic":
-        if not ANTHROPIC_API_KEY:
-            return None
+def _build_provider(name: str, pool: HttpPool) -> LLMProvider | None:
+    """One SDK-backed provider, or None when its API key is not configured."""
+    if name == "anthropic" and ANTHROPIC_API_KEY:
         from app.services.providers.anthropic_provider import AnthropicProvider
-        return AnthropicProvider(api_key=ANTHROPIC_API_KEY, model=ANTHROPIC_MODEL)
-    elif provider_name == "gemini":
-        api_key = os.getenv("GEMINI_API_KEY", "")
-        if not api_key:
-            return None
+        return AnthropicProvider(
+            api_key=ANTHROPIC_API_KEY, model=ANTHROPIC_MODEL, pool=pool,
+            pacer=_pacer(name, ANTHROPIC_MODEL),
+        )
+    elif name == "gemini" and os.getenv("GEMINI_API_KEY", ""):
         from app.services.providers.gemini_provider import GeminiProvider
         model = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
-        return GeminiProvider(api_key=api_key, model=model)
-    else:
-        api_key = os.getenv("GROQ_API_KEY", "")
-        if not api_key:
-            return None
+        return GeminiProvider(api_key=os.getenv("GEMINI_API_KEY", ""), model=model, pool=pool, pacer=_pacer(name, model))
+    elif name == "groq" and os.getenv("GROQ_API_KEY", ""):
         from app.services.providers.groq_provider import GroqProvider
         model = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
-        return GroqProvider(api_key=api_key, model=model)
+        return GroqProvider(api_key=os.getenv("GROQ_API_KEY", ""), model=model, pool=pool, pacer=_pacer(name, model))
+    return None
 
 
-provider = _create_provider()
+def _create_provider() -> LLMProvider:
+    """Create LLM provider based on environment configuration.
 
-# Static demo response returned when no API key is configured
+    Default is Groq (free + fast). LLM_PROVIDER=gemini / anthropic pick the
+    preferred one; every other provider with an API key joins behind it in
+    a FallbackProvider, which routes by measured latency and errors and
+    fails over. LLM_PROVIDERS=groq,gemini,... sets the exact list instead.
+    Falls back to the offline FakeProvider, which serves the demo
+    responses, when LLM_PROVIDER=fake or no API key is configured (demo
+    mode). SDKs are imported here, not at module import.
+    """
+    if LLM_PROVIDERS:
+        names = [n.strip() for n in LLM_PROVIDERS.split(",") if n.strip()]
+    else:
+        preferred = os.getenv("LLM_PROVIDER", "groq")
+        names = [preferred] if preferred == "fake" else [
+            preferred, *(n for n in ("groq", "gemini", "anthropic") if n != preferred)
+        ]
+    pool = HttpPool(
+        max_connections=LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive=LLM_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=LLM_HTTP_KEEPALIVE_SECONDS,
+        http2=LLM_HTTP2,
+    )
+
+    providers = [p for p in (_build_provider(name, pool) for name in names) if p is not None]
+    if len(providers) == 1:
+        return providers[0]
+    if providers:
+        from app.services.providers.fallback_provider import FallbackProvider
+        return FallbackProvider(
+            providers,
+            timeout=LLM_FALLBACK_TIMEOUT_SECONDS,
+            hedge=LLM_HEDGE,
+            hedge_delay=LLM_HEDGE_DELAY_SECONDS,
+            hedge_max_ratio=LLM_HEDGE_MAX_RATIO,
+            breaker_error_rate=LLM_BREAKER_ERROR_RATE,
+            breaker_cooldown=LLM_BREAKER_COOLDOWN_SECONDS,
+            breaker_probes=LLM_BREAKER_PROBES,
+        )
+
+    if names != ["fake"]:
+        logger.info("No API key configured, serving demo responses")
+    from app.services.providers.fake_provider import FakeProvider
+    return FakeProvider(respond=lambda system, user_content: _demo_text(system))
+
+
+# Built by open_provider() in the app lifespan
+provider: LLMProvider | None = None
+
+
+def get_provider() -> LLMProvider:
+    """The configured provider; built on first use outside the app lifespan."""
+    global provider
+    if provider is None:
+        provider = _create_provider()
+    return provider
+
+
+async def open_provider(warmup: bool) -> LLMProvider:
+    """Build the provider and, with ``warmup``, connect it ahead of traffic.
+
+    A failed or slow warmup is logged and otherwise ignored.
+    """
+    llm = get_provider()
+    if warmup:
+        try:
+            await asyncio.wait_for(llm.warmup(), timeout=LLM_WARMUP_TIMEOUT_SECONDS)
+            logger.info(f"Warmed up {type(llm).__name__}")
+        except Exception as e:
+            logger.warning(f"Provider warmup failed: {e!r}")
+    return llm
+
+
+async def close_provider() -> None:
+    global provider
+    if provider is not None:
+        await provider.aclose()
+        provider = None
+
+response_cache = ResponseCache(MemoryCacheBackend(LLM_CACHE_MAX_ENTRIES), ttl=LLM_CACHE_TTL_SECONDS)
+flights = SingleFlight(max_lag=LLM_STREAM_MAX_LAG)
+scheduler = Scheduler(
+    LLM_MAX_CONCURRENCY,
+    LLM_QUEUE_TIMEOUT_SECONDS,
+    LLM_MAX_QUEUE,
+    quota_wait=lambda: get_provider().quota_wait(),
+)
+
+# Static demo response served by the fake provider when no API key is configured
 _DEMO_RESPONSE = AIResponse.model_validate({
     "thought_process": "No API key configured. Returning a demo architecture.",
     "actions": [
@@ -111,7 +238,7 @@ _DEMO_RESPONSE = AIResponse.model_validate({
     "summary": "Demo architecture: Gateway → App Service → Postgres + Redis (no API key configured)",
 })
 
-SYSTEM_PROMPT = """You are Arch, an expert system design architect. You help users design distributed system architectures by generating and modifying node graphs.
+_SYSTEM_PROMPT_TEMPLATE = Template("""You are Arch, an expert system design architect. You help users design distributed system architectures by generating and modifying node graphs.
 
 CRITICAL: Return ONLY the raw JSON object. No markdown code fences. No text before or after. Your entire response must be valid JSON parseable by json.loads(). Do NOT wrap in ```json``` or any other markers.
 
@@ -156,10 +283,7 @@ Each action has an "op" field. Available operations:
 3. update_node: Update node properties
    {"op": "update_node", "id": "node_id", "data": {"label": "New Name", ...partial fields}}
 
-4. move_node: Move a node
-   {"op": "move_node", "id": "node_id", "position": {"x": N, "y": N}}
-
-5. add_edge: Connect two nodes
+${move_node_spec}5. add_edge: Connect two nodes
    {"op": "add_edge", "id": "edge_{source}_{target}_{counter}", "source": "source_node_id", "target": "target_node_id", "data": {"label": "connection label", "protocol": "http|grpc|ws|tcp|amqp|kafka", "animated": false}}
 
 6. remove_edge: Remove a connection
@@ -186,19 +310,7 @@ You MUST only use tech values from this list. Any other value will be rejected.
 - load_balancer: nginx, envoy, traefik, haproxy
 - service: python, go, node, rust, java, dotnet, elixir, ruby, php, prometheus, grafana, datadog, jaeger, sentry, auth0, clerk, keycloak, firebase_auth, supabase_auth
 
-## POSITIONING RULES (CRITICAL)
-- Grid unit: 250px horizontal, 200px vertical.
-- Left-to-right flow: Gateway → Load Balancer → Services → Databases/Caches/Queues.
-- Gateway: x=0, y=200
-- Load Balancer: x=250, y=200
-- Services: x=500+, spaced vertically by 200px starting at y=100
-- Databases: Same x as their service + 250, y + 100
-- Caches: Same x as their service + 250, y - 100
-- Queues: Between services horizontally, offset vertically
-- When adding to an existing graph, place new nodes relative to related existing nodes.
-- Avoid overlapping: check existing positions and offset by at least 200px.
-
-## ID CONVENTION
+${layout_rules}## ID CONVENTION
 - Nodes: node_{type}_{shortname}_{counter} (e.g., node_service_auth_01)
 - Edges: edge_{source_short}_{target_short}_{counter} (e.g., edge_auth_redis_01)
 
@@ -230,91 +342,226 @@ Response:
 
 ### Example 3: Direct modification (build immediately, no discussion needed)
 User: "Add caching to the auth service"
-(Given graph has node_service_auth_01 at position {x:500, y:100})
+${example_context}
 Response:
 {"thought_process":"User wants a specific modification — adding caching to auth service. This is a direct command so I'll build immediately.","actions":[{"op":"add_node","id":"node_cache_auth_01","type":"cache","position":{"x":750,"y":0},"data":{"label":"Auth Cache","nodeType":"cache","tech":"redis"}},{"op":"add_edge","id":"edge_auth_cache_01","source":"node_service_auth_01","target":"node_cache_auth_01","data":{"label":"caches sessions","protocol":"tcp"}}],"summary":"Added Redis cache for Auth Service."}
-"""
+""")
 
 
-def _build_generate_prompt(user_prompt: str, history: list[dict[str, str]] | None = None) -> str:
+_COORDINATE_PROMPT_PARTS = {
+    "move_node_spec": """4. move_node: Move a node
+   {"op": "move_node", "id": "node_id", "position": {"x": N, "y": N}}
+
+""",
+    "layout_rules": """## POSITIONING RULES (CRITICAL)
+- Grid unit: 250px horizontal, 200px vertical.
+- Left-to-right flow: Gateway → Load Balancer → Services → Databases/Caches/Queues.
+- Gateway: x=0, y=200
+- Load Balancer: x=250, y=200
+- Services: x=500+, spaced vertically by 200px starting at y=100
+- Databases: Same x as their service + 250, y + 100
+- Caches: Same x as their service + 250, y - 100
+- Queues: Between services horizontally, offset vertically
+- When adding to an existing graph, place new nodes relative to related existing nodes.
+- Avoid overlapping: check existing positions and offset by at least 200px.
+
+""",
+    "example_context": "(Given graph has node_service_auth_01 at position {x:500, y:100})",
+}
+
+_TOPOLOGY_PROMPT_PARTS = {
+    "move_node_spec": """4. move_node: Not available. The server positions every node.
+
+""",
+    "layout_rules": """## LAYOUT
+- NEVER include a "position" field. The server lays out the graph from node types and edges.
+- Point edges in the direction requests flow: Gateway → Load Balancer → Services → Databases/Caches/Queues.
+
+""",
+    "example_context": "(Given graph has node_service_auth_01)",
+}
+
+_POSITION_FIELD = re.compile(r'"position":\s*\{"x":\s*[-\w]+,\s*"y":\s*[-\w]+\},\s*')
+
+
+def _build_system_prompt(layout_mode: str) -> str:
+    """Render SYSTEM_PROMPT for a layout mode.
+
+    "coordinates" teaches the model the positioning grid. "topology" leaves
+    positions out entirely and lets app.services.layout place the nodes,
+    which saves output tokens on every add_node.
+    """
+    if layout_mode == "topology":
+        return _POSITION_FIELD.sub("", _SYSTEM_PROMPT_TEMPLATE.substitute(_TOPOLOGY_PROMPT_PARTS))
+    return _SYSTEM_PROMPT_TEMPLATE.substitute(_COORDINATE_PROMPT_PARTS)
+
+
+SYSTEM_PROMPT = _build_system_prompt(LLM_LAYOUT_MODE)
+
+
+# User content is laid out stable-first (see Prompt): instructions, graph
+# and history form the cacheable prefix, the new message comes last.
+
+
+def _history_text(history: list[dict[str, str]] | None) -> str:
     history_text = ""
     if history:
         history_text = "\n\nRecent conversation:\n"
         for msg in history[-5:]:
             role = "User" if msg["role"] == "user" else "Assistant"
             history_text += f"{role}: {msg['content']}\n"
+    return history_text
 
-    return f"""The canvas is currently empty. The user is starting a new conversation.
-{history_text}
-User's message: {user_prompt}
 
-Remember: If the user is describing or asking about a system, DISCUSS IT FIRST (return empty actions []) and have a conversation. Only generate the architecture when they explicitly approve or say to build it."""
+def _build_generate_prompt(user_prompt: str, history: list[dict[str, str]] | None = None) -> Prompt:
+    return Prompt(
+        prefix=f"""The canvas is currently empty. The user is starting a new conversation.
+
+Remember: If the user is describing or asking about a system, DISCUSS IT FIRST (return empty actions []) and have a conversation. Only generate the architecture when they explicitly approve or say to build it.
+{_history_text(history)}
+""",
+        request=f"User's message: {user_prompt}",
+    )
 
 
 def _build_modify_prompt(
     graph: GraphState,
     user_prompt: str,
     history: list[dict[str, str]],
-) -> str:
-    graph_json = graph.model_dump_json(indent=2, by_alias=True)
+) -> tuple[Prompt, IdAliases]:
+    # The model only sees the relevant part of large graphs; validation
+    # still runs against the full graph in the routes.
+    context, omitted = select_context(graph, user_prompt, history)
+    graph_json, aliases = encode_graph(
+        context,
+        include_positions=is_layout_request(user_prompt),
+        reserved_ids={n.id for n in graph.nodes} | {e.id for e in graph.edges},
+    )
+    if omitted:
+        graph_json += f"\n({omitted})"
+
+    return Prompt(
+        prefix=f"""The user wants to MODIFY an existing architecture.
+
+Analyze the current graph and return only the minimal actions needed to fulfill the user's request. Reference existing node IDs exactly as given when connecting to existing nodes.
+
+Current graph state (compact JSON; short IDs like n1/e1 are the real IDs for this request):
+{graph_json}
+{_history_text(history)}
+""",
+        request=f"User's request: {user_prompt}",
+    ), aliases
 
-    history_text = ""
-    if history:
-        history_text = "\n\nRecent conversation:\n"
-        for msg in history[-5:]:
-            role = "User" if msg["role"] == "user" else "Assistant"
-            history_text += f"{role}: {msg['content']}\n"
 
-    return f"""The user wants to MODIFY an existing architecture.
+# ── Cached provider calls ─────────────────────────────────
+# Entries hold the raw model output (before alias resolution and layout),
+# so streaming and non-streaming calls for the same input share them.
+# Only calls that reach the provider take a scheduler slot, charged to the
+# client that started them.
 
-Current graph state:
-{graph_json}
-{history_text}
-User's request: {user_prompt}
 
-Analyze the current graph and return only the minimal actions needed to fulfill the user's request. Reference existing node IDs when connecting to existing nodes."""
+def _cost(user_content: Prompt) -> float:
+    """Scheduler cost of a call: one unit per ~1k prompt tokens."""
+    return max(1.0, len(user_content) / 4000)
+
+
+async def _generate(system: str, user_content: Prompt, user: str) -> AIResponse:
+    key = response_cache.key(get_provider(), system, user_content)
+    text = await response_cache.get(key)
+    if text is None:
+        text = await flights.do(key, lambda: _generate_upstream(key, system, user_content, user))
+    # Parse per caller: concurrent callers must not share a mutable response
+    return AIResponse.model_validate_json(text)
+
+
+async def _generate_upstream(key: str, system: str, user_content: Prompt, user: str) -> str:
+    async with scheduler.slot(user, INTERACTIVE, _cost(user_content)):
+        response = await get_provider().generate(system, user_content)
+    text = response.model_dump_json(by_alias=True)
+    await response_cache.set(key, text)
+    return text
+
+
+async def _stream(system: str, user_content: Prompt, user: str) -> AsyncIterator[StreamEvent]:
+    key = response_cache.key(get_provider(), system, user_content)
+    cached = await response_cache.get(key)
+    if cached is not None:
+        async for event in _replay(cached, user_content):
+            yield event
+        return
+    # Identical streams in flight share one upstream call (see SingleFlight)
+    async for event in flights.stream(key, lambda: _stream_upstream(key, system, user_content, user)):
+        yield event
+
+
+async def _stream_upstream(key: str, system: str, user_content: Prompt, user: str) -> AsyncIterator[StreamEvent]:
+    # Admission (and shedding) happens here only: cache hits and single-flight
+    # joins never reach the model, so they are never shed
+    async with scheduler.slot(user, INTERACTIVE, _cost(user_content)):
+        async for event in get_provider().stream(system, user_content):
+            if isinstance(event, DoneEvent):
+                # Serialize before yielding: consumers mutate the response
+                await response_cache.set(key, event.response.model_dump_json(by_alias=True))
+            yield event
+
+
+async def _replay(text: str, user_content: Prompt) -> AsyncIterator[StreamEvent]:
+    """Replay a cached response as a stream, without pacing."""
+    yield ToolCallStartEvent(
+        tool_name="analyze_architecture",
+        tool_input={"prompt_length": len(user_content), "cached": True},
+    )
+    yield TokenEvent(token=text)
+    for action in IncrementalActionParser().feed(text):
+        yield ActionEvent(action=action)
+    yield ToolCallEndEvent(
+        tool_name="analyze_architecture",
+        tool_output={"status": "complete", "length": len(text)},
+    )
+    yield DoneEvent(response=AIResponse.model_validate_json(text))
 
 
 # ── Non-streaming API (preserved for fallback) ────────────
 
 
-async def call_llm(prompt: str, is_generate: bool = False) -> AIResponse:
-    if not provider:
-        return _DEMO_RESPONSE
+async def call_llm(prompt: str, is_generate: bool = False, user: str = "anonymous") -> AIResponse:
     if is_generate:
         user_content = _build_generate_prompt(prompt)
     else:
         raise ValueError("Use call_llm_modify for modifications")
-    return await provider.generate(SYSTEM_PROMPT, user_content)
+    return await _generate(SYSTEM_PROMPT, user_content, user)
 
 
 async def call_llm_modify(
     graph: GraphState,
     prompt: str,
     history: list[dict[str, str]],
+    user: str = "anonymous",
 ) -> AIResponse:
-    if not provider:
-        return _DEMO_RESPONSE
-    user_content = _build_modify_prompt(graph, prompt, history)
-    return await provider.generate(SYSTEM_PROMPT, user_content)
+    user_content, aliases = _build_modify_prompt(graph, prompt, history)
+    response = await _generate(SYSTEM_PROMPT, user_content, user)
+    return aliases.resolve_response(response)
 
 
-async def call_llm_generate(prompt: str, history: list[dict[str, str]] | None = None) -> AIResponse:
-    if not provider:
-        return _DEMO_RESPONSE
+async def call_llm_generate(
+    prompt: str,
+    history: list[dict[str, str]] | None = None,
+    user: str = "anonymous",
+) -> AIResponse:
     user_content = _build_generate_prompt(prompt, history)
-    return await provider.generate(SYSTEM_PROMPT, user_content)
+    return await _generate(SYSTEM_PROMPT, user_content, user)
 
 
 # ── Streaming API (new) ───────────────────────────────────
 
 
-async def stream_llm_generate(prompt: str, history: list[dict[str, str]] | None = None) -> AsyncIterator[StreamEvent]:
-    if not provider:
-        yield DoneEvent(response=_DEMO_RESPONSE)
-        return
+async def stream_llm_generate(
+    prompt: str,
+    history: list[dict[str, str]] | None = None,
+    user: str = "anonymous",
+) -> AsyncIterator[StreamEvent]:
     user_content = _build_generate_prompt(prompt, history)
-    async for event in provider.stream(SYSTEM_PROMPT, user_content):
+    async for event in _stream(SYSTEM_PROMPT, user_content, user):
         yield event
 
 
@@ -322,12 +569,14 @@ async def stream_llm_modify(
     graph: GraphState,
     prompt: str,
     history: list[dict[str, str]],
+    user: str = "anonymous",
 ) -> AsyncIterator[StreamEvent]:
-    if not provider:
-        yield DoneEvent(response=_DEMO_RESPONSE)
-        return
-    user_content = _build_modify_prompt(graph, prompt, history)
-    async for event in provider.stream(SYSTEM_PROMPT, user_content):
+    user_content, aliases = _build_modify_prompt(graph, prompt, history)
+    async for event in _stream(SYSTEM_PROMPT, user_content, user):
+        if isinstance(event, ActionEvent):
+            aliases.resolve(event.action)
+        elif isinstance(event, DoneEvent):
+            aliases.resolve_response(event.response)
         yield event
 
 
@@ -415,24 +664,39 @@ _DEMO_REVIEW = {
 }
 
 
-async def call_llm_review(graph: GraphState) -> dict:
+async def call_llm_review(graph: GraphState, user: str = "anonymous") -> dict:
     """Analyze architecture and return review JSON dict."""
-    import json as _json
+    graph_json, _ = encode_graph(graph, use_aliases=False)
+    user_content = Prompt(prefix=f"""Analyze this architecture and provide a detailed review with scores, cost estimates, and findings.
 
-    if not provider:
+Architecture graph:
+{graph_json}""")
+
+    key = response_cache.key(get_provider(), REVIEW_PROMPT, user_content)
+    text = await response_cache.get(key)
+    if text is None:
+        text = await flights.do(key, lambda: _review_upstream(key, user_content, user))
+    if text is None:
         return _DEMO_REVIEW
+    return json.loads(text)
 
-    graph_json = graph.model_dump_json(indent=2, by_alias=True)
-    user_content = f"""Analyze this architecture and provide a detailed review with scores, cost estimates, and findings.
 
-Architecture graph:
-{graph_json}"""
-
-    text = await provider.generate_text(REVIEW_PROMPT, user_content)
+async def _review_upstream(key: str, user_content: Prompt, user: str) -> str | None:
+    # Reviews queue behind interactive generate/modify calls
+    async with scheduler.slot(user, BACKGROUND, _cost(user_content)):
+        text = await get_provider().generate_text(REVIEW_PROMPT, user_content)
     try:
-        return _json.loads(text, strict=False)
-    except _json.JSONDecodeError:
+        review = json.dumps(json.loads(text, strict=False))
+    except json.JSONDecodeError:
         logger.warning("Review JSON parse failed, returning demo review")
-        return _DEMO_REVIEW
+        return None
+    # Only cache reviews that parsed, so a bad answer is not served again
+    await response_cache.set(key, review)
+    return review
 
 
+def _demo_text(system: str) -> str:
+    """Canned provider output for demo mode (see FakeProvider)."""
+    if system == REVIEW_PROMPT:
+        return json.dumps(_DEMO_REVIEW)
+    return _DEMO_RESPONSE.model_dump_json(by_alias=True)
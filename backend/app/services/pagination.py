@@ -0,0 +1,67 @@
+"""Keyset pagination and field projection for list endpoints."""
+from __future__ import annotations
+import base64
+import json
+import re
+
+# Cursor values end up inside a PostgREST filter string
+_TIMESTAMP = re.compile(r"^[0-9T:.+\- ]+$")
+_ID = re.compile(r"^[0-9A-Za-z_\-]+$")
+
+# Lists are ordered newest first by (updated_at, id); id breaks ties so no
+# row is skipped or repeated between pages.
+
+
+def encode_cursor(row: dict) -> str:
+    """Opaque token for the page after ``row`` (the last row of a page)."""
+    raw = json.dumps([row["updated_at"], row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    """Raises ValueError for tokens not made by encode_cursor."""
+    try:
+        updated_at, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(updated_at, str) or not isinstance(row_id, str) \
+            or not _TIMESTAMP.match(updated_at) or not _ID.match(row_id):
+        raise ValueError("Invalid cursor")
+    return updated_at, row_id
+
+
+def keyset_page(query, cursor: str | None, limit: int):
+    """Order a PostgREST query newest first and start it after ``cursor``.
+
+    One extra row is requested so callers can tell whether a next page
+    exists (see next_cursor). With an index on (updated_at DESC, id DESC)
+    every page costs the same, however deep.
+    """
+    if cursor:
+        updated_at, row_id = decode_cursor(cursor)
+        query = query.or_(
+            f'updated_at.lt."{updated_at}",and(updated_at.eq."{updated_at}",id.lt."{row_id}")'
+        )
+    return query.order("updated_at", desc=True).order("id", desc=True).limit(limit + 1)
+
+
+def next_cursor(rows: list[dict], limit: int) -> tuple[list[dict], str | None]:
+    """Trim the extra row fetched by keyset_page and return the next cursor."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1])
+
+
+def parse_fields(fields: str | None, allowed: set[str]) -> set[str] | None:
+    """``fields=a,b`` query parameter -> set of names, or None for all.
+
+    Raises ValueError for unknown names. ``id`` is always included.
+    """
+    if not fields:
+        return None
+    wanted = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = wanted - allowed
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return wanted | {"id"}
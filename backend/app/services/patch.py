@@ -0,0 +1,72 @@
+"""Server-side application of GraphActions to stored iteration graphs."""
+from __future__ import annotations
+
+from app.models.actions import GraphAction
+
+
+def apply_action(nodes: list[dict], edges: list[dict], action: GraphAction) -> tuple[list[dict], list[dict]]:
+    """Apply one action to stored (React Flow shaped) nodes and edges.
+
+    Mirrors graphSlice.applyPatch on the frontend: adds of existing IDs and
+    updates of missing ones are no-ops, removing a node removes its edges,
+    and update data is merged shallowly. Fields the actions do not know
+    about (e.g. React Flow's ``measured``) are left untouched.
+    """
+    match action.op:
+        case "add_node":
+            if not any(n["id"] == action.id for n in nodes):
+                position = action.position.model_dump() if action.position else {"x": 0, "y": 0}
+                nodes.append({
+                    "id": action.id,
+                    "type": action.type,
+                    "position": position,
+                    "data": action.data.model_dump(by_alias=True, exclude_none=True),
+                })
+
+        case "remove_node":
+            nodes = [n for n in nodes if n["id"] != action.id]
+            edges = [e for e in edges if e["source"] != action.id and e["target"] != action.id]
+
+        case "update_node":
+            for node in nodes:
+                if node["id"] == action.id:
+                    node["data"] = {**node.get("data", {}), **action.data}
+                    break
+
+        case "move_node":
+            for node in nodes:
+                if node["id"] == action.id:
+                    node["position"] = action.position.model_dump()
+                    break
+
+        case "add_edge":
+            if not any(e["id"] == action.id for e in edges):
+                edge = {
+                    "id": action.id,
+                    "source": action.source,
+                    "target": action.target,
+                    "type": "arch",
+                    "data": action.data.model_dump(exclude_none=True) if action.data else {"label": ""},
+                }
+                if action.source_handle:
+                    edge["sourceHandle"] = action.source_handle
+                if action.target_handle:
+                    edge["targetHandle"] = action.target_handle
+                edges.append(edge)
+
+        case "remove_edge":
+            edges = [e for e in edges if e["id"] != action.id]
+
+        case "update_edge":
+            for edge in edges:
+                if edge["id"] == action.id:
+                    edge["data"] = {**(edge.get("data") or {}), **action.data}
+                    break
+
+    return nodes, edges
+
+
+def apply_actions(nodes: list[dict], edges: list[dict], actions: list[GraphAction]) -> tuple[list[dict], list[dict]]:
+    for action in actions:
+        nodes, edges = apply_action(nodes, edges, action)
+    return nodes, edges
@@ -1,52 +1,93 @@
 from __future__ import annotations
+import asyncio
 import logging
-from supabase import create_client, Client
+from supabase import acreate_client, AsyncClient
 
 from app.config import SUPABASE_URL, SUPABASE_KEY
 from app.models.persistence import GraphSaveRequest, GraphSummary, GraphDetail, GraphSaveResponse
+from app.services.pagination import keyset_page, next_cursor
 
 logger = logging.getLogger(__name__)
 
-_client: Client | None = None
+# One async client per process: its HTTP connection pool is reused across
+# requests and no database round-trip blocks the event loop
+_client: AsyncClient | None = None
+_client_lock = asyncio.Lock()
 
 
-def _get_client() -> Client:
+async def _get_client() -> AsyncClient:
     global _client
     if _client is None:
-        if not SUPABASE_URL or not SUPABASE_KEY:
-            raise RuntimeError("SUPABASE_URL and SUPABASE_KEY must be set")
-        _client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        async with _client_lock:
+            if _client is None:
+                if not SUPABASE_URL or not SUPABASE_KEY:
+                    raise RuntimeError("SUPABASE_URL and SUPABASE_KEY must be set")
+                _client = await acreate_client(SUPABASE_URL, SUPABASE_KEY)
     return _client
 
 
-def save_graph(req: GraphSaveRequest) -> GraphSaveResponse:
-    client = _get_client()
+class PreconditionFailed(Exception):
+    """The graph is not at the version the client expected (If-Match)."""
+
+
+async def save_graph(req: GraphSaveRequest, expected_version: int | None = None) -> GraphSaveResponse:
+    """Insert or overwrite a graph.
+
+    Existing graphs get the next server-side version, so versions can back
+    ETags. With ``expected_version`` the write only happens if the stored
+    graph is still at that version; otherwise PreconditionFailed.
+    """
+    client = await _get_client()
 
     row = {
         "name": req.name,
         "nodes": req.nodes,
         "edges": req.edges,
         "version": req.version,
+        # Summary columns, so list_graphs does not download the graphs
+        "node_count": len(req.nodes),
+        "edge_count": len(req.edges),
     }
 
+    current = None
     if req.id:
-        row["id"] = req.id
+        existing = (
+            await client.table("graphs")
+            .select("version")
+            .eq("id", req.id)
+            .limit(1)
+            .execute()
+        ).data
+        current = existing[0]["version"] if existing else None
+
+    if expected_version is not None and current != expected_version:
+        raise PreconditionFailed(f"Graph is at version {current}, not {expected_version}")
+
+    if current is None:
+        if req.id:
+            row["id"] = req.id
+        result = await client.table("graphs").insert(row).execute()
+    else:
+        row["version"] = current + 1
+        # Compare-and-set, so of two concurrent writers only one wins
         result = (
-            client.table("graphs")
-            .upsert(row, on_conflict="id")
+            await client.table("graphs")
+            .update(row)
+            .eq("id", req.id)
+            .eq("version", current)
             .execute()
         )
-    else:
-        result = client.table("graphs").insert(row).execute()
+        if not result.data:
+            raise PreconditionFailed("Graph was modified concurrently")
 
     data = result.data[0]
     return GraphSaveResponse(id=data["id"], name=data["name"], version=data["version"])
 
 
-def get_graph(graph_id: str) -> GraphDetail:
-    client = _get_client()
+async def get_graph(graph_id: str) -> GraphDetail:
+    client = await _get_client()
     result = (
-        client.table("graphs")
+        await client.table("graphs")
         .select("*")
         .eq("id", graph_id)
         .single()
@@ -64,31 +105,43 @@ def get_graph(graph_id: str) -> GraphDetail:
     )
 
 
-def list_graphs() -> list[GraphSummary]:
-    client = _get_client()
-    result = (
-        client.table("graphs")
-        .select("id, name, nodes, edges, version, created_at, updated_at")
-        .order("updated_at", desc=True)
-        .limit(50)
-        .execute()
-    )
+# Listing fields (as returned) -> graph columns
+GRAPH_FIELDS: dict[str, str] = {
+    "id": "id",
+    "name": "name",
+    "nodeCount": "node_count",
+    "edgeCount": "edge_count",
+    "version": "version",
+    "createdAt": "created_at",
+    "updatedAt": "updated_at",
+}
+
+
+async def list_graphs(
+    limit: int = 50,
+    cursor: str | None = None,
+    fields: set[str] | None = None,
+) -> tuple[list[GraphSummary], str | None]:
+    """One page of graphs, newest first, and the next cursor.
+
+    With ``fields``, only those summary fields are set (the route drops the
+    unset ones from the response).
+    """
+    client = await _get_client()
+    wanted = fields or set(GRAPH_FIELDS)
+    columns = {"id", "updated_at"} | {GRAPH_FIELDS[f] for f in wanted}
+    query = client.table("graphs").select(", ".join(sorted(columns)))
+    rows = (await keyset_page(query, cursor, limit).execute()).data
+    rows, next_page = next_cursor(rows, limit)
+
     summaries = []
-    for row in result.data:
+    for row in rows:
         summaries.append(
-            GraphSummary(
-                id=row["id"],
-                name=row["name"],
-                nodeCount=len(row["nodes"]) if row["nodes"] else 0,
-                edgeCount=len(row["edges"]) if row["edges"] else 0,
-                version=row["version"],
-                createdAt=row["created_at"],
-                updatedAt=row["updated_at"],
-            )
+            GraphSummary(**{f: row[GRAPH_FIELDS[f]] for f in wanted})
         )
-    return summaries
+    return summaries, next_page
 
 
-def delete_graph(graph_id: str) -> None:
-    client = _get_client()
-    client.table("graphs").delete().eq("id", graph_id).execute()
+async def delete_graph(graph_id: str) -> None:
+    client = await _get_client()
+    await client.table("graphs").delete().eq("id", graph_id).execute()
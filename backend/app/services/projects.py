@@ -1,51 +1,150 @@
 from __future__ import annotations
+import asyncio
+import json
 import logging
-from supabase import create_client, Client
+from pydantic import TypeAdapter
+from supabase import acreate_client, AsyncClient
 
-from app.config import SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY
+from app.config import (
+    ITERATION_CACHE_MAX_ENTRIES,
+    ITERATION_CACHE_TTL_SECONDS,
+    ITERATION_SNAPSHOT_EVERY,
+    PREVIEW_MAX_NODES,
+    SUPABASE_URL,
+    SUPABASE_SERVICE_ROLE_KEY,
+)
+from app.models.actions import GraphAction
+from app.services.cache_backend import CacheBackend, MemoryCacheBackend
+from app.services.pagination import keyset_page, next_cursor
+from app.services.patch import apply_actions
 
 logger = logging.getLogger(__name__)
 
-_client: Client | None = None
+_action_adapter = TypeAdapter(GraphAction)
 
+# One async client per process: its HTTP connection pool is reused across
+# requests and no database round-trip blocks the event loop
+_client: AsyncClient | None = None
+_client_lock = asyncio.Lock()
 
-def _get_client() -> Client:
+
+async def _get_client() -> AsyncClient:
     global _client
     if _client is None:
-        if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
-            raise RuntimeError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set")
-        _client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+        async with _client_lock:
+            if _client is None:
+                if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
+                    raise RuntimeError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set")
+                _client = await acreate_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
     return _client
 
 
+class ConflictError(Exception):
+    """The iteration changed since the version the client based its edit on."""
+
+
+# ── Iteration cache ───────────────────────────────────────
+
+
+class IterationCache:
+    """Read-through cache of loaded iterations (snapshot + replayed ops).
+
+    Entries are keyed by iteration ID and head seq, and a per-iteration
+    pointer names the current seq. Writers store the new version before
+    moving the pointer (or just drop the pointer), so with a shared backend
+    every worker reads the latest version. Rows are stored serialized, so
+    callers can mutate what they get.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, iteration_id: str, seq: int | None = None) -> dict | None:
+        """The cached head, or the version at ``seq`` when one is named."""
+        try:
+            if seq is None:
+                seq = await self.backend.get(f"iteration:{iteration_id}")
+            value = await self.backend.get(f"iteration:{iteration_id}:{seq}") if seq is not None else None
+        except Exception as e:
+            logger.warning(f"Iteration cache read failed: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    async def put(self, row: dict) -> None:
+        try:
+            await self.backend.set(f"iteration:{row['id']}:{row['head_seq']}", json.dumps(row), self.ttl)
+            await self.backend.set(f"iteration:{row['id']}", str(row["head_seq"]), self.ttl)
+        except Exception as e:
+            logger.warning(f"Iteration cache write failed: {e}")
+
+    async def invalidate(self, iteration_id: str) -> None:
+        try:
+            await self.backend.delete(f"iteration:{iteration_id}")
+        except Exception as e:
+            logger.warning(f"Iteration cache invalidation failed: {e}")
+
+    def snapshot(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": getattr(self.backend, "evictions", 0),
+        }
+
+
+iteration_cache = IterationCache(MemoryCacheBackend(ITERATION_CACHE_MAX_ENTRIES), ttl=ITERATION_CACHE_TTL_SECONDS)
+
+
 # ── Projects ─────────────────────────────────────────────
 
 def _project_to_dict(row: dict, node_count: int = 0, iteration_count: int = 0, first_iteration_id: str | None = None) -> dict:
     result = {
         "id": row["id"],
-        "name": row["name"],
+        "name": row.get("name"),
         "description": row.get("description"),
         "nodeCount": node_count,
         "iterationCount": iteration_count,
-        "createdAt": row["created_at"],
-        "updatedAt": row["updated_at"],
+        "createdAt": row.get("created_at"),
+        "updatedAt": row.get("updated_at"),
     }
     if first_iteration_id:
         result["firstIterationId"] = first_iteration_id
     return result
 
 
-def create_project(user_id: str, name: str, description: str | None = None) -> dict:
-    client = _get_client()
+# Listing fields (as returned) -> project columns they are built from
+PROJECT_FIELDS: dict[str, list[str]] = {
+    "id": ["id"],
+    "name": ["name"],
+    "description": ["description"],
+    "nodeCount": ["node_count"],
+    "iterationCount": ["iteration_count"],
+    "createdAt": ["created_at"],
+    "updatedAt": ["updated_at"],
+    "firstIterationId": ["first_iteration_id"],
+    "previewNodes": ["first_iteration_id", "preview_nodes"],
+}
+
+
+async def create_project(user_id: str, name: str, description: str | None = None) -> dict:
+    client = await _get_client()
     result = (
-        client.table("projects")
+        await client.table("projects")
         .insert({"user_id": user_id, "name": name, "description": description})
         .execute()
     )
     row = result.data[0]
     # Create first iteration
     iter_result = (
-        client.table("iterations")
+        await client.table("iterations")
         .insert({"project_id": row["id"], "name": "v1", "ordinal": 1, "nodes": [], "edges": []})
         .execute()
     )
@@ -53,36 +152,38 @@ def create_project(user_id: str, name: str, description: str | None = None) -> d
     return _project_to_dict(row, node_count=0, iteration_count=1, first_iteration_id=first_iter["id"])
 
 
-def list_projects(user_id: str) -> list[dict]:
-    client = _get_client()
-    # Single query: projects + their iterations via nested select (avoids N+1)
-    rows = (
-        client.table("projects")
-        .select("id, name, description, created_at, updated_at, iterations(id, nodes, ordinal)")
-        .eq("user_id", user_id)
-        .order("updated_at", desc=True)
-        .limit(50)
-        .execute()
-    ).data
+async def list_projects(
+    user_id: str,
+    limit: int = 50,
+    cursor: str | None = None,
+    fields: set[str] | None = None,
+) -> tuple[list[dict], str | None]:
+    """One page of the user's projects, newest first, and the next cursor.
+
+    ``fields`` limits the returned keys (see PROJECT_FIELDS); None returns
+    all of them.
+    """
+    client = await _get_client()
+    wanted = fields or set(PROJECT_FIELDS)
+    # Summary columns only (kept up to date from the iterations, see
+    # _iteration_summary), so the payload does not grow with graph size
+    columns = {"id", "updated_at"} | {c for f in wanted for c in PROJECT_FIELDS[f]}
+    query = client.table("projects").select(", ".join(sorted(columns))).eq("user_id", user_id)
+    rows = (await keyset_page(query, cursor, limit).execute()).data
+    rows, next_page = next_cursor(rows, limit)
 
     results = []
     for p in rows:
-        iters = sorted(p.get("iterations") or [], key=lambda i: i.get("ordinal", 0))
-        node_count = sum(len(i.get("nodes") or []) for i in iters)
-        first = iters[0] if iters else None
-        d = _project_to_dict(p, node_count=node_count, iteration_count=len(iters),
-                             first_iteration_id=first["id"] if first else None)
-        if first:
-            d["previewNodes"] = [
-                {"type": n.get("type", "service"), "x": n.get("position", {}).get("x", 0), "y": n.get("position", {}).get("y", 0)}
-                for n in (first.get("nodes") or [])
-            ]
-        results.append(d)
-    return results
-
-
-def update_project(project_id: str, user_id: str, name: str | None = None, description: str | None = None) -> None:
-    client = _get_client()
+        d = _project_to_dict(p, node_count=p.get("node_count", 0), iteration_count=p.get("iteration_count", 0),
+                             first_iteration_id=p.get("first_iteration_id"))
+        if p.get("first_iteration_id") and "preview_nodes" in p:
+            d["previewNodes"] = p["preview_nodes"] or []
+        results.append({k: v for k, v in d.items() if k in wanted})
+    return results, next_page
+
+
+async def update_project(project_id: str, user_id: str, name: str | None = None, description: str | None = None) -> None:
+    client = await _get_client()
     updates = {}
     if name is not None:
         updates["name"] = name
@@ -90,31 +191,60 @@ def update_project(project_id: str, user_id: str, name: str | None = None, descr
         updates["description"] = description
     if not updates:
         return
-    client.table("projects").update(updates).eq("id", project_id).eq("user_id", user_id).execute()
+    await client.table("projects").update(updates).eq("id", project_id).eq("user_id", user_id).execute()
 
 
-def delete_project(project_id: str, user_id: str) -> None:
-    client = _get_client()
-    client.table("projects").delete().eq("id", project_id).eq("user_id", user_id).execute()
+async def delete_project(project_id: str, user_id: str) -> None:
+    client = await _get_client()
+    iterations = (
+        await client.table("iterations")
+        .select("id")
+        .eq("project_id", project_id)
+        .execute()
+    ).data
+    await client.table("projects").delete().eq("id", project_id).eq("user_id", user_id).execute()
+    for it in iterations:
+        await iteration_cache.invalidate(it["id"])
 
 
 # ── Iterations ────────────────────────────────────────────
 
-def create_iteration(project_id: str, name: str, nodes: list, edges: list) -> dict:
-    client = _get_client()
+def _iteration_summary(nodes: list) -> dict:
+    """Columns stored next to an iteration's graph.
+
+    A database trigger rolls them up into the project row (node_count,
+    iteration_count, first_iteration_id, preview_nodes) for the dashboard
+    whenever they change.
+    """
+    step = max(1, -(-len(nodes) // PREVIEW_MAX_NODES))
+    return {
+        "node_count": len(nodes),
+        "preview_nodes": [
+            {"type": n.get("type", "service"), "x": n.get("position", {}).get("x", 0), "y": n.get("position", {}).get("y", 0)}
+            for n in nodes[::step]
+        ],
+    }
+
+
+async def create_iteration(project_id: str, name: str, nodes: list, edges: list) -> dict:
+    client = await _get_client()
     existing = (
-        client.table("iterations")
+        await client.table("iterations")
         .select("id")
         .eq("project_id", project_id)
         .execute()
     ).data
     ordinal = len(existing) + 1
     result = (
-        client.table("iterations")
-        .insert({"project_id": project_id, "name": name, "ordinal": ordinal, "nodes": nodes, "edges": edges})
+        await client.table("iterations")
+        .insert({
+            "project_id": project_id, "name": name, "ordinal": ordinal, "nodes": nodes, "edges": edges,
+            **_iteration_summary(nodes),
+        })
         .execute()
     )
     row = result.data[0]
+    await iteration_cache.invalidate(row["id"])
     return {
         "id": row["id"],
         "projectId": row["project_id"],
@@ -125,36 +255,159 @@ def create_iteration(project_id: str, name: str, nodes: list, edges: list) -> di
     }
 
 
-def get_iteration(iteration_id: str) -> dict:
-    client = _get_client()
+# Iterations are stored as a snapshot (nodes/edges as of snapshot_seq) plus
+# an append-only log of the actions applied since (iteration_ops, seq up to
+# head_seq). Loads replay the tail; every ITERATION_SNAPSHOT_EVERY ops the
+# log is folded into a new snapshot.
+
+async def _load_iteration(client: AsyncClient, iteration_id: str, seq: int | None = None) -> dict:
+    # Every write drops the cache pointer, so a hit is the head as of the
+    # last write this cache saw. A caller that names the seq it expects
+    # gets that version, and its compare-and-set write catches a head
+    # that has moved on.
+    row = await iteration_cache.get(iteration_id, seq)
+    if row is not None:
+        return row
+    row = await _fetch_iteration(client, iteration_id)
+    await iteration_cache.put(row)
+    return row
+
+
+async def _fetch_iteration(client: AsyncClient, iteration_id: str) -> dict:
     row = (
-        client.table("iterations")
+        await client.table("iterations")
         .select("*")
         .eq("id", iteration_id)
         .single()
         .execute()
     ).data
+    nodes, edges = row["nodes"] or [], row["edges"] or []
+    if row["head_seq"] > row["snapshot_seq"]:
+        ops = (
+            await client.table("iteration_ops")
+            .select("action")
+            .eq("iteration_id", iteration_id)
+            .gt("seq", row["snapshot_seq"])
+            .lte("seq", row["head_seq"])
+            .order("seq")
+            .execute()
+        ).data
+        nodes, edges = apply_actions(nodes, edges, [_action_adapter.validate_python(op["action"]) for op in ops])
+    row["nodes"], row["edges"] = nodes, edges
+    return row
+
+
+async def get_iteration(iteration_id: str) -> dict:
+    client = await _get_client()
+    row = await _load_iteration(client, iteration_id)
     return {
         "id": row["id"],
         "projectId": row["project_id"],
         "name": row["name"],
         "ordinal": row["ordinal"],
-        "nodes": row["nodes"] or [],
-        "edges": row["edges"] or [],
+        "nodes": row["nodes"],
+        "edges": row["edges"],
+        "seq": row["head_seq"],
         "createdAt": row["created_at"],
         "updatedAt": row["updated_at"],
     }
 
 
-def save_iteration(iteration_id: str, nodes: list, edges: list) -> None:
-    client = _get_client()
-    client.table("iterations").update({"nodes": nodes, "edges": edges}).eq("id", iteration_id).execute()
+async def _seqs(client: AsyncClient, iteration_id: str) -> dict:
+    return (
+        await client.table("iterations")
+        .select("snapshot_seq, head_seq")
+        .eq("id", iteration_id)
+        .single()
+        .execute()
+    ).data
+
+
+async def _advance_head(client: AsyncClient, iteration_id: str, expected_seq: int, updates: dict) -> None:
+    """Compare-and-set on head_seq, so only one concurrent writer wins."""
+    result = (
+        await client.table("iterations")
+        .update(updates)
+        .eq("id", iteration_id)
+        .eq("head_seq", expected_seq)
+        .execute()
+    )
+    if not result.data:
+        raise ConflictError(f"Iteration {iteration_id} was modified concurrently")
+
+
+async def _compact(client: AsyncClient, iteration_id: str, snapshot_seq: int) -> None:
+    """Drop ops already folded into the snapshot."""
+    await client.table("iteration_ops").delete().eq("iteration_id", iteration_id).lte("seq", snapshot_seq).execute()
+
+
+async def patch_iteration(iteration_id: str, actions: list[GraphAction], base_seq: int | None = None) -> int:
+    """Apply actions to an iteration and append them to its op log.
+
+    Returns the new head seq. Raises ConflictError when ``base_seq`` is
+    given and the iteration has moved past it, or another write won.
+    """
+    client = await _get_client()
+    row = await _load_iteration(client, iteration_id, base_seq)
+    head = row["head_seq"]
+    if base_seq is not None and base_seq != head:
+        raise ConflictError(f"Iteration {iteration_id} is at seq {head}, not {base_seq}")
+    if not actions:
+        return head
+
+    new_head = head + len(actions)
+    nodes, edges = apply_actions(row["nodes"], row["edges"], actions)
+    # Most patches leave the summary as it was; rewriting it would still
+    # fire the project rollup trigger
+    updates: dict = {k: v for k, v in _iteration_summary(nodes).items() if row.get(k) != v}
+    snapshot = new_head - row["snapshot_seq"] >= ITERATION_SNAPSHOT_EVERY
+    if snapshot:
+        updates.update(nodes=nodes, edges=edges, snapshot_seq=new_head)
+    # The ops and the head move in one transaction (migrations/004, 006), so
+    # a failure cannot leave ops above the head
+    result = await client.rpc("append_iteration_ops", {
+        "p_iteration_id": iteration_id,
+        "p_expected_seq": head,
+        "p_actions": [action.model_dump(mode="json", by_alias=True) for action in actions],
+        "p_updates": updates,
+    }).execute()
+    if result.data is None:
+        await iteration_cache.invalidate(iteration_id)
+        raise ConflictError(f"Iteration {iteration_id} was modified concurrently")
+    if snapshot:
+        await _compact(client, iteration_id, new_head)
+    # Autosaves patch constantly; cache the row as the database left it
+    # (updated_at included) rather than dropping it
+    await iteration_cache.put({**result.data, "nodes": nodes, "edges": edges})
+    return new_head
+
+
+async def save_iteration(iteration_id: str, nodes: list, edges: list, expected_seq: int | None = None) -> int:
+    """Replace the whole graph with a new snapshot one seq past the head.
+
+    With ``expected_seq`` the save only happens if the iteration is still
+    at that seq; otherwise ConflictError.
+    """
+    client = await _get_client()
+    head = (await _seqs(client, iteration_id))["head_seq"]
+    if expected_seq is not None and expected_seq != head:
+        raise ConflictError(f"Iteration {iteration_id} is at seq {head}, not {expected_seq}")
+    new_head = head + 1
+    try:
+        await _advance_head(client, iteration_id, head, {
+            "nodes": nodes, "edges": edges, "snapshot_seq": new_head, "head_seq": new_head,
+            **_iteration_summary(nodes),
+        })
+    finally:
+        await iteration_cache.invalidate(iteration_id)
+    await _compact(client, iteration_id, new_head)
+    return new_head
 
 
-def list_iterations(project_id: str) -> list[dict]:
-    client = _get_client()
+async def list_iterations(project_id: str) -> list[dict]:
+    client = await _get_client()
     rows = (
-        client.table("iterations")
+        await client.table("iterations")
         .select("id, project_id, name, ordinal, created_at, updated_at")
         .eq("project_id", project_id)
         .order("ordinal")
@@ -4,42 +4,76 @@ import json
 import logging
 from typing import AsyncIterator
 
-from anthropic import AsyncAnthropic
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
 
 from app.models.actions import AIResponse
 from .base import (
+    HttpPool,
     LLMProvider,
+    Prompt,
     StreamEvent,
     TokenEvent,
     ToolCallStartEvent,
     ToolCallEndEvent,
+    ActionEvent,
     DoneEvent,
+    IncrementalActionParser,
     strip_markdown_fences,
 )
+from .quota import QuotaPacer
 
 logger = logging.getLogger(__name__)
 
+_CACHE_BREAKPOINT = {"type": "ephemeral"}
+
 
 class AnthropicProvider(LLMProvider):
-    def __init__(self, api_key: str, model: str):
-        self.client = AsyncAnthropic(api_key=api_key)
+    def __init__(self, api_key: str, model: str, pool: HttpPool | None = None, pacer: QuotaPacer | None = None):
+        super().__init__()
+        self.pacer = pacer
+        self.client = AsyncAnthropic(
+            api_key=api_key,
+            http_client=DefaultAsyncHttpxClient(**(pool or HttpPool()).client_kwargs(pacer)),
+        )
         self.model = model
 
-    async def generate_text(self, system: str, user_content: str) -> str:
-        response = await self.client.messages.create(
-            model=self.model,
-            system=system,
-            messages=[{"role": "user", "content": user_content}],
-            temperature=0.3,
-            max_tokens=4096,
-        )
+    async def warmup(self) -> None:
+        await self.client.with_options(max_retries=0).models.list(limit=1)
+
+    async def aclose(self) -> None:
+        await self.client.close()
+
+    def _request(self, system: str, user_content: Prompt) -> dict:
+        """Message layout with cache breakpoints after the system prompt and
+        after the stable prefix of the user turn."""
+        content = []
+        if user_content.prefix:
+            content.append({"type": "text", "text": user_content.prefix, "cache_control": _CACHE_BREAKPOINT})
+        if user_content.request:
+            content.append({"type": "text", "text": user_content.request})
+        return {
+            "model": self.model,
+            "system": [{"type": "text", "text": system, "cache_control": _CACHE_BREAKPOINT}],
+            "messages": [{"role": "user", "content": content}],
+            "temperature": self.temperature,
+            "max_tokens": 4096,
+        }
+
+    def _record_usage(self, usage) -> None:
+        cached = usage.cache_read_input_tokens or 0
+        total = usage.input_tokens + cached + (usage.cache_creation_input_tokens or 0)
+        self.cache_stats.record(input_tokens=total, cached_tokens=cached)
+
+    async def generate_text(self, system: str, user_content: Prompt) -> str:
+        response = await self.client.messages.create(**self._request(system, user_content))
+        self._record_usage(response.usage)
         return strip_markdown_fences(response.content[0].text)
 
-    async def generate(self, system: str, user_content: str) -> AIResponse:
+    async def generate(self, system: str, user_content: Prompt) -> AIResponse:
         text = await self.generate_text(system, user_content)
         return AIResponse.model_validate(json.loads(text, strict=False))
 
-    async def stream(self, system: str, user_content: str) -> AsyncIterator[StreamEvent]:
+    async def stream(self, system: str, user_content: Prompt) -> AsyncIterator[StreamEvent]:
         # Synthetic tool-call for UI visualization
         yield ToolCallStartEvent(
             tool_name="analyze_architecture",
@@ -47,16 +81,15 @@ class AnthropicProvider(LLMProvider):
         )
 
         full_text = ""
-        async with self.client.messages.stream(
-            model=self.model,
-            system=system,
-            messages=[{"role": "user", "content": user_content}],
-            temperature=0.3,
-            max_tokens=4096,
-        ) as stream:
+        parser = IncrementalActionParser()
+        # Leaving the block, also on cancellation, closes the HTTP stream
+        async with self.client.messages.stream(**self._request(system, user_content)) as stream:
             async for text in stream.text_stream:
                 full_text += text
                 yield TokenEvent(token=text)
+                for action in parser.feed(text):
+                    yield ActionEvent(action=action)
+            self._record_usage((await stream.get_final_message()).usage)
 
         # Parse the completed response
         yield ToolCallEndEvent(
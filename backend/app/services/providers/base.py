@@ -1,10 +1,18 @@
 """Base LLM provider abstraction with streaming event types."""
 from __future__ import annotations
+import json
+import logging
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from typing import AsyncIterator
 
-from app.models.actions import AIResponse
+import httpx
+from pydantic import TypeAdapter, ValidationError
+
+from app.models.actions import AIResponse, GraphAction
+from .quota import PacedTransport, QuotaPacer
+
+logger = logging.getLogger(__name__)
 
 
 # ── Stream events ──────────────────────────────────────────
@@ -36,6 +44,12 @@ class ToolCallEndEvent(StreamEvent):
     tool_output: dict
 
 
+@dataclass
+class ActionEvent(StreamEvent):
+    """A single graph action, parsed as soon as it finished streaming."""
+    action: GraphAction
+
+
 @dataclass
 class DoneEvent(StreamEvent):
     """Final event carrying the parsed AIResponse."""
@@ -48,6 +62,56 @@ class ErrorEvent(StreamEvent):
     message: str
 
 
+# ── Prompt layout & cache accounting ─────────────────────
+
+
+@dataclass
+class Prompt:
+    """User content split for prefix caching.
+
+    ``prefix`` holds what stays the same across calls in a conversation
+    (graph state, history, standing instructions) and always comes first,
+    right after the system prompt, so providers can reuse it. ``request``
+    is the part that changes on every call.
+    """
+    prefix: str
+    request: str = ""
+
+    def __str__(self) -> str:
+        return self.prefix + self.request
+
+    def __len__(self) -> int:
+        return len(self.prefix) + len(self.request)
+
+
+@dataclass
+class CacheStats:
+    """Prompt-cache hits and misses as reported by the provider."""
+    hits: int = 0
+    misses: int = 0
+    cached_input_tokens: int = 0
+    input_tokens: int = 0
+
+    def record(self, input_tokens: int, cached_tokens: int) -> None:
+        if cached_tokens > 0:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self.cached_input_tokens += cached_tokens
+        self.input_tokens += input_tokens
+        logger.debug(f"Prompt cache {'hit' if cached_tokens else 'miss'}: {cached_tokens}/{input_tokens} input tokens cached")
+
+    def snapshot(self) -> dict:
+        calls = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / calls if calls else 0.0,
+            "cached_input_tokens": self.cached_input_tokens,
+            "input_tokens": self.input_tokens,
+        }
+
+
 # ── Shared utilities ──────────────────────────────────────
 
 
@@ -62,23 +126,160 @@ def strip_markdown_fences(text: str) -> str:
     return text
 
 
+_action_adapter = TypeAdapter(GraphAction)
+
+
+class IncrementalActionParser:
+    """Pulls complete elements of the top-level "actions" array out of a
+    partially streamed AIResponse.
+
+    Text is fed in arbitrary chunks. Each element is returned, validated
+    against the GraphAction union, as soon as its closing brace arrives.
+    Leading markdown fences are ignored because nothing outside the
+    top-level object is inspected. Only the text still needed is kept (the
+    element or top-level key being read), with offsets relative to it.
+    """
+
+    def __init__(self) -> None:
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key: str | None = None
+        self._in_actions = False
+        self._element_start = 0
+
+    def feed(self, chunk: str) -> list[GraphAction]:
+        """Consume a chunk of text and return any actions it completed."""
+        self._text += chunk
+        text = self._text
+        completed: list[GraphAction] = []
+
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = text[self._string_start + 1:i]
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in "{[":
+                if ch == "[" and self._depth == 1 and self._last_key == "actions":
+                    self._in_actions = True
+                elif ch == "{" and self._depth == 2 and self._in_actions:
+                    self._element_start = i
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._in_actions and self._depth == 2 and ch == "}":
+                    action = self._parse_element(text[self._element_start:i + 1])
+                    if action is not None:
+                        completed.append(action)
+                elif self._in_actions and self._depth == 1:
+                    self._in_actions = False
+
+        if self._in_actions and self._depth > 2:
+            keep = self._element_start
+        elif self._in_string and self._depth == 1:
+            keep = self._string_start
+        else:
+            keep = len(text)
+        self._text = text[keep:]
+        self._element_start -= keep
+        self._string_start -= keep
+        self._pos = len(self._text)
+        return completed
+
+    def _parse_element(self, raw: str) -> GraphAction | None:
+        try:
+            return _action_adapter.validate_python(json.loads(raw, strict=False))
+        except (json.JSONDecodeError, ValidationError) as e:
+            logger.warning(f"Skipping unparseable streamed action: {e}")
+            return None
+
+
 # ── LLM provider ABC ──────────────────────────────────────
 
 
+@dataclass
+class HttpPool:
+    """Connection pool for a provider's SDK client.
+
+    One pool per process, kept alive between requests; with HTTP/2 all
+    concurrent calls to an API can share a single connection.
+    """
+
+    max_connections: int = 100
+    max_keepalive: int = 20
+    keepalive_expiry: float = 30.0
+    http2: bool = True
+
+    def client_kwargs(self, pacer: QuotaPacer | None = None) -> dict:
+        """httpx client arguments; with ``pacer`` model calls go through it."""
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+        if pacer is not None:
+            return {"transport": PacedTransport(pacer, http2=self.http2, limits=limits)}
+        return {"http2": self.http2, "limits": limits}
+
+
 class LLMProvider(ABC):
-    """Abstract base class for LLM providers (Anthropic, Gemini, etc.)."""
+    """Abstract base class for LLM providers (Anthropic, Gemini, etc.).
+
+    Every call sends the system prompt first, then ``user_content.prefix``,
+    then ``user_content.request``, so consecutive calls share the longest
+    possible identical prefix. Providers record cache usage in
+    ``cache_stats``.
+    """
+
+    model: str = ""
+    temperature: float = 0.3
+    # Set by providers whose HTTP client paces calls against the API quota
+    pacer: QuotaPacer | None = None
+
+    def __init__(self) -> None:
+        self.cache_stats = CacheStats()
 
     @abstractmethod
-    async def generate(self, system: str, user_content: str) -> AIResponse:
+    async def generate(self, system: str, user_content: Prompt) -> AIResponse:
         """Non-streaming generation. Returns a complete AIResponse."""
         ...
 
     @abstractmethod
-    async def generate_text(self, system: str, user_content: str) -> str:
+    async def generate_text(self, system: str, user_content: Prompt) -> str:
         """Non-streaming generation. Returns raw text without AIResponse parsing."""
         ...
 
     @abstractmethod
-    async def stream(self, system: str, user_content: str) -> AsyncIterator[StreamEvent]:
+    async def stream(self, system: str, user_content: Prompt) -> AsyncIterator[StreamEvent]:
         """Streaming generation. Yields StreamEvents."""
         ...
+
+    async def warmup(self) -> None:
+        """Open a connection to the API (DNS, TLS, HTTP/2) before the first call."""
+
+    async def aclose(self) -> None:
+        """Close the HTTP connections."""
+
+    def quota_wait(self) -> float:
+        """Seconds until the API quota lets another call through."""
+        return self.pacer.wait_time() if self.pacer is not None else 0.0
+
+    def snapshot(self) -> dict:
+        snapshot = {"provider": type(self).__name__, "model": self.model}
+        if self.pacer is not None:
+            snapshot["quota"] = self.pacer.snapshot()
+        return snapshot
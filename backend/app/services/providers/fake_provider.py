@@ -0,0 +1,116 @@
+"""Offline LLM provider for demo mode and tests."""
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import time
+from typing import AsyncIterator, Callable
+
+from app.models.actions import AIResponse
+from .base import (
+    LLMProvider,
+    Prompt,
+    StreamEvent,
+    TokenEvent,
+    ToolCallStartEvent,
+    ToolCallEndEvent,
+    ActionEvent,
+    DoneEvent,
+    IncrementalActionParser,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class FakeProvider(LLMProvider):
+    """Returns canned text and simulates provider-side prefix caching.
+
+    A call is a cache hit when the same system prompt + prompt prefix was
+    seen within ``cache_ttl`` seconds, mirroring Anthropic's ephemeral cache.
+    Hits shorten the simulated time to first token to a quarter of
+    ``latency``. ``token_interval`` spaces out streamed chunks like a real
+    model and ``failure_rate`` makes that share of calls fail after the
+    first-token delay; ``open_streams`` counts streams not yet finished or
+    closed.
+    """
+
+    def __init__(
+        self,
+        respond: Callable[[str, Prompt], str],
+        model: str = "fake",
+        latency: float = 0.0,
+        cache_ttl: float = 300.0,
+        chunk_size: int = 16,
+        token_interval: float = 0.0,
+        failure_rate: float = 0.0,
+    ):
+        super().__init__()
+        self.respond = respond
+        self.model = model
+        self.latency = latency
+        self.cache_ttl = cache_ttl
+        self.chunk_size = chunk_size
+        self.token_interval = token_interval
+        self.failure_rate = failure_rate
+        self.open_streams = 0
+        self._prefixes: dict[str, float] = {}
+
+    def _simulate_cache(self, system: str, user_content: Prompt) -> bool:
+        now = time.monotonic()
+        if len(self._prefixes) > 1024:
+            self._prefixes = {k: exp for k, exp in self._prefixes.items() if exp > now}
+
+        key = hashlib.sha256(f"{system}\x00{user_content.prefix}".encode()).hexdigest()
+        hit = self._prefixes.get(key, 0.0) > now
+        self._prefixes[key] = now + self.cache_ttl
+
+        # ~4 characters per token
+        prefix_tokens = (len(system) + len(user_content.prefix)) // 4
+        self.cache_stats.record(
+            input_tokens=prefix_tokens + len(user_content.request) // 4,
+            cached_tokens=prefix_tokens if hit else 0,
+        )
+        return hit
+
+    async def _first_token_delay(self, hit: bool) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency / 4 if hit else self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise RuntimeError("Injected provider failure")
+
+    async def generate_text(self, system: str, user_content: Prompt) -> str:
+        await self._first_token_delay(self._simulate_cache(system, user_content))
+        return self.respond(system, user_content)
+
+    async def generate(self, system: str, user_content: Prompt) -> AIResponse:
+        text = await self.generate_text(system, user_content)
+        return AIResponse.model_validate(json.loads(text, strict=False))
+
+    async def stream(self, system: str, user_content: Prompt) -> AsyncIterator[StreamEvent]:
+        yield ToolCallStartEvent(
+            tool_name="analyze_architecture",
+            tool_input={"prompt_length": len(user_content)},
+        )
+
+        self.open_streams += 1
+        try:
+            await self._first_token_delay(self._simulate_cache(system, user_content))
+            text = self.respond(system, user_content)
+            parser = IncrementalActionParser()
+            for i in range(0, len(text), self.chunk_size):
+                if self.token_interval:
+                    await asyncio.sleep(self.token_interval)
+                chunk = text[i:i + self.chunk_size]
+                yield TokenEvent(token=chunk)
+                for action in parser.feed(chunk):
+                    yield ActionEvent(action=action)
+        finally:
+            self.open_streams -= 1
+
+        yield ToolCallEndEvent(
+            tool_name="analyze_architecture",
+            tool_output={"status": "complete", "length": len(text)},
+        )
+        yield DoneEvent(response=AIResponse.model_validate(json.loads(text, strict=False)))
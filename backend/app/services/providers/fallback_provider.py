@@ -0,0 +1,277 @@
+"""Composite provider: health-based routing, failover and hedged requests."""
+from __future__ import annotations
+import asyncio
+import logging
+from collections import defaultdict, deque
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+from app.models.actions import AIResponse
+from .base import (
+    LLMProvider,
+    Prompt,
+    StreamEvent,
+    TokenEvent,
+    ActionEvent,
+    DoneEvent,
+)
+from .health import CircuitBreaker, ProviderHealth
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Events that show the model is really answering; providers emit their
+# synthetic tool_start before the upstream call is even made
+_FIRST_TOKEN = (TokenEvent, ActionEvent, DoneEvent)
+
+
+class LatencyWindow:
+    """Recent latencies of one provider, for a percentile-based hedge delay."""
+
+    def __init__(self, size: int = 200):
+        self.samples: deque[float] = deque(maxlen=size)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def quantile(self, q: float, min_samples: int = 20) -> float | None:
+        if len(self.samples) < min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class FallbackProvider(LLMProvider):
+    """Routes each call to the healthiest of ``providers``, failing over.
+
+    Every provider has a ProviderHealth: EWMAs of time to first token,
+    tokens/sec and error rate, and a circuit breaker. Calls go to providers
+    with a closed (or probing) breaker first, fastest expected latency
+    first, then the configured order; providers with an open breaker are
+    only tried once all others have failed.
+
+    An attempt fails over to the next provider when it raises or has not
+    answered within ``timeout`` seconds; for streams "answered" means the
+    first token, and once a token has been passed on the stream is
+    committed to that provider.
+
+    With ``hedge`` on, a primary that is still silent after its recent
+    ``hedge_quantile`` time to first token (``hedge_delay`` until enough
+    samples exist) gets a backup request to the next provider. Whichever
+    answers first is used and the other is cancelled. Hedges are capped at
+    ``hedge_max_ratio`` of calls, which bounds the extra upstream cost.
+    """
+
+    def __init__(
+        self,
+        providers: list[LLMProvider],
+        timeout: float = 30.0,
+        hedge: bool = False,
+        hedge_delay: float = 2.0,
+        hedge_quantile: float = 0.95,
+        hedge_max_ratio: float = 0.1,
+        breaker_error_rate: float = 0.5,
+        breaker_min_calls: int = 5,
+        breaker_cooldown: float = 10.0,
+        breaker_probes: int = 3,
+        ewma_alpha: float = 0.2,
+    ):
+        super().__init__()
+        self.providers = providers
+        self.timeout = timeout
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.hedge_quantile = hedge_quantile
+        self.hedge_max_ratio = hedge_max_ratio
+        self.model = "+".join(f"{type(p).__name__}:{p.model}" for p in providers)
+        self.temperature = providers[0].temperature
+        # One set of prompt-cache counters for the whole chain
+        for p in providers:
+            p.cache_stats = self.cache_stats
+        # Per provider and call kind: time to first token differs a lot
+        # from time to a full response
+        self._latency: dict[tuple[int, str], LatencyWindow] = defaultdict(LatencyWindow)
+        self.health = {
+            id(p): ProviderHealth(
+                type(p).__name__,
+                CircuitBreaker(breaker_error_rate, breaker_min_calls, breaker_cooldown, breaker_probes),
+                ewma_alpha,
+            )
+            for p in providers
+        }
+        self.calls = 0
+        self.failovers = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    # ── Racing attempts ───────────────────────────────────
+
+    def _order(self, kind: str) -> list[LLMProvider]:
+        available = [p for p in self.providers if self.health[id(p)].breaker.available()]
+        # Stable sort: unmeasured providers (score 0) keep the configured order
+        available.sort(key=lambda p: self.health[id(p)].score(kind))
+        return available + [p for p in self.providers if p not in available]
+
+    def _hedge_budget(self) -> bool:
+        return self.hedge and self.hedges < self.hedge_max_ratio * self.calls
+
+    def _hedge_after(self, provider: LLMProvider, kind: str) -> float | None:
+        """Seconds to wait for ``provider`` before hedging, or None for no hedge."""
+        if not self._hedge_budget():
+            return None
+        p = self._latency[id(provider), kind].quantile(self.hedge_quantile)
+        return self.hedge_delay if p is None else p
+
+    async def _attempt(self, provider: LLMProvider, kind: str, call: Callable[[LLMProvider], Awaitable[T]]) -> T:
+        loop = asyncio.get_running_loop()
+        health = self.health[id(provider)]
+        health.start()
+        started = loop.time()
+        try:
+            result = await asyncio.wait_for(call(provider), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            health.failure(timeout=True)
+            raise
+        except asyncio.CancelledError:
+            # A hedge that lost, or the caller went away: says nothing about health
+            health.breaker.cancelled()
+            raise
+        except Exception:
+            health.failure()
+            raise
+        elapsed = loop.time() - started
+        health.success(kind, elapsed)
+        self._latency[id(provider), kind].record(elapsed)
+        return result
+
+    async def _race(
+        self,
+        kind: str,
+        call: Callable[[LLMProvider], Awaitable[T]],
+        discard: Callable[[T], Awaitable[None]] | None = None,
+    ) -> T:
+        """First successful ``call(provider)``, failing over and hedging as configured."""
+        self.calls += 1
+        queue = self._order(kind)
+        primary = queue[0]
+        pending: dict[asyncio.Task, LLMProvider] = {}
+        last_error: BaseException | None = None
+
+        def launch() -> None:
+            provider = queue.pop(0)
+            pending[asyncio.ensure_future(self._attempt(provider, kind, call))] = provider
+
+        launch()
+        hedge_after = self._hedge_after(primary, kind) if queue else None
+        hedged = False
+        winner: asyncio.Task | None = None
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=hedge_after, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedge_after = None
+                    # Concurrent calls may have used up the budget meanwhile
+                    if not self._hedge_budget():
+                        continue
+                    # Primary is slow: race it against the next provider
+                    hedged = True
+                    self.hedges += 1
+                    logger.info(f"Hedging {type(primary).__name__} with {type(queue[0]).__name__}")
+                    launch()
+                    continue
+                hedge_after = None
+                for task in done:
+                    provider = pending.pop(task)
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                        logger.warning(f"{type(provider).__name__} failed: {last_error!r}")
+                    elif winner is None:
+                        winner = task
+                        if hedged and provider is not primary:
+                            self.hedge_wins += 1
+                    elif discard is not None:
+                        await discard(task.result())
+                if winner is not None:
+                    return winner.result()
+                if not pending and queue:
+                    self.failovers += 1
+                    launch()
+            raise last_error or RuntimeError("No LLM provider configured")
+        finally:
+            for task in pending:
+                task.cancel()
+            results = await asyncio.gather(*pending, return_exceptions=True)
+            if discard is not None:
+                for result in results:
+                    if not isinstance(result, BaseException):
+                        await discard(result)
+
+    # ── LLMProvider ───────────────────────────────────────
+
+    async def generate(self, system: str, user_content: Prompt) -> AIResponse:
+        return await self._race("generate", lambda p: p.generate(system, user_content))
+
+    async def generate_text(self, system: str, user_content: Prompt) -> str:
+        return await self._race("generate", lambda p: p.generate_text(system, user_content))
+
+    async def stream(self, system: str, user_content: Prompt) -> AsyncIterator[StreamEvent]:
+        async def start(provider: LLMProvider) -> tuple[LLMProvider, AsyncIterator[StreamEvent], list[StreamEvent]]:
+            # Read up to the first real token; the stream is only committed then
+            events = provider.stream(system, user_content)
+            head: list[StreamEvent] = []
+            try:
+                async for event in events:
+                    head.append(event)
+                    if isinstance(event, _FIRST_TOKEN):
+                        break
+            except BaseException:
+                await events.aclose()
+                raise
+            return provider, events, head
+
+        async def discard(started: tuple[LLMProvider, AsyncIterator[StreamEvent], list[StreamEvent]]) -> None:
+            await started[1].aclose()
+
+        provider, events, head = await self._race("stream", start, discard)
+        health = self.health[id(provider)]
+        loop = asyncio.get_running_loop()
+        first_token = loop.time()
+        chars = 0
+        try:
+            for event in head:
+                yield event
+            if head and isinstance(head[-1], DoneEvent):
+                return
+            async for event in events:
+                if isinstance(event, TokenEvent):
+                    chars += len(event.token)
+                yield event
+            # ~4 characters per token
+            health.throughput(chars / 4, loop.time() - first_token)
+        except Exception:
+            health.failure()
+            raise
+        finally:
+            await events.aclose()
+
+    def quota_wait(self) -> float:
+        return min(p.quota_wait() for p in self.providers)
+
+    async def warmup(self) -> None:
+        results = await asyncio.gather(*(p.warmup() for p in self.providers), return_exceptions=True)
+        for provider, result in zip(self.providers, results):
+            if isinstance(result, Exception):
+                logger.warning(f"{type(provider).__name__} warmup failed: {result!r}")
+
+    async def aclose(self) -> None:
+        await asyncio.gather(*(p.aclose() for p in self.providers), return_exceptions=True)
+
+    def snapshot(self) -> dict:
+        return {
+            "provider": type(self).__name__,
+            "chain": [{**p.snapshot(), **self.health[id(p)].snapshot()} for p in self.providers],
+            "calls": self.calls,
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
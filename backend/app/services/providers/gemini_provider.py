@@ -4,44 +4,82 @@ import json
 import logging
 from typing import AsyncIterator
 
+import httpx
 from google import genai
 
 from app.models.actions import AIResponse
 from .base import (
+    HttpPool,
     LLMProvider,
+    Prompt,
     StreamEvent,
     TokenEvent,
     ToolCallStartEvent,
     ToolCallEndEvent,
+    ActionEvent,
     DoneEvent,
+    IncrementalActionParser,
     strip_markdown_fences,
 )
+from .quota import QuotaPacer
 
 logger = logging.getLogger(__name__)
 
 
 class GeminiProvider(LLMProvider):
-    def __init__(self, api_key: str, model: str = "gemini-2.0-flash"):
-        self.client = genai.Client(api_key=api_key)
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "gemini-2.0-flash",
+        pool: HttpPool | None = None,
+        pacer: QuotaPacer | None = None,
+    ):
+        super().__init__()
+        self.pacer = pacer
+        # The SDK sets its own per-request timeouts; it does not close a
+        # client it was given, so aclose() does
+        self._http = httpx.AsyncClient(**(pool or HttpPool()).client_kwargs(pacer))
+        self.client = genai.Client(
+            api_key=api_key,
+            http_options=genai.types.HttpOptions(httpx_async_client=self._http),
+        )
         self.model = model
 
-    async def generate_text(self, system: str, user_content: str) -> str:
+    async def warmup(self) -> None:
+        await self.client.aio.models.get(model=self.model)
+
+    async def aclose(self) -> None:
+        await self.client.aio.aclose()
+        await self._http.aclose()
+
+    def _record_usage(self, usage) -> None:
+        if usage is None or usage.prompt_token_count is None:
+            return
+        # Implicit caching: reuse depends on the system instruction and the
+        # stable prefix being identical and first in the contents.
+        self.cache_stats.record(
+            input_tokens=usage.prompt_token_count,
+            cached_tokens=usage.cached_content_token_count or 0,
+        )
+
+    async def generate_text(self, system: str, user_content: Prompt) -> str:
         response = await self.client.aio.models.generate_content(
             model=self.model,
-            contents=user_content,
+            contents=str(user_content),
             config=genai.types.GenerateContentConfig(
                 system_instruction=system,
-                temperature=0.3,
+                temperature=self.temperature,
                 max_output_tokens=4096,
             ),
         )
+        self._record_usage(response.usage_metadata)
         return strip_markdown_fences(response.text)
 
-    async def generate(self, system: str, user_content: str) -> AIResponse:
+    async def generate(self, system: str, user_content: Prompt) -> AIResponse:
         text = await self.generate_text(system, user_content)
         return AIResponse.model_validate(json.loads(text, strict=False))
 
-    async def stream(self, system: str, user_content: str) -> AsyncIterator[StreamEvent]:
+    async def stream(self, system: str, user_content: Prompt) -> AsyncIterator[StreamEvent]:
         # Synthetic tool-call for UI visualization
         yield ToolCallStartEvent(
             tool_name="analyze_architecture",
@@ -49,18 +87,30 @@ class GeminiProvider(LLMProvider):
         )
 
         full_text = ""
-        async for chunk in await self.client.aio.models.generate_content_stream(
+        parser = IncrementalActionParser()
+        usage = None
+        chunks = await self.client.aio.models.generate_content_stream(
             model=self.model,
-            contents=user_content,
+            contents=str(user_content),
             config=genai.types.GenerateContentConfig(
                 system_instruction=system,
-                temperature=0.3,
+                temperature=self.temperature,
                 max_output_tokens=4096,
             ),
-        ):
-            if chunk.text:
-                full_text += chunk.text
-                yield TokenEvent(token=chunk.text)
+        )
+        # Closing the generator closes its HTTP response if we stop early
+        try:
+            async for chunk in chunks:
+                if chunk.usage_metadata is not None:
+                    usage = chunk.usage_metadata
+                if chunk.text:
+                    full_text += chunk.text
+                    yield TokenEvent(token=chunk.text)
+                    for action in parser.feed(chunk.text):
+                        yield ActionEvent(action=action)
+        finally:
+            await chunks.aclose()
+        self._record_usage(usage)
 
         # Parse the completed response
         yield ToolCallEndEvent(
@@ -4,66 +4,113 @@ import json
 import logging
 from typing import AsyncIterator
 
-from groq import AsyncGroq
+from groq import AsyncGroq, DefaultAsyncHttpxClient
 
 from app.models.actions import AIResponse
 from .base import (
+    HttpPool,
     LLMProvider,
+    Prompt,
     StreamEvent,
     TokenEvent,
     ToolCallStartEvent,
     ToolCallEndEvent,
+    ActionEvent,
     DoneEvent,
+    IncrementalActionParser,
     strip_markdown_fences,
 )
+from .quota import QuotaPacer
 
 logger = logging.getLogger(__name__)
 
 
 class GroqProvider(LLMProvider):
-    def __init__(self, api_key: str, model: str = "llama-3.3-70b-versatile"):
-        self.client = AsyncGroq(api_key=api_key)
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "llama-3.3-70b-versatile",
+        pool: HttpPool | None = None,
+        pacer: QuotaPacer | None = None,
+    ):
+        super().__init__()
+        self.pacer = pacer
+        self.client = AsyncGroq(
+            api_key=api_key,
+            http_client=DefaultAsyncHttpxClient(**(pool or HttpPool()).client_kwargs(pacer)),
+        )
         self.model = model
 
-    async def generate_text(self, system: str, user_content: str) -> str:
+    async def warmup(self) -> None:
+        await self.client.with_options(max_retries=0).models.list()
+
+    async def aclose(self) -> None:
+        await self.client.close()
+
+    @staticmethod
+    def _messages(system: str, user_content: Prompt) -> list[dict]:
+        # No explicit cache control: keep system + stable prefix byte-identical
+        # and first so automatic prefix caching can apply.
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": str(user_content)},
+        ]
+
+    def _record_usage(self, usage) -> None:
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+        self.cache_stats.record(input_tokens=usage.prompt_tokens, cached_tokens=cached)
+
+    async def generate_text(self, system: str, user_content: Prompt) -> str:
         response = await self.client.chat.completions.create(
             model=self.model,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user_content},
-            ],
-            temperature=0.3,
+            messages=self._messages(system, user_content),
+            temperature=self.temperature,
             max_tokens=4096,
         )
+        self._record_usage(response.usage)
         return strip_markdown_fences(response.choices[0].message.content or "")
 
-    async def generate(self, system: str, user_content: str) -> AIResponse:
+    async def generate(self, system: str, user_content: Prompt) -> AIResponse:
         text = await self.generate_text(system, user_content)
         return AIResponse.model_validate(json.loads(text, strict=False))
 
-    async def stream(self, system: str, user_content: str) -> AsyncIterator[StreamEvent]:
+    async def stream(self, system: str, user_content: Prompt) -> AsyncIterator[StreamEvent]:
         yield ToolCallStartEvent(
             tool_name="analyze_architecture",
             tool_input={"prompt_length": len(user_content)},
         )
 
         full_text = ""
+        parser = IncrementalActionParser()
         stream = await self.client.chat.completions.create(
             model=self.model,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user_content},
-            ],
-            temperature=0.3,
+            messages=self._messages(system, user_content),
+            temperature=self.temperature,
             max_tokens=4096,
             stream=True,
         )
 
-        async for chunk in stream:
-            delta = chunk.choices[0].delta
-            if delta.content:
-                full_text += delta.content
-                yield TokenEvent(token=delta.content)
+        # Closing the stream drops the HTTP connection, which stops generation
+        # (and billing) when the consumer goes away early
+        try:
+            async for chunk in stream:
+                # Groq reports usage on the final chunk under x_groq
+                x_groq = getattr(chunk, "x_groq", None)
+                if x_groq is not None and getattr(x_groq, "usage", None) is not None:
+                    self._record_usage(x_groq.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    full_text += delta.content
+                    yield TokenEvent(token=delta.content)
+                    for action in parser.feed(delta.content):
+                        yield ActionEvent(action=action)
+        finally:
+            await stream.close()
 
         yield ToolCallEndEvent(
             tool_name="analyze_architecture",
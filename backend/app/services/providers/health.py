@@ -0,0 +1,151 @@
+"""Online provider health: EWMA latency/error stats and a circuit breaker."""
+from __future__ import annotations
+import logging
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class Ewma:
+    """Exponentially weighted moving average; None until the first sample."""
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.value: float | None = None
+
+    def add(self, sample: float) -> None:
+        self.value = sample if self.value is None else self.alpha * sample + (1 - self.alpha) * self.value
+
+
+class CircuitBreaker:
+    """closed -> open -> half-open -> closed.
+
+    Opens when the error rate reaches ``error_threshold`` (after at least
+    ``min_calls`` calls). After ``cooldown`` seconds it lets one probe call
+    through at a time, and closes again after ``probes`` probes in a row
+    succeed; a failed probe reopens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        error_threshold: float,
+        min_calls: int,
+        cooldown: float,
+        probes: int,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.error_threshold = error_threshold
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.probes = probes
+        self.clock = clock
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_successes = 0
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self.clock() - self._opened_at >= self.cooldown:
+            self._state = self.HALF_OPEN
+            self._probe_successes = 0
+            self._probe_in_flight = False
+        return self._state
+
+    def available(self) -> bool:
+        state = self.state
+        return state == self.CLOSED or (state == self.HALF_OPEN and not self._probe_in_flight)
+
+    def start(self) -> None:
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = True
+
+    def success(self) -> None:
+        if self._state == self.HALF_OPEN:
+            self._probe_in_flight = False
+            self._probe_successes += 1
+            if self._probe_successes >= self.probes:
+                self._state = self.CLOSED
+
+    def failure(self, error_rate: float, calls: int) -> None:
+        if self._state == self.HALF_OPEN or (
+            self._state == self.CLOSED and calls >= self.min_calls and error_rate >= self.error_threshold
+        ):
+            self._trip()
+
+    def cancelled(self) -> None:
+        if self._state == self.HALF_OPEN:
+            self._probe_in_flight = False
+
+    def _trip(self) -> None:
+        self._state = self.OPEN
+        self._opened_at = self.clock()
+        self._probe_in_flight = False
+        self.trips += 1
+
+
+class ProviderHealth:
+    """Per-provider online stats feeding routing and the circuit breaker.
+
+    TTFT is the time to the first token for streams and to the whole
+    answer for non-streaming calls, so each call kind keeps its own EWMA.
+    """
+
+    def __init__(self, name: str, breaker: CircuitBreaker, alpha: float):
+        self.name = name
+        self.breaker = breaker
+        self.alpha = alpha
+        self.ttft: dict[str, Ewma] = {}
+        self.tokens_per_second = Ewma(alpha)
+        self.error_rate = Ewma(alpha)
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+
+    def start(self) -> None:
+        self.breaker.start()
+
+    def success(self, kind: str, ttft: float) -> None:
+        self.calls += 1
+        self.ttft.setdefault(kind, Ewma(self.alpha)).add(ttft)
+        self.error_rate.add(0.0)
+        self.breaker.success()
+
+    def failure(self, timeout: bool = False) -> None:
+        self.calls += 1
+        self.errors += 1
+        self.timeouts += timeout
+        self.error_rate.add(1.0)
+        was_open = self.breaker.state != CircuitBreaker.CLOSED
+        self.breaker.failure(self.error_rate.value or 0.0, self.calls)
+        if not was_open and self.breaker.state == CircuitBreaker.OPEN:
+            logger.warning(f"Circuit for {self.name} opened (error rate {self.error_rate.value:.2f})")
+
+    def throughput(self, tokens: float, seconds: float) -> None:
+        if seconds > 0:
+            self.tokens_per_second.add(tokens / seconds)
+
+    def score(self, kind: str) -> float:
+        """Expected latency, inflated by the error rate; 0 while unmeasured."""
+        ttft = self.ttft.get(kind)
+        if ttft is None or ttft.value is None:
+            return 0.0
+        return ttft.value * (1 + 4 * (self.error_rate.value or 0.0))
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.breaker.state,
+            "ttft_ewma": {kind: e.value for kind, e in self.ttft.items()},
+            "tokens_per_second_ewma": self.tokens_per_second.value,
+            "error_rate_ewma": self.error_rate.value or 0.0,
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "trips": self.breaker.trips,
+        }
@@ -0,0 +1,276 @@
+"""Client-side pacing against provider rate limits.
+
+Each provider client sends its requests through a PacedTransport, so the
+pacing, the rate-limit headers and the 429/529 retries all live at the
+HTTP layer, below the SDKs.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import math
+import random
+import re
+import time
+from datetime import datetime, timezone
+from typing import Callable
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Rate limited / overloaded (Anthropic's 529)
+RETRY_STATUSES = frozenset({429, 529})
+
+# (limit, remaining, reset) header names per budget, with the window the
+# limit is counted over: Anthropic, then the OpenAI-style names Groq uses
+# (whose request limit is per day). Gemini sends none.
+_HEADERS = {
+    "requests": (
+        ("anthropic-ratelimit-requests-limit", "anthropic-ratelimit-requests-remaining", "anthropic-ratelimit-requests-reset", 60.0),
+        ("x-ratelimit-limit-requests", "x-ratelimit-remaining-requests", "x-ratelimit-reset-requests", 86400.0),
+    ),
+    "tokens": (
+        ("anthropic-ratelimit-tokens-limit", "anthropic-ratelimit-tokens-remaining", "anthropic-ratelimit-tokens-reset", 60.0),
+        ("x-ratelimit-limit-tokens", "x-ratelimit-remaining-tokens", "x-ratelimit-reset-tokens", 60.0),
+    ),
+}
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: str) -> float | None:
+    """Seconds from now for "12", "1.5", "6m0s", "120ms" or an RFC 3339 time."""
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION.findall(value)
+    if parts and "".join(n + u for n, u in parts) == value:
+        return sum(float(n) * _UNITS[u] for n, u in parts)
+    try:
+        when = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def _number(headers: httpx.Headers, name: str) -> float | None:
+    try:
+        return float(headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """A budget refilled continuously at ``rate`` per second up to ``limit``.
+
+    Reservations may drive the level negative; each reservation is told how
+    long to wait until the budget covers it, which spaces callers out
+    instead of letting them all go at once.
+    """
+
+    def __init__(self, limit: float, refill_seconds: float, clock: Callable[[], float]):
+        self.limit = limit
+        self.rate = limit / refill_seconds
+        self.level = limit
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.level = min(self.limit, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def reserve(self, amount: float) -> float:
+        wait = self.wait_time(amount)
+        self.level -= amount
+        return wait
+
+    def refund(self, amount: float) -> None:
+        """Give back a reservation, never beyond a full bucket."""
+        self._refill()
+        self.level = min(self.limit, self.level + amount)
+
+    def sync(self, limit: float, remaining: float, reset: float | None) -> None:
+        """Adopt what the provider reported after a response."""
+        self._refill()
+        self.limit = limit
+        if reset and remaining < limit:
+            # The provider refills to ``limit`` by ``reset``
+            self.rate = (limit - remaining) / reset
+        # Never above the provider's count; below it when calls we already
+        # let through are not reflected yet
+        self.level = min(self.level, remaining)
+
+
+class QuotaPacer:
+    """Request and token budgets of one provider and model.
+
+    Budgets start from ``requests_per_minute``/``tokens_per_minute`` (0 =
+    unknown) and follow the provider's rate-limit headers once they arrive.
+    A 429/529 blocks new calls until its Retry-After (or an exponential
+    backoff) has passed.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_retries: int = 3,
+        retry_budget: float = 20.0,
+        backoff: float = 0.5,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget
+        self.backoff = backoff
+        self.clock = clock
+        self.buckets: dict[str, TokenBucket] = {}
+        for budget, per_minute in (("requests", requests_per_minute), ("tokens", tokens_per_minute)):
+            if per_minute:
+                self.buckets[budget] = TokenBucket(per_minute, 60.0, clock)
+        self.blocked_until = 0.0
+        self.paced = 0
+        self.paced_seconds = 0.0
+        self.throttled = 0
+        self.retried = 0
+        self.refused = 0
+
+    def _wait(self, tokens: float, reserve: bool) -> float:
+        wait = max(0.0, self.blocked_until - self.clock())
+        for budget, amount in (("requests", 1.0), ("tokens", tokens)):
+            bucket = self.buckets.get(budget)
+            if bucket is not None:
+                wait = max(wait, bucket.reserve(amount) if reserve else bucket.wait_time(amount))
+        return wait
+
+    def wait_time(self, tokens: float = 0.0) -> float:
+        """Seconds until a call of ``tokens`` would be let through."""
+        return self._wait(tokens, reserve=False)
+
+    def reserve(self, tokens: float) -> float:
+        """Book a call of ``tokens`` and return how long it must wait first."""
+        return self._wait(tokens, reserve=True)
+
+    def refund(self, tokens: float) -> None:
+        """Give back a reservation for a call that was not sent."""
+        for budget, amount in (("requests", 1.0), ("tokens", tokens)):
+            bucket = self.buckets.get(budget)
+            if bucket is not None:
+                bucket.refund(amount)
+
+    def observe(self, status: int, headers: httpx.Headers, attempt: int) -> None:
+        for budget, conventions in _HEADERS.items():
+            for limit_name, remaining_name, reset_name, window in conventions:
+                limit = _number(headers, limit_name)
+                remaining = _number(headers, remaining_name)
+                if not limit or remaining is None:
+                    continue
+                reset = parse_duration(headers.get(reset_name, ""))
+                bucket = self.buckets.get(budget)
+                if bucket is None:
+                    # sync() refines the rate from reset once part is used
+                    bucket = self.buckets[budget] = TokenBucket(limit, window, self.clock)
+                bucket.sync(limit, remaining, reset)
+                break
+        if status in RETRY_STATUSES:
+            self.throttled += 1
+            retry_after = parse_duration(headers.get("retry-after", ""))
+            if retry_after is None:
+                retry_after = self.backoff * 2 ** attempt
+            self.blocked_until = max(self.blocked_until, self.clock() + retry_after)
+            logger.warning(f"{self.name} returned {status}, holding calls for {retry_after:.1f}s")
+
+    def snapshot(self) -> dict:
+        return {
+            "name": self.name,
+            "budgets": {
+                budget: {"limit": b.limit, "available": round(b.level, 1), "per_second": round(b.rate, 3)}
+                for budget, b in self.buckets.items()
+            },
+            "blocked_seconds": round(max(0.0, self.blocked_until - self.clock()), 1),
+            "paced": self.paced,
+            "paced_seconds": round(self.paced_seconds, 1),
+            "throttled": self.throttled,
+            "retried": self.retried,
+            "refused": self.refused,
+        }
+
+
+class PacedTransport(httpx.AsyncBaseTransport):
+    """httpx transport that paces POSTs (model calls) through a QuotaPacer.
+
+    Each call waits for its share of the request and token budgets (tokens
+    estimated at ~4 bytes each of the request body) and retries a 429/529
+    up to ``max_retries`` times while the wait stays within
+    ``retry_budget`` seconds. A call that cannot go out within the budget
+    gets a local 429 instead of being sent. Responses that are given up on
+    carry ``x-should-retry: false`` so the SDK does not retry them again.
+    """
+
+    def __init__(self, pacer: QuotaPacer, **transport_kwargs):
+        self.pacer = pacer
+        self._transport = httpx.AsyncHTTPTransport(**transport_kwargs)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.method != "POST":
+            return await self._transport.handle_async_request(request)
+        pacer = self.pacer
+        tokens = len(await request.aread()) / 4
+        deadline = pacer.clock() + pacer.retry_budget
+        attempt = 0
+        jitter = 0.0
+        while True:
+            wait = pacer.reserve(tokens) + jitter
+            if pacer.clock() + wait > deadline:
+                pacer.refund(tokens)
+                pacer.refused += 1
+                return self._refuse(request, wait)
+            if wait > 0:
+                pacer.paced += 1
+                pacer.paced_seconds += wait
+                try:
+                    await asyncio.sleep(wait)
+                except asyncio.CancelledError:
+                    # The call is abandoned before it was sent
+                    pacer.refund(tokens)
+                    raise
+            response = await self._transport.handle_async_request(request)
+            if response.status_code in RETRY_STATUSES:
+                # A throttled call used none of the budget (the headers
+                # below say what is left); a retry reserves it again
+                pacer.refund(tokens)
+            pacer.observe(response.status_code, response.headers, attempt)
+            if response.status_code not in RETRY_STATUSES:
+                return response
+            if attempt >= pacer.max_retries or pacer.wait_time(tokens) + pacer.clock() > deadline:
+                response.headers["x-should-retry"] = "false"
+                return response
+            await response.aclose()
+            attempt += 1
+            pacer.retried += 1
+            # Full jitter, so throttled calls do not all come back in step
+            jitter = random.uniform(0, pacer.backoff * 2 ** attempt)
+
+    def _refuse(self, request: httpx.Request, wait: float) -> httpx.Response:
+        message = f"{self.pacer.name} quota exhausted for the next {wait:.0f}s"
+        logger.warning(message)
+        # Error body shaped like the providers' own, so their SDKs raise
+        # their usual rate-limit error
+        return httpx.Response(
+            429,
+            headers={"retry-after": str(math.ceil(wait)), "x-should-retry": "false"},
+            json={"error": {"code": 429, "type": "rate_limit_error", "status": "RESOURCE_EXHAUSTED", "message": message}},
+            request=request,
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
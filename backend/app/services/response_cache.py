@@ -0,0 +1,76 @@
+"""Exact-match cache for LLM responses."""
+from __future__ import annotations
+import hashlib
+import json
+import logging
+
+from app.services.cache_backend import CacheBackend
+from app.services.providers.base import LLMProvider, Prompt
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Caches provider output for byte-identical requests.
+
+    The key is a hash of everything that determines the output: provider,
+    model, temperature, a hash of the system prompt (so editing the prompt
+    invalidates old entries) and the full user content. A ``ttl`` of 0
+    disables the cache.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    @staticmethod
+    def key(provider: LLMProvider, system: str, user_content: Prompt) -> str:
+        system_version = hashlib.sha256(system.encode()).hexdigest()[:16]
+        canonical = json.dumps(
+            [type(provider).__name__, provider.model, provider.temperature, system_version, str(user_content)],
+            separators=(",", ":"),
+            ensure_ascii=False,
+        )
+        return "llm:" + hashlib.sha256(canonical.encode()).hexdigest()
+
+    async def get(self, key: str) -> str | None:
+        if not self.enabled:
+            return None
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Response cache read failed: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        if not self.enabled:
+            return
+        try:
+            await self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            logger.warning(f"Response cache write failed: {e}")
+
+    async def delete(self, key: str) -> None:
+        try:
+            await self.backend.delete(key)
+        except Exception as e:
+            logger.warning(f"Response cache delete failed: {e}")
+
+    def snapshot(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
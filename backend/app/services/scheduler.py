@@ -0,0 +1,213 @@
+"""Bounded, fair admission of upstream LLM calls."""
+from __future__ import annotations
+import asyncio
+import logging
+import math
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, served strictly in this order
+INTERACTIVE = 0  # generate / modify, streamed or not
+BACKGROUND = 1  # architecture review
+_PRIORITY_NAMES = ("interactive", "background")
+
+
+class Overloaded(Exception):
+    """No slot within the queue deadline; retry after ``retry_after`` seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"LLM capacity exhausted, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("user", "cost", "future")
+
+    def __init__(self, user: str, cost: float):
+        self.user = user
+        self.cost = cost
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class _FairQueue:
+    """Per-user FIFO queues served by deficit round robin.
+
+    Each user at the head of the round earns ``quantum`` credit when their
+    next call costs more than they have left, and goes to the back of the
+    round. A user sending many (or large) prompts therefore waits for
+    everyone else's turn instead of filling the queue ahead of them.
+    """
+
+    def __init__(self, quantum: float):
+        self.quantum = quantum
+        self.queues: OrderedDict[str, deque[_Waiter]] = OrderedDict()
+        self.deficit: dict[str, float] = {}
+        self.size = 0
+
+    def push(self, waiter: _Waiter) -> None:
+        if waiter.user not in self.queues:
+            self.queues[waiter.user] = deque()
+            self.deficit[waiter.user] = 0.0
+        self.queues[waiter.user].append(waiter)
+        self.size += 1
+
+    def pop(self) -> _Waiter:
+        while True:
+            user, queue = next(iter(self.queues.items()))
+            if self.deficit[user] >= queue[0].cost:
+                self.deficit[user] -= queue[0].cost
+                waiter = queue.popleft()
+                self._drop_if_empty(user)
+                self.size -= 1
+                return waiter
+            self.deficit[user] += self.quantum
+            self.queues.move_to_end(user)
+
+    def remove(self, waiter: _Waiter) -> None:
+        queue = self.queues.get(waiter.user)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        self._drop_if_empty(waiter.user)
+        self.size -= 1
+
+    def _drop_if_empty(self, user: str) -> None:
+        # An idle user keeps no credit (standard DRR)
+        if not self.queues[user]:
+            del self.queues[user]
+            del self.deficit[user]
+
+
+class Scheduler:
+    """Caps concurrent upstream LLM calls; queues the rest fairly.
+
+    At most ``capacity`` calls hold a slot at once. Further calls wait in
+    a queue per priority class (INTERACTIVE before BACKGROUND), in which
+    users take turns by deficit round robin weighted by prompt size. A call
+    that would not get a slot within ``queue_timeout`` seconds, judged from
+    the queue ahead of it, how long slots are typically held and
+    ``quota_wait()`` (how long the provider's rate limits hold calls back),
+    or that finds ``max_queue`` calls already waiting, is refused at once
+    with Overloaded instead of timing out later; so is a waiter whose
+    deadline passes.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        queue_timeout: float,
+        max_queue: int,
+        quota_wait: Callable[[], float] = lambda: 0.0,
+        quantum: float = 1.0,
+        alpha: float = 0.2,
+    ):
+        self.capacity = capacity
+        self.quota_wait = quota_wait
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.alpha = alpha
+        self.running = 0
+        self._queues = [_FairQueue(quantum) for _ in _PRIORITY_NAMES]
+        # EWMA of seconds a slot is held (a whole stream for streams)
+        self._hold: float | None = None
+        self._waits: deque[float] = deque(maxlen=500)
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self.expired = 0
+
+    def _ahead(self, priority: int) -> int:
+        return sum(q.size for q in self._queues[: priority + 1])
+
+    def estimated_wait(self, priority: int = INTERACTIVE) -> float:
+        """Seconds a new call at ``priority`` would likely wait for a slot."""
+        ahead = self._ahead(priority)
+        queued = 0.0
+        # Until a slot has been released the hold time is unknown
+        if (self.running >= self.capacity or ahead) and self._hold is not None:
+            queued = (ahead + 1) / self.capacity * self._hold
+        return max(queued, self.quota_wait())
+
+    def _overloaded(self, priority: int) -> Overloaded:
+        return Overloaded(max(1, math.ceil(self.estimated_wait(priority))))
+
+    def check(self, priority: int = INTERACTIVE) -> None:
+        """Raise Overloaded now if a call at ``priority`` would be shed."""
+        if self._ahead(priority) >= self.max_queue or self.estimated_wait(priority) > self.queue_timeout:
+            self.shed += 1
+            raise self._overloaded(priority)
+
+    @asynccontextmanager
+    async def slot(self, user: str, priority: int = INTERACTIVE, cost: float = 1.0) -> AsyncIterator[None]:
+        """Hold one of the ``capacity`` slots for the duration of the block."""
+        await self._acquire(user, priority, cost)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            yield
+        finally:
+            held = loop.time() - started
+            self._hold = held if self._hold is None else self.alpha * held + (1 - self.alpha) * self._hold
+            self._release()
+
+    async def _acquire(self, user: str, priority: int, cost: float) -> None:
+        self.check(priority)
+        if self.running < self.capacity and not any(q.size for q in self._queues):
+            self.running += 1
+            self.admitted += 1
+            self._waits.append(0.0)
+            return
+
+        queue = self._queues[priority]
+        waiter = _Waiter(user, cost)
+        queue.push(waiter)
+        self.queued += 1
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            await asyncio.wait({waiter.future}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            if waiter.future.done():
+                # The slot was handed over just as the caller left
+                self._release()
+            else:
+                queue.remove(waiter)
+            raise
+        if not waiter.future.done():
+            queue.remove(waiter)
+            self.expired += 1
+            logger.warning(f"LLM call for {user} shed after {self.queue_timeout:g}s in queue")
+            raise self._overloaded(priority)
+        self.admitted += 1
+        self._waits.append(loop.time() - started)
+
+    def _release(self) -> None:
+        # A freed slot goes straight to the next waiter, so running stays put
+        for queue in self._queues:
+            if queue.size:
+                queue.pop().future.set_result(None)
+                return
+        self.running -= 1
+
+    def snapshot(self) -> dict:
+        waits = sorted(self._waits)
+
+        def quantile(q: float) -> float:
+            return round(waits[min(len(waits) - 1, int(q * len(waits)))] * 1000, 1) if waits else 0.0
+
+        return {
+            "capacity": self.capacity,
+            "running": self.running,
+            "queue_depth": {name: q.size for name, q in zip(_PRIORITY_NAMES, self._queues)},
+            "queued_users": sum(len(q.queues) for q in self._queues),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": self.shed,
+            "expired": self.expired,
+            "wait_ms": {"p50": quantile(0.5), "p95": quantile(0.95), "max": quantile(1.0)},
+            "slot_seconds_ewma": self._hold,
+            "quota_wait_seconds": round(self.quota_wait(), 1),
+        }
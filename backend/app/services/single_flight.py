@@ -0,0 +1,179 @@
+"""Coalesce concurrent identical LLM calls into one upstream call."""
+from __future__ import annotations
+import asyncio
+import copy
+import logging
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _Broadcast:
+    """One upstream event stream shared by any number of subscribers.
+
+    Events are buffered until every subscriber has read them, and the
+    upstream is paused while the slowest subscriber is ``max_lag`` events
+    behind, so the buffer stays bounded. A subscriber that joins late first
+    gets everything sent so far and then follows live, which is only
+    possible while nothing has been dropped yet (``joinable``). Subscribers
+    receive deep copies because consumers mutate events (alias resolution,
+    layout). The upstream is cancelled when the last subscriber leaves early.
+    """
+
+    def __init__(
+        self,
+        source: AsyncIterator,
+        on_finish: Callable[[], None],
+        on_cancel: Callable[[], None],
+        max_lag: int,
+    ):
+        self.events: deque = deque()
+        self.max_lag = max_lag
+        self.finished = False
+        self.error: BaseException | None = None
+        self._base = 0  # stream index of events[0]
+        self._cursors: dict[int, int] = {}  # subscriber -> index of its next event
+        self._next_subscriber = 0
+        self._changed = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._on_finish = on_finish
+        self._on_cancel = on_cancel
+        self._task = asyncio.create_task(self._pump(source))
+
+    @property
+    def sent(self) -> int:
+        """Events received from upstream so far."""
+        return self._base + len(self.events)
+
+    @property
+    def joinable(self) -> bool:
+        return self._base == 0
+
+    async def _pump(self, source: AsyncIterator) -> None:
+        try:
+            async for event in source:
+                self.events.append(event)
+                self._notify()
+                while self.sent - self._slowest() >= self.max_lag:
+                    self._drained.clear()
+                    await self._drained.wait()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished = True
+            self._on_finish()
+            self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _slowest(self) -> int:
+        # Before anyone subscribes, nothing counts as read
+        return min(self._cursors.values(), default=self._base)
+
+    def _trim(self) -> None:
+        """Drop the events every subscriber has read and let the pump go on."""
+        for _ in range(self._slowest() - self._base):
+            self.events.popleft()
+            self._base += 1
+        self._drained.set()
+
+    def subscribe(self) -> AsyncIterator:
+        # Registered now rather than on first iteration, so the events this
+        # subscriber has yet to read cannot be trimmed in between
+        subscriber = self._next_subscriber
+        self._next_subscriber += 1
+        self._cursors[subscriber] = self._base
+        return self._follow(subscriber)
+
+    async def _follow(self, subscriber: int) -> AsyncIterator:
+        try:
+            while True:
+                while self._cursors[subscriber] < self.sent:
+                    yield copy.deepcopy(self.events[self._cursors[subscriber] - self._base])
+                    self._cursors[subscriber] += 1
+                    self._trim()
+                if self.finished:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._changed.wait()
+        finally:
+            del self._cursors[subscriber]
+            self._trim()
+            if not self._cursors and not self.finished:
+                self._task.cancel()
+                self._on_finish()
+                self._on_cancel()
+
+
+class SingleFlight:
+    """At most one in-flight upstream call per key; other callers join it."""
+
+    def __init__(self, max_lag: int) -> None:
+        self.max_lag = max_lag
+        self._calls: dict[str, asyncio.Task] = {}
+        self._streams: dict[str, _Broadcast] = {}
+        self.upstream_calls = 0
+        self.coalesced = 0
+        self.cancelled = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Await ``fn()``, or the identical call already in flight.
+
+        All callers get the same result object, so ``fn`` should return
+        something immutable (e.g. serialized text).
+        """
+        task = self._calls.get(key)
+        if task is None:
+            self.upstream_calls += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.coalesced += 1
+            logger.debug(f"Joined in-flight call {key[:16]}")
+        # A cancelled caller must not cancel the call for everyone else
+        return await asyncio.shield(task)
+
+    def stream(self, key: str, fn: Callable[[], AsyncIterator]) -> AsyncIterator:
+        """Subscribe to ``fn()``'s events, or to the identical stream in flight.
+
+        A stream that has already dropped events its subscribers read cannot
+        be replayed from the start, so it is not joined; ``fn()`` runs anew.
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is None or not broadcast.joinable:
+            self.upstream_calls += 1
+            broadcast = _Broadcast(
+                fn(),
+                on_finish=lambda: self._forget(key, broadcast),
+                on_cancel=self._cancelled,
+                max_lag=self.max_lag,
+            )
+            self._streams[key] = broadcast
+        else:
+            self.coalesced += 1
+            logger.debug(f"Joined in-flight stream {key[:16]} after {broadcast.sent} events")
+        return broadcast.subscribe()
+
+    def _cancelled(self) -> None:
+        # Every subscriber left before the end; the provider stream is closed
+        self.cancelled += 1
+        logger.info("Cancelled an upstream LLM stream nobody is reading")
+
+    def _forget(self, key: str, broadcast: _Broadcast) -> None:
+        if self._streams.get(key) is broadcast:
+            del self._streams[key]
+
+    def snapshot(self) -> dict:
+        return {
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.coalesced,
+            "cancelled": self.cancelled,
+            "in_flight": len(self._calls) + len(self._streams),
+        }
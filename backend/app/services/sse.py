@@ -0,0 +1,292 @@
+"""Server-sent event framing: token coalescing, replay buffers, heartbeats."""
+from __future__ import annotations
+import asyncio
+import contextlib
+import logging
+import secrets
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Callable
+
+import orjson
+
+from app.config import (
+    SSE_HEARTBEAT_SECONDS,
+    SSE_REPLAY_FRAMES,
+    SSE_REPLAY_STREAMS,
+    SSE_RESUME_GRACE_SECONDS,
+)
+from app.services.providers.base import StreamEvent, TokenEvent
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT = b": ping\n\n"
+
+# A response that has not started reading its stream by then is abandoned
+_ATTACH_TIMEOUT = 5.0
+
+_TOKEN_PREFIX = b'data: {"type":"token","token":'
+_TOKEN_SUFFIX = b"}\n\n"
+
+
+# ── Encoding ──────────────────────────────────────────────
+
+
+def encode_event(payload: dict) -> bytes:
+    """``data:`` frame for one event."""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
+def encode_token(token: str) -> bytes:
+    """Token frame; only the text itself needs encoding."""
+    return _TOKEN_PREFIX + orjson.dumps(token) + _TOKEN_SUFFIX
+
+
+# ── Coalescing ────────────────────────────────────────────
+
+
+async def coalesce_tokens(events: AsyncIterator[StreamEvent], window: float, max_bytes: int) -> AsyncIterator[StreamEvent]:
+    """Merge runs of TokenEvents into one per ``window`` seconds or ``max_bytes``.
+
+    Buffered text is flushed when the window closes even if the upstream
+    is quiet, and before any other event so ordering is kept. A window of
+    0 passes events through unchanged.
+    """
+    if window <= 0:
+        async for event in events:
+            yield event
+        return
+
+    loop = asyncio.get_running_loop()
+    source = aiter(events)
+    buffered: list[str] = []
+    size = 0
+    deadline = 0.0
+    # The read in progress survives a window timeout; cancelling it would
+    # tear down the source generator
+    pending: asyncio.Future | None = None
+
+    def flush() -> TokenEvent:
+        nonlocal size
+        event = TokenEvent(token="".join(buffered))
+        buffered.clear()
+        size = 0
+        return event
+
+    try:
+        while True:
+            if not buffered:
+                try:
+                    event = await (pending if pending is not None else anext(source))
+                except StopAsyncIteration:
+                    break
+                pending = None
+            else:
+                if pending is None:
+                    pending = asyncio.ensure_future(anext(source))
+                done, _ = await asyncio.wait({pending}, timeout=max(0.0, deadline - loop.time()))
+                if not done:
+                    yield flush()
+                    continue
+                try:
+                    event = pending.result()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    pending = None
+
+            if isinstance(event, TokenEvent):
+                if not buffered:
+                    deadline = loop.time() + window
+                buffered.append(event.token)
+                size += len(event.token.encode())
+                if size >= max_bytes:
+                    yield flush()
+                continue
+            if buffered:
+                yield flush()
+            yield event
+
+        if buffered:
+            yield flush()
+    finally:
+        if pending is not None:
+            pending.cancel()
+            with contextlib.suppress(BaseException):
+                await pending
+        if hasattr(source, "aclose"):
+            await source.aclose()
+
+
+# ── Replay ────────────────────────────────────────────────
+
+
+class ReplayStream:
+    """Frames of one SSE response, produced once and read by any connection.
+
+    A background task pulls frames from the producer and stamps each with
+    ``id: <stream>:<seq>``. The last ``capacity`` frames are kept so a
+    client that lost its connection can come back with Last-Event-ID and
+    continue where it left off.
+
+    The producer never runs more than ``capacity`` frames ahead of the
+    slowest reader (or of the buffer, with no reader attached), so a slow
+    consumer holds back the upstream instead of growing memory. With no
+    reader for ``grace`` seconds the producer is cancelled, which closes
+    the upstream LLM stream.
+    """
+
+    def __init__(
+        self,
+        stream_id: str,
+        frames: AsyncIterator[bytes],
+        capacity: int,
+        grace: float,
+        heartbeat: float,
+        on_abandon: Callable[[], None] = lambda: None,
+    ):
+        self.stream_id = stream_id
+        self.capacity = capacity
+        self.grace = grace
+        self.heartbeat = heartbeat
+        self.frames: deque[bytes] = deque(maxlen=capacity)
+        self.next_seq = 1
+        self.finished = False
+        self.abandoned = False
+        self._on_abandon = on_abandon
+        self._cursors: dict[object, int] = {}
+        self._changed = asyncio.Event()
+        self._task = asyncio.create_task(self._pump(frames))
+        self._orphaned: asyncio.TimerHandle | None = asyncio.get_running_loop().call_later(
+            max(grace, _ATTACH_TIMEOUT), self._abandon
+        )
+
+    @property
+    def first_seq(self) -> int:
+        return self.next_seq - len(self.frames)
+
+    @property
+    def readers(self) -> int:
+        return len(self._cursors)
+
+    async def _pump(self, frames: AsyncIterator[bytes]) -> None:
+        try:
+            async for frame in frames:
+                while self._lag() >= self.capacity:
+                    await self._changed.wait()
+                self.frames.append(f"id: {self.stream_id}:{self.next_seq}\n".encode() + frame)
+                self.next_seq += 1
+                self._notify()
+        except Exception as e:
+            logger.error(f"SSE producer {self.stream_id} failed: {e}")
+        finally:
+            self.finished = True
+            self._notify()
+
+    def _lag(self) -> int:
+        oldest = min(self._cursors.values()) if self._cursors else self.first_seq - 1
+        return self.next_seq - 1 - oldest
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def read(self, after: int) -> AsyncIterator[bytes]:
+        """Frames with seq > ``after``, then live ones, with heartbeats while idle."""
+        reader = object()
+        self._cursors[reader] = after
+        if self._orphaned is not None:
+            self._orphaned.cancel()
+            self._orphaned = None
+        try:
+            while True:
+                if after + 1 < self.first_seq:
+                    yield encode_event({"type": "error", "message": "Stream can no longer be resumed"})
+                    return
+                while after + 1 < self.next_seq:
+                    after += 1
+                    frame = self.frames[after - self.first_seq]
+                    self._cursors[reader] = after
+                    self._notify()
+                    yield frame
+                if self.finished:
+                    if self.abandoned:
+                        yield encode_event({"type": "error", "message": "Stream was cancelled"})
+                    return
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT
+        finally:
+            del self._cursors[reader]
+            self._notify()
+            if not self._cursors and not self.finished:
+                self._orphaned = asyncio.get_running_loop().call_later(self.grace, self._abandon)
+
+    def _abandon(self) -> None:
+        if not self._cursors and not self.finished:
+            logger.info(f"SSE stream {self.stream_id} abandoned, cancelling producer")
+            self.abandoned = True
+            self._task.cancel()
+            self._on_abandon()
+
+
+class ReplayRegistry:
+    """Recent SSE streams by id, so Last-Event-ID can find them (LRU)."""
+
+    def __init__(self, max_streams: int, capacity: int, grace: float, heartbeat: float):
+        self.max_streams = max_streams
+        self.capacity = capacity
+        self.grace = grace
+        self.heartbeat = heartbeat
+        self._streams: OrderedDict[str, ReplayStream] = OrderedDict()
+        self.started = 0
+        self.resumed = 0
+        self.abandoned = 0
+
+    def _abandoned(self) -> None:
+        self.abandoned += 1
+
+    def start(self, frames: AsyncIterator[bytes]) -> ReplayStream:
+        stream = ReplayStream(
+            secrets.token_urlsafe(12), frames, self.capacity, self.grace,
+            self.heartbeat, on_abandon=self._abandoned,
+        )
+        self._streams[stream.stream_id] = stream
+        while len(self._streams) > self.max_streams:
+            self._streams.popitem(last=False)
+        self.started += 1
+        return stream
+
+    def find(self, last_event_id: str) -> tuple[ReplayStream, int] | None:
+        """Stream and last seen seq for a Last-Event-ID, or None if unknown."""
+        stream_id, _, seq = last_event_id.strip().rpartition(":")
+        stream = self._streams.get(stream_id)
+        if stream is None or not seq.isdigit():
+            return None
+        return stream, int(seq)
+
+    def resume(self, last_event_id: str) -> tuple[ReplayStream, int] | None:
+        """Like find(), for a reader about to re-attach."""
+        found = self.find(last_event_id)
+        if found is not None:
+            self._streams.move_to_end(found[0].stream_id)
+            self.resumed += 1
+        return found
+
+    def snapshot(self) -> dict:
+        live = [s for s in self._streams.values() if not s.finished]
+        return {
+            "started": self.started,
+            "resumed": self.resumed,
+            "abandoned": self.abandoned,
+            "live": len(live),
+            "readers": sum(s.readers for s in live),
+        }
+
+
+replays = ReplayRegistry(
+    SSE_REPLAY_STREAMS,
+    SSE_REPLAY_FRAMES,
+    SSE_RESUME_GRACE_SECONDS,
+    SSE_HEARTBEAT_SECONDS,
+)
@@ -1,92 +1,186 @@
 from __future__ import annotations
 import logging
+import math
+from dataclasses import dataclass, field
 from app.models.actions import AIResponse, GraphAction
-from app.models.graph import GraphState
+from app.models.graph import GraphState, Position
 
 logger = logging.getLogger(__name__)
 
-
-def validate_actions(response: AIResponse, current_graph: GraphState | None = None) -> AIResponse:
-    """Validate AI response actions for reference integrity and duplicates."""
-
-    # Build a virtual node/edge set from current graph
-    node_ids: set[str] = set()
-    edge_ids: set[str] = set()
-
-    if current_graph:
-        node_ids = {n.id for n in current_graph.nodes}
-        edge_ids = {e.id for e in current_graph.edges}
-
-    valid_actions: list[GraphAction] = []
-    existing_positions: list[tuple[float, float]] = []
-
-    if current_graph:
-        existing_positions = [(n.position.x, n.position.y) for n in current_graph.nodes]
-
-    for action in response.actions:
+# Two nodes closer than this on both axes are considered overlapping
+COLLISION_RADIUS = 150
+# Offset applied to a new node until it lands on free space
+COLLISION_SHIFT = (200.0, 50.0)
+
+
+class SpatialHash:
+    """Uniform grid of node positions with cells the size of the collision radius.
+
+    Any node overlapping a point lies in the point's cell or one of its eight
+    neighbours, so collision checks touch at most nine cells regardless of
+    how many nodes are on the canvas.
+    """
+
+    def __init__(self) -> None:
+        self._cells: dict[tuple[int, int], dict[str, tuple[float, float]]] = {}
+        self._positions: dict[str, tuple[float, float]] = {}
+
+    def _cell(self, x: float, y: float) -> tuple[int, int]:
+        return math.floor(x / COLLISION_RADIUS), math.floor(y / COLLISION_RADIUS)
+
+    def insert(self, node_id: str, x: float, y: float) -> None:
+        self.remove(node_id)
+        self._positions[node_id] = (x, y)
+        self._cells.setdefault(self._cell(x, y), {})[node_id] = (x, y)
+
+    def remove(self, node_id: str) -> None:
+        pos = self._positions.pop(node_id, None)
+        if pos is None:
+            return
+        key = self._cell(*pos)
+        bucket = self._cells[key]
+        del bucket[node_id]
+        if not bucket:
+            del self._cells[key]
+
+    def collides(self, x: float, y: float) -> bool:
+        cx, cy = self._cell(x, y)
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                bucket = self._cells.get((cx + dx, cy + dy))
+                if not bucket:
+                    continue
+                for ex, ey in bucket.values():
+                    if abs(x - ex) < COLLISION_RADIUS and abs(y - ey) < COLLISION_RADIUS:
+                        return True
+        return False
+
+    def find_free(self, x: float, y: float) -> tuple[float, float]:
+        """Shift (x, y) by COLLISION_SHIFT until it overlaps no node."""
+        while self.collides(x, y):
+            x += COLLISION_SHIFT[0]
+            y += COLLISION_SHIFT[1]
+        return x, y
+
+
+@dataclass
+class Verdict:
+    """Outcome of feeding a single action to a GraphValidator."""
+    accepted: bool
+    reason: str | None = None
+
+
+@dataclass
+class DroppedAction:
+    action: GraphAction
+    reason: str
+
+
+@dataclass
+class ValidationReport:
+    """Summary returned by GraphValidator.finish()."""
+    accepted: list[GraphAction] = field(default_factory=list)
+    dropped: list[DroppedAction] = field(default_factory=list)
+
+
+class GraphValidator:
+    """Incremental validator for reference integrity, duplicates and collisions.
+
+    Built once from the current graph, then fed one action at a time. The
+    node/edge indexes and the spatial hash of positions are kept up to date
+    as actions are accepted, so each action is checked in constant expected
+    time instead of a rebuild or a scan.
+    """
+
+    def __init__(self, current_graph: GraphState | None = None):
+        self._node_ids: set[str] = set()
+        self._edge_ids: set[str] = set()
+        self._positions = SpatialHash()
+
+        if current_graph:
+            self._node_ids = {n.id for n in current_graph.nodes}
+            self._edge_ids = {e.id for e in current_graph.edges}
+            for n in current_graph.nodes:
+                self._positions.insert(n.id, n.position.x, n.position.y)
+
+        self._report = ValidationReport()
+
+    def feed(self, action: GraphAction) -> Verdict:
+        """Validate one action and, if accepted, apply it to the indexes."""
+        reason = self._check(action)
+        if reason:
+            logger.warning(f"{reason}, skipping")
+            self._report.dropped.append(DroppedAction(action=action, reason=reason))
+            return Verdict(accepted=False, reason=reason)
+
+        self._report.accepted.append(action)
+        return Verdict(accepted=True)
+
+    def finish(self) -> ValidationReport:
+        """Return the accepted actions and what was dropped (and why)."""
+        if self._report.dropped:
+            logger.info(
+                f"Validation dropped {len(self._report.dropped)} of "
+                f"{len(self._report.dropped) + len(self._report.accepted)} actions"
+            )
+        return self._report
+
+    def _check(self, action: GraphAction) -> str | None:
         match action.op:
             case "add_node":
-                if action.id in node_ids:
-                    logger.warning(f"Duplicate node ID: {action.id}, skipping")
-                    continue
+                if action.id in self._node_ids:
+                    return f"Duplicate node ID: {action.id}"
 
-                # Collision detection: shift if too close to existing
-                pos_x, pos_y = action.position.x, action.position.y
-                for ex, ey in existing_positions:
-                    if abs(pos_x - ex) < 150 and abs(pos_y - ey) < 150:
-                        pos_x += 200
-                        pos_y += 50
+                if action.position is None:
+                    action.position = Position(x=0, y=0)
 
+                # Collision detection: shift until clear of every existing node
+                pos_x, pos_y = self._positions.find_free(action.position.x, action.position.y)
                 action.position.x = pos_x
                 action.position.y = pos_y
-                existing_positions.append((pos_x, pos_y))
-                node_ids.add(action.id)
-                valid_actions.append(action)
+                self._positions.insert(action.id, pos_x, pos_y)
+                self._node_ids.add(action.id)
 
             case "remove_node":
-                if action.id not in node_ids:
-                    logger.warning(f"Node not found for removal: {action.id}, skipping")
-                    continue
-                node_ids.discard(action.id)
-                valid_actions.append(action)
+                if action.id not in self._node_ids:
+                    return f"Node not found for removal: {action.id}"
+                self._node_ids.discard(action.id)
+                self._positions.remove(action.id)
 
             case "update_node":
-                if action.id not in node_ids:
-                    logger.warning(f"Node not found for update: {action.id}, skipping")
-                    continue
-                valid_actions.append(action)
+                if action.id not in self._node_ids:
+                    return f"Node not found for update: {action.id}"
 
             case "move_node":
-                if action.id not in node_ids:
-                    logger.warning(f"Node not found for move: {action.id}, skipping")
-                    continue
-                valid_actions.append(action)
+                if action.id not in self._node_ids:
+                    return f"Node not found for move: {action.id}"
+                self._positions.insert(action.id, action.position.x, action.position.y)
 
             case "add_edge":
-                if action.id in edge_ids:
-                    logger.warning(f"Duplicate edge ID: {action.id}, skipping")
-                    continue
-                if action.source not in node_ids:
-                    logger.warning(f"Edge source not found: {action.source}, skipping")
-                    continue
-                if action.target not in node_ids:
-                    logger.warning(f"Edge target not found: {action.target}, skipping")
-                    continue
-                edge_ids.add(action.id)
-                valid_actions.append(action)
+                if action.id in self._edge_ids:
+                    return f"Duplicate edge ID: {action.id}"
+                if action.source not in self._node_ids:
+                    return f"Edge source not found: {action.source}"
+                if action.target not in self._node_ids:
+                    return f"Edge target not found: {action.target}"
+                self._edge_ids.add(action.id)
 
             case "remove_edge":
-                if action.id not in edge_ids:
-                    logger.warning(f"Edge not found for removal: {action.id}, skipping")
-                    continue
-                edge_ids.discard(action.id)
-                valid_actions.append(action)
+                if action.id not in self._edge_ids:
+                    return f"Edge not found for removal: {action.id}"
+                self._edge_ids.discard(action.id)
 
             case "update_edge":
-                if action.id not in edge_ids:
-                    logger.warning(f"Edge not found for update: {action.id}, skipping")
-                    continue
-                valid_actions.append(action)
+                if action.id not in self._edge_ids:
+                    return f"Edge not found for update: {action.id}"
+
+        return None
+
 
-    response.actions = valid_actions
+def validate_actions(response: AIResponse, current_graph: GraphState | None = None) -> AIResponse:
+    """Validate AI response actions for reference integrity and duplicates."""
+    validator = GraphValidator(current_graph)
+    for action in response.actions:
+        validator.feed(action)
+    response.actions = validator.finish().accepted
     return response
@@ -0,0 +1,84 @@
+"""Prompt size and encode time of a graph, before and after encode_graph.
+
+    cd backend && python -m benchmarks.graph_encoding
+
+"before" is what modify and review prompts used to embed,
+graph.model_dump_json(indent=2, by_alias=True); "after" is encode_graph as
+modify prompts call it (aliases on, positions only for layout requests,
+shown separately as "+pos"). Graphs have canvas-style UUID IDs, labels,
+tech and about 1.3 edges per node. Tokens are estimated at 4 characters
+each, as the scheduler and the rate limiter do.
+"""
+from __future__ import annotations
+import random
+import time
+import uuid
+
+from app.models.graph import GraphState
+from app.services.graph_encoding import encode_graph
+
+SIZES = (5, 20, 100, 500)
+KINDS = (
+    ("service", "Orders API", "python"),
+    ("database", "Orders DB", "postgres"),
+    ("cache", "Session cache", "redis"),
+    ("queue", "Events", "kafka"),
+    ("gateway", "API gateway", "kong"),
+    ("load_balancer", "Edge LB", "nginx"),
+)
+
+
+def make_graph(n: int) -> GraphState:
+    rng = random.Random(n)
+    ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(n)]
+    nodes = []
+    for i, node_id in enumerate(ids):
+        node_type, label, tech = rng.choice(KINDS)
+        nodes.append({
+            "id": node_id,
+            "type": "architecture",
+            "position": {"x": rng.uniform(0, 3000), "y": rng.uniform(0, 2000)},
+            "data": {"label": f"{label} {i}", "nodeType": node_type, "tech": tech, "replicas": rng.randint(1, 4)},
+        })
+    edges = [
+        {
+            "id": f"edge-{rng.choice(ids)}",
+            "source": rng.choice(ids),
+            "target": rng.choice(ids),
+            "type": "smoothstep",
+            "data": {"protocol": rng.choice(("http", "grpc", "amqp"))},
+        }
+        for _ in range(round(n * 1.3))
+    ]
+    return GraphState.model_validate({"nodes": nodes, "edges": edges})
+
+
+def timed(fn, repeat: int) -> float:
+    """Best-of-5 mean milliseconds per call."""
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best * 1000
+
+
+def main() -> None:
+    print(f"{'nodes':>6} {'before chars':>13} {'after chars':>12} {'+pos chars':>11} "
+          f"{'saved':>6} {'before tok':>11} {'after tok':>10} {'before ms':>10} {'after ms':>9}")
+    for n in SIZES:
+        graph = make_graph(n)
+        repeat = max(1, 2000 // n)
+        before_text = graph.model_dump_json(indent=2, by_alias=True)
+        after_text, _ = encode_graph(graph)
+        with_positions, _ = encode_graph(graph, include_positions=True)
+        before = timed(lambda: graph.model_dump_json(indent=2, by_alias=True), repeat)
+        after = timed(lambda: encode_graph(graph), repeat)
+        print(f"{n:>6} {len(before_text):>13,} {len(after_text):>12,} {len(with_positions):>11,} "
+              f"{1 - len(after_text) / len(before_text):>6.0%} {len(before_text) // 4:>11,} "
+              f"{len(after_text) // 4:>10,} {before:>10.3f} {after:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
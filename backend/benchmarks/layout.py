@@ -0,0 +1,92 @@
+"""Layered layout time for graphs the LLM sent without positions.
+
+    cd backend && python -m benchmarks.layout
+
+Each graph has n unplaced add_node actions across all node types and
+1.5 * n random add_edge actions. "solve" feeds the actions to a
+GraphLayout and solves it, as the streaming routes do; "apply_layout" is
+the pass the non-streaming routes run, which also writes the positions
+back into the actions.
+"anchored" adds 200 unplaced nodes, each wired to an existing node, to
+an already placed graph of n nodes.
+"""
+from __future__ import annotations
+import random
+import time
+from typing import Callable
+
+from app.models.actions import AIResponse
+from app.models.graph import GraphState
+from app.services.layout import TIERS, GraphLayout, apply_layout
+
+SIZES = (200, 2000, 5000)
+ANCHORED_ADDS = 200
+TYPES = tuple(TIERS)
+
+
+def make_response(n: int, seed: int, anchors: list[str] | None = None, prefix: str = "node") -> AIResponse:
+    rng = random.Random(seed)
+    ids = [f"{prefix}-{i}" for i in range(n)]
+    actions: list[dict] = [
+        {"op": "add_node", "id": node_id, "type": "architecture",
+         "data": {"label": node_id, "nodeType": rng.choice(TYPES)}}
+        for node_id in ids
+    ]
+    edges = [(node_id, rng.choice(anchors)) for node_id in ids] if anchors else [
+        (rng.choice(ids), rng.choice(ids)) for _ in range(int(n * 1.5))
+    ]
+    actions += [
+        {"op": "add_edge", "id": f"{prefix}-edge-{i}", "source": source, "target": target}
+        for i, (source, target) in enumerate(edges)
+    ]
+    return AIResponse(thought_process="", summary="", actions=actions)
+
+
+def placed_graph(n: int) -> GraphState:
+    layout = apply_layout(make_response(n, seed=n))
+    nodes = [
+        {"id": a.id, "position": a.position.model_dump(), "data": a.data.model_dump(by_alias=True)}
+        for a in layout.actions if a.op == "add_node"
+    ]
+    edges = [{"id": a.id, "source": a.source, "target": a.target} for a in layout.actions if a.op == "add_edge"]
+    return GraphState.model_validate({"nodes": nodes, "edges": edges})
+
+
+def timed(run: Callable[[AIResponse], object], make: Callable[[], AIResponse]) -> float:
+    """Best-of-5 milliseconds for one run on a fresh response."""
+    best = float("inf")
+    for _ in range(5):
+        response = make()
+        start = time.perf_counter()
+        run(response)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def _solve(response: AIResponse, current_graph: GraphState | None = None) -> None:
+    layout = GraphLayout(current_graph)
+    for action in response.actions:
+        layout.observe(layout.place(action))
+    layout.solve()
+
+
+def main() -> None:
+    print(f"{'nodes':>6} {'edges':>6} {'solve ms':>9} {'apply_layout ms':>16} {'anchored ms':>12}")
+    for n in SIZES:
+        def make() -> AIResponse:
+            return make_response(n, seed=n)
+
+        edges = sum(a.op == "add_edge" for a in make().actions)
+        solve = timed(_solve, make)
+        full = timed(apply_layout, make)
+        graph = placed_graph(n)
+        anchors = [node.id for node in graph.nodes]
+        anchored = timed(
+            lambda response: apply_layout(response, current_graph=graph),
+            lambda: make_response(ANCHORED_ADDS, seed=0, anchors=anchors, prefix="new"),
+        )
+        print(f"{n:>6} {edges:>6} {solve:>9.2f} {full:>16.2f} {anchored:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Encode time and bytes on the wire for graph responses, before and after.
+
+    cd backend && python -m benchmarks.serialization
+
+"before" is FastAPI's default path for a GraphDetail (validate, dump to a
+dict, stdlib json); "after" is FastJSONResponse, which
+has pydantic-core write the JSON bytes directly. Wire sizes are for the
+"after" body, uncompressed and as CompressionMiddleware would send it.
+"""
+from __future__ import annotations
+import asyncio
+import gzip
+import random
+import time
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app.models.persistence import GraphDetail
+from app.responses import FastJSONResponse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SIZES = (50, 500, 5000)
+TYPES = ("api_server", "database", "cache", "queue", "load_balancer", "worker", "object_storage")
+
+
+def make_graph(n: int) -> GraphDetail:
+    rng = random.Random(n)
+    nodes = [
+        {
+            "id": f"node-{i}",
+            "type": "architecture",
+            "position": {"x": rng.uniform(0, 4000), "y": rng.uniform(0, 4000)},
+            "data": {
+                "label": f"Service {i}",
+                "nodeType": rng.choice(TYPES),
+                "tech": "postgres",
+                "description": "Handles requests for one bounded context of the system.",
+                "replicas": rng.randint(1, 8),
+            },
+        }
+        for i in range(n)
+    ]
+    edges = [
+        {
+            "id": f"edge-{i}",
+            "source": f"node-{i % n}",
+            "target": f"node-{rng.randrange(n)}",
+            "data": {"protocol": "http", "label": "calls"},
+        }
+        for i in range(int(n * 1.2))
+    ]
+    return GraphDetail(
+        id="bench", name="Benchmark", nodes=nodes, edges=edges, version=3,
+        createdAt="2025-01-01T00:00:00Z", updatedAt="2025-01-01T00:00:00Z",
+    )
+
+
+def timed(fn, repeat: int) -> float:
+    """Best-of-5 mean milliseconds per call."""
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best * 1000
+
+
+async def _before_async(field, graph: GraphDetail) -> bytes:
+    content = await serialize_response(field=field, response_content=graph)
+    return JSONResponse(content).body
+
+
+def main() -> None:
+    field = create_model_field(name="Response", type_=GraphDetail, mode="serialization")
+    loop = asyncio.new_event_loop()
+
+    print(f"{'nodes':>6} {'before ms':>10} {'after ms':>9} {'speedup':>8} "
+          f"{'raw KB':>8} {'gzip KB':>8} {'br KB':>7}")
+    for n in SIZES:
+        graph = make_graph(n)
+        repeat = max(1, 2000 // n)
+        before = timed(lambda: loop.run_until_complete(_before_async(field, graph)), repeat)
+        after = timed(lambda: FastJSONResponse(graph).body, repeat)
+        body = FastJSONResponse(graph).body
+        gz = len(gzip.compress(body, compresslevel=6))
+        br = f"{len(brotli.compress(body, quality=4)) / 1024:7.1f}" if brotli else f"{'-':>7}"
+        print(f"{n:>6} {before:>10.2f} {after:>9.2f} {before / after:>7.1f}x "
+              f"{len(body) / 1024:>8.1f} {gz / 1024:>8.1f} {br}")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Collision placement of new nodes: the old scan against SpatialHash.
+
+    cd backend && python -m benchmarks.validator
+
+Each run places ADDS random new nodes on a CANVAS x CANVAS canvas that
+already holds n nodes. "scan" is the loop GraphValidator used before: it
+compares every new node with every known position and shifts it mid-scan,
+so a shifted node can still land on one it had already passed.
+"hash" is SpatialHash.find_free. "overlaps" counts new nodes that still
+overlap another node afterwards.
+"""
+from __future__ import annotations
+import random
+import time
+
+from app.services.validator import COLLISION_RADIUS, COLLISION_SHIFT, SpatialHash
+
+SIZES = (100, 1000, 5000)
+ADDS = 200
+CANVAS = 20000.0
+
+
+def _points(n: int, seed: int) -> list[tuple[float, float]]:
+    rng = random.Random(seed)
+    return [(rng.uniform(0, CANVAS), rng.uniform(0, CANVAS)) for _ in range(n)]
+
+
+def place_scan(existing: dict[str, tuple[float, float]], adds: list[tuple[float, float]]) -> dict[str, tuple[float, float]]:
+    positions = dict(existing)
+    for i, (x, y) in enumerate(adds):
+        for ex, ey in positions.values():
+            if abs(x - ex) < COLLISION_RADIUS and abs(y - ey) < COLLISION_RADIUS:
+                x += COLLISION_SHIFT[0]
+                y += COLLISION_SHIFT[1]
+        positions[f"new-{i}"] = (x, y)
+    return positions
+
+
+def place_hash(grid: SpatialHash, adds: list[tuple[float, float]]) -> dict[str, tuple[float, float]]:
+    placed = {}
+    for i, (x, y) in enumerate(adds):
+        placed[f"new-{i}"] = grid.find_free(x, y)
+        grid.insert(f"new-{i}", *placed[f"new-{i}"])
+    return placed
+
+
+def overlaps(positions: dict[str, tuple[float, float]]) -> int:
+    grid = SpatialHash()
+    for node_id, (x, y) in positions.items():
+        if not node_id.startswith("new-"):
+            grid.insert(node_id, x, y)
+    count = 0
+    for node_id, (x, y) in positions.items():
+        if node_id.startswith("new-"):
+            count += grid.collides(x, y)
+            grid.insert(node_id, x, y)
+    return count
+
+
+def timed(fn) -> tuple[float, object]:
+    """Best-of-5 milliseconds for one call, and its result."""
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main() -> None:
+    adds = _points(ADDS, seed=0)
+    print(f"{'nodes':>6} {'scan ms':>8} {'overlaps':>8} {'hash ms':>8} {'overlaps':>8} {'build ms':>9} {'speedup':>8}")
+    for n in SIZES:
+        existing = {f"node-{i}": p for i, p in enumerate(_points(n, seed=n))}
+
+        def fresh_grid() -> SpatialHash:
+            grid = SpatialHash()
+            for node_id, (x, y) in existing.items():
+                grid.insert(node_id, x, y)
+            return grid
+
+        scan_ms, scanned = timed(lambda: place_scan(existing, adds))
+        build_ms, _ = timed(fresh_grid)
+        grids = iter([fresh_grid() for _ in range(5)])
+        hash_ms, placed = timed(lambda: place_hash(next(grids), adds))
+        print(f"{n:>6} {scan_ms:>8.2f} {overlaps(scanned):>8} {hash_ms:>8.2f} "
+              f"{overlaps({**existing, **placed}):>8} {build_ms:>9.2f} {scan_ms / hash_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+-- Delta-based iteration saves: iterations hold a snapshot, iteration_ops the
+-- actions applied since. Run in the Supabase SQL editor.
+
+ALTER TABLE iterations
+  ADD COLUMN snapshot_seq INT NOT NULL DEFAULT 0,  -- last op folded into nodes/edges
+  ADD COLUMN head_seq INT NOT NULL DEFAULT 0;      -- last committed op
+
+CREATE TABLE iteration_ops (
+  iteration_id UUID REFERENCES iterations(id) ON DELETE CASCADE NOT NULL,
+  seq INT NOT NULL,
+  action JSONB NOT NULL,
+  created_at TIMESTAMPTZ DEFAULT now(),
+  PRIMARY KEY (iteration_id, seq)
+);
+
+ALTER TABLE iteration_ops ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users manage own iteration ops"
+  ON iteration_ops FOR ALL
+  USING (iteration_id IN (
+    SELECT i.id FROM iterations i
+    JOIN projects p ON i.project_id = p.id
+    WHERE p.user_id = auth.uid()
+  ))
+  WITH CHECK (iteration_id IN (
+    SELECT i.id FROM iterations i
+    JOIN projects p ON i.project_id = p.id
+    WHERE p.user_id = auth.uid()
+  ));
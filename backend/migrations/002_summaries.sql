@@ -0,0 +1,62 @@
+-- Materialized summaries for the project and graph lists. The API writes the
+-- per-iteration and per-graph columns; a trigger rolls iterations up into
+-- their project. Run in the Supabase SQL editor.
+
+ALTER TABLE iterations
+  ADD COLUMN node_count INT NOT NULL DEFAULT 0,
+  ADD COLUMN preview_nodes JSONB NOT NULL DEFAULT '[]'::jsonb;
+
+ALTER TABLE projects
+  ADD COLUMN node_count INT NOT NULL DEFAULT 0,
+  ADD COLUMN iteration_count INT NOT NULL DEFAULT 0,
+  ADD COLUMN first_iteration_id UUID,
+  ADD COLUMN preview_nodes JSONB NOT NULL DEFAULT '[]'::jsonb;
+
+ALTER TABLE graphs
+  ADD COLUMN node_count INT NOT NULL DEFAULT 0,
+  ADD COLUMN edge_count INT NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION refresh_project_summary()
+RETURNS TRIGGER AS $$
+DECLARE
+  pid UUID := COALESCE(NEW.project_id, OLD.project_id);
+BEGIN
+  UPDATE projects p SET
+    node_count = s.node_count,
+    iteration_count = s.iteration_count,
+    first_iteration_id = s.first_iteration_id,
+    preview_nodes = s.preview_nodes
+  FROM (
+    SELECT
+      COALESCE(SUM(node_count), 0) AS node_count,
+      COUNT(*) AS iteration_count,
+      (ARRAY_AGG(id ORDER BY ordinal))[1] AS first_iteration_id,
+      COALESCE((ARRAY_AGG(preview_nodes ORDER BY ordinal))[1], '[]'::jsonb) AS preview_nodes
+    FROM iterations
+    WHERE project_id = pid
+  ) s
+  WHERE p.id = pid;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER iterations_project_summary
+  AFTER INSERT OR DELETE OR UPDATE OF node_count, preview_nodes, ordinal ON iterations
+  FOR EACH ROW EXECUTE FUNCTION refresh_project_summary();
+
+-- Backfill (the UPDATE on iterations fires the trigger for every project)
+UPDATE graphs SET
+  node_count = COALESCE(jsonb_array_length(nodes), 0),
+  edge_count = COALESCE(jsonb_array_length(edges), 0);
+
+UPDATE iterations SET
+  node_count = jsonb_array_length(nodes),
+  preview_nodes = COALESCE((
+    SELECT jsonb_agg(jsonb_build_object(
+      'type', COALESCE(n->>'type', 'service'),
+      'x', COALESCE((n->'position'->>'x')::float, 0),
+      'y', COALESCE((n->'position'->>'y')::float, 0)
+    ))
+    FROM jsonb_array_elements(nodes) WITH ORDINALITY AS t(n, i)
+    WHERE (i - 1) % GREATEST(1, CEIL(jsonb_array_length(nodes) / 64.0)::int) = 0
+  ), '[]'::jsonb);
@@ -0,0 +1,5 @@
+-- Keyset pagination indexes for GET /api/projects and GET /api/graphs,
+-- matching ORDER BY updated_at DESC, id DESC.
+
+CREATE INDEX idx_projects_user_updated ON projects(user_id, updated_at DESC, id DESC);
+CREATE INDEX idx_graphs_updated ON graphs(updated_at DESC, id DESC);
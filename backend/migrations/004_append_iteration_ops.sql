@@ -0,0 +1,36 @@
+-- Append iteration ops and move head_seq past them in one transaction, so a
+-- crash between the two cannot leave ops above the head that make every
+-- later patch collide. Run in the Supabase SQL editor.
+
+CREATE OR REPLACE FUNCTION append_iteration_ops(
+  p_iteration_id UUID,
+  p_expected_seq INT,  -- head_seq the ops were applied on
+  p_actions JSONB,     -- array; the ops get seqs p_expected_seq + 1, + 2, ...
+  p_updates JSONB      -- iteration columns to set along with head_seq
+)
+RETURNS INT AS $$
+DECLARE
+  new_head INT := p_expected_seq + jsonb_array_length(p_actions);
+BEGIN
+  -- Compare-and-set; the row lock keeps other appenders out until commit
+  UPDATE iterations SET
+    head_seq = new_head,
+    node_count = COALESCE((p_updates->>'node_count')::int, node_count),
+    preview_nodes = COALESCE(p_updates->'preview_nodes', preview_nodes),
+    nodes = COALESCE(p_updates->'nodes', nodes),
+    edges = COALESCE(p_updates->'edges', edges),
+    snapshot_seq = COALESCE((p_updates->>'snapshot_seq')::int, snapshot_seq)
+  WHERE id = p_iteration_id AND head_seq = p_expected_seq;
+  IF NOT FOUND THEN
+    RETURN NULL;  -- another write moved the head first
+  END IF;
+
+  -- Ops above the head were never committed (left by the two-step writes
+  -- this function replaces)
+  DELETE FROM iteration_ops WHERE iteration_id = p_iteration_id AND seq > p_expected_seq;
+  INSERT INTO iteration_ops (iteration_id, seq, action)
+  SELECT p_iteration_id, p_expected_seq + t.i, t.action
+  FROM jsonb_array_elements(p_actions) WITH ORDINALITY AS t(action, i);
+  RETURN new_head;
+END;
+$$ LANGUAGE plpgsql;
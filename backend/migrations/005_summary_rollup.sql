@@ -0,0 +1,63 @@
+-- Summary rollups no longer count as project edits: they only run when an
+-- iteration's summary columns actually change, only write projects whose
+-- summary differs, and leave projects.updated_at (the list order) alone.
+-- Run in the Supabase SQL editor.
+
+CREATE OR REPLACE FUNCTION refresh_project_summary()
+RETURNS TRIGGER AS $$
+DECLARE
+  pid UUID := COALESCE(NEW.project_id, OLD.project_id);
+BEGIN
+  UPDATE projects p SET
+    node_count = s.node_count,
+    iteration_count = s.iteration_count,
+    first_iteration_id = s.first_iteration_id,
+    preview_nodes = s.preview_nodes
+  FROM (
+    SELECT
+      COALESCE(SUM(node_count), 0) AS node_count,
+      COUNT(*) AS iteration_count,
+      (ARRAY_AGG(id ORDER BY ordinal))[1] AS first_iteration_id,
+      COALESCE((ARRAY_AGG(preview_nodes ORDER BY ordinal))[1], '[]'::jsonb) AS preview_nodes
+    FROM iterations
+    WHERE project_id = pid
+  ) s
+  WHERE p.id = pid
+    AND (p.node_count, p.iteration_count, p.first_iteration_id, p.preview_nodes)
+      IS DISTINCT FROM (s.node_count, s.iteration_count, s.first_iteration_id, s.preview_nodes);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- UPDATE OF fires whenever the columns are in the SET list, changed or not
+DROP TRIGGER IF EXISTS iterations_project_summary ON iterations;
+
+CREATE TRIGGER iterations_project_summary
+  AFTER INSERT OR DELETE ON iterations
+  FOR EACH ROW EXECUTE FUNCTION refresh_project_summary();
+
+CREATE TRIGGER iterations_project_summary_update
+  AFTER UPDATE OF node_count, preview_nodes, ordinal ON iterations
+  FOR EACH ROW
+  WHEN (
+    (OLD.node_count, OLD.preview_nodes, OLD.ordinal)
+      IS DISTINCT FROM (NEW.node_count, NEW.preview_nodes, NEW.ordinal)
+  )
+  EXECUTE FUNCTION refresh_project_summary();
+
+-- Only direct updates (rename, description) are edits; the rollup above
+-- runs nested inside the iterations trigger
+CREATE OR REPLACE FUNCTION update_project_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF pg_trigger_depth() = 1 THEN
+    NEW.updated_at = now();
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS projects_updated_at ON projects;
+
+CREATE TRIGGER projects_updated_at BEFORE UPDATE ON projects
+  FOR EACH ROW EXECUTE FUNCTION update_project_updated_at();
@@ -0,0 +1,39 @@
+-- append_iteration_ops returns the updated iteration row (less the nodes and
+-- edges snapshot, which the caller has replayed itself), so the app can cache
+-- server-set columns such as updated_at instead of guessing them. NULL still
+-- means another write moved the head first. Run in the Supabase SQL editor.
+
+-- The return type changes, which CREATE OR REPLACE cannot do
+DROP FUNCTION IF EXISTS append_iteration_ops(UUID, INT, JSONB, JSONB);
+
+CREATE FUNCTION append_iteration_ops(
+  p_iteration_id UUID,
+  p_expected_seq INT,  -- head_seq the ops were applied on
+  p_actions JSONB,     -- array; the ops get seqs p_expected_seq + 1, + 2, ...
+  p_updates JSONB      -- iteration columns to set along with head_seq
+)
+RETURNS JSONB AS $$
+DECLARE
+  updated iterations;
+BEGIN
+  -- Compare-and-set; the row lock keeps other appenders out until commit
+  UPDATE iterations SET
+    head_seq = p_expected_seq + jsonb_array_length(p_actions),
+    node_count = COALESCE((p_updates->>'node_count')::int, node_count),
+    preview_nodes = COALESCE(p_updates->'preview_nodes', preview_nodes),
+    nodes = COALESCE(p_updates->'nodes', nodes),
+    edges = COALESCE(p_updates->'edges', edges),
+    snapshot_seq = COALESCE((p_updates->>'snapshot_seq')::int, snapshot_seq)
+  WHERE id = p_iteration_id AND head_seq = p_expected_seq
+  RETURNING * INTO updated;
+  IF NOT FOUND THEN
+    RETURN NULL;
+  END IF;
+
+  DELETE FROM iteration_ops WHERE iteration_id = p_iteration_id AND seq > p_expected_seq;
+  INSERT INTO iteration_ops (iteration_id, seq, action)
+  SELECT p_iteration_id, p_expected_seq + t.i, t.action
+  FROM jsonb_array_elements(p_actions) WITH ORDINALITY AS t(action, i);
+  RETURN to_jsonb(updated) - 'nodes' - 'edges';
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture
+def anyio_backend():
+    # The app runs on asyncio (uvicorn); anyio's pytest plugin drives the tests
+    return "asyncio"
@@ -0,0 +1,38 @@
+"""Pulling actions out of a streamed AIResponse."""
+import json
+
+from app.services.providers.base import IncrementalActionParser
+
+
+def _text(n: int) -> str:
+    actions = [
+        {
+            "op": "add_node", "id": f"n{i}", "type": "architecture",
+            "data": {"label": f'Service "{i}" {{x}}', "nodeType": "service"},
+        }
+        for i in range(n)
+    ]
+    return "```json\n" + json.dumps({"thought_process": "[{", "actions": actions, "summary": "done"}) + "\n```"
+
+
+def test_chunking_does_not_change_the_actions():
+    text = _text(20)
+    whole = IncrementalActionParser().feed(text)
+
+    for size in (1, 2, 3, 7, 64):
+        parser = IncrementalActionParser()
+        pieces = [parser.feed(text[i:i + size]) for i in range(0, len(text), size)]
+        assert [action for piece in pieces for action in piece] == whole
+    assert [action.id for action in whole] == [f"n{i}" for i in range(20)]
+
+
+def test_only_the_unparsed_tail_is_kept():
+    text = _text(500)
+    parser = IncrementalActionParser()
+    longest = 0
+    for ch in text:
+        parser.feed(ch)
+        longest = max(longest, len(parser._text))
+
+    # Never more than one element's worth, however long the response
+    assert longest < 200
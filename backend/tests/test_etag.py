@@ -0,0 +1,72 @@
+"""ETags across compressed and identity representations."""
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.etag import encoded_etag, if_match_version, not_modified, version_etag
+
+pytestmark = pytest.mark.anyio
+
+ETAG = version_etag(12)
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+    @app.get("/doc")
+    async def doc(request: Request):
+        cached = not_modified(request, ETAG)
+        if cached is not None:
+            return cached
+        return JSONResponse({"text": "x" * 1000}, headers={"ETag": ETAG})
+
+    @app.put("/doc")
+    async def put(request: Request):
+        return {"version": if_match_version(request)}
+
+    return app
+
+
+async def _client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=_app()), base_url="http://test")
+
+
+def test_encoded_etag():
+    assert encoded_etag('"v12"', "br") == '"v12-br"'
+    assert encoded_etag('W/"v12"', "gzip") == 'W/"v12"'
+
+
+async def test_compressed_body_gets_its_own_etag():
+    async with await _client() as client:
+        gzipped = await client.get("/doc", headers={"Accept-Encoding": "gzip"})
+        identity = await client.get("/doc", headers={"Accept-Encoding": "identity"})
+
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzipped.headers["ETag"] == '"v12-gzip"'
+    assert identity.headers["ETag"] == ETAG
+
+
+@pytest.mark.parametrize("tag", ['"v12"', '"v12-gzip"', '"v12-br"', 'W/"v12-gzip"'])
+async def test_if_none_match_accepts_every_representation(tag):
+    async with await _client() as client:
+        response = await client.get("/doc", headers={"Accept-Encoding": "gzip", "If-None-Match": tag})
+
+    assert response.status_code == 304
+
+
+async def test_if_none_match_rejects_other_versions():
+    async with await _client() as client:
+        response = await client.get("/doc", headers={"If-None-Match": '"v11-gzip"'})
+
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize(("tag", "version"), [('"v12"', 12), ('"v12-gzip"', 12), ('"abc"', -1), ("*", None)])
+async def test_if_match_reads_the_version_of_any_representation(tag, version):
+    async with await _client() as client:
+        response = await client.put("/doc", headers={"If-Match": tag})
+
+    assert response.json() == {"version": version}
@@ -0,0 +1,122 @@
+"""FallbackProvider routing, failover and hedging against fake providers."""
+import asyncio
+
+import pytest
+
+from app.services import llm
+from app.services.providers.base import DoneEvent, Prompt, TokenEvent
+from app.services.providers.fake_provider import FakeProvider
+from app.services.providers.fallback_provider import FallbackProvider
+
+pytestmark = pytest.mark.anyio
+
+TEXT = llm._demo_text("generate")
+PROMPT = Prompt(prefix="fallback test")
+
+
+def fake(name: str, **kwargs) -> FakeProvider:
+    return FakeProvider(respond=lambda system, user: name if system == "text" else TEXT, model=name, **kwargs)
+
+
+class GatedProvider(FakeProvider):
+    """Holds the first token until ``gate`` is set; counts calls that got past it."""
+
+    def __init__(self, name: str, gate: asyncio.Event):
+        super().__init__(respond=lambda system, user: TEXT, model=name)
+        self.gate = gate
+        self.answered = 0
+
+    async def _first_token_delay(self, hit: bool) -> None:
+        await self.gate.wait()
+        self.answered += 1
+
+
+async def test_fails_over_when_the_primary_raises():
+    fb = FallbackProvider([fake("a", failure_rate=1.0), fake("b")])
+
+    assert await fb.generate_text("text", PROMPT) == "b"
+    events = [e async for e in fb.stream("stream", PROMPT)]
+    assert isinstance(events[-1], DoneEvent)
+    assert fb.failovers == 2
+
+
+async def test_fails_over_when_the_primary_times_out():
+    fb = FallbackProvider([fake("a", latency=5.0), fake("b")], timeout=0.1)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    assert await fb.generate_text("text", PROMPT) == "b"
+    assert loop.time() - started < 1.0
+    assert fb.failovers == 1
+
+
+async def test_raises_the_last_error_when_every_provider_fails():
+    fb = FallbackProvider([fake("a", failure_rate=1.0), fake("b", failure_rate=1.0)])
+
+    with pytest.raises(RuntimeError, match="Injected provider failure"):
+        await fb.generate_text("text", PROMPT)
+
+
+async def test_hedge_fires_after_hedge_delay_and_cancels_the_loser():
+    slow, fast = fake("a", latency=5.0), fake("b")
+    fb = FallbackProvider([slow, fast], hedge=True, hedge_delay=0.1, hedge_max_ratio=1.0)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    events = fb.stream("stream", PROMPT)
+    async for event in events:
+        if isinstance(event, TokenEvent):
+            break
+    elapsed = loop.time() - started
+    await events.aclose()
+
+    assert 0.1 <= elapsed < 1.0
+    assert (fb.hedges, fb.hedge_wins) == (1, 1)
+    # The cancelled primary closed its upstream stream
+    assert slow.open_streams == 0 and fast.open_streams == 0
+
+
+async def test_hedge_loser_that_also_answered_is_discarded():
+    gate = asyncio.Event()
+    a, b = GatedProvider("a", gate), GatedProvider("b", gate)
+    fb = FallbackProvider([a, b], hedge=True, hedge_delay=0.05, hedge_max_ratio=1.0)
+
+    async def release():
+        # Let the hedge start, then answer on both at once
+        await asyncio.sleep(0.1)
+        gate.set()
+
+    releaser = asyncio.create_task(release())
+    events = [e async for e in fb.stream("stream", PROMPT)]
+    await releaser
+
+    assert isinstance(events[-1], DoneEvent)
+    assert fb.hedges == 1
+    assert (a.answered, b.answered) == (1, 1)
+    assert a.open_streams == 0 and b.open_streams == 0
+
+
+async def test_hedges_are_capped_by_hedge_max_ratio():
+    fb = FallbackProvider([fake("a", latency=0.1), fake("b", latency=0.1)], hedge=True, hedge_delay=0.02, hedge_max_ratio=0.5)
+
+    for _ in range(10):
+        await fb.generate_text("text", PROMPT)
+
+    assert fb.calls == 10
+    assert fb.hedges == 5
+
+
+async def test_open_breaker_demotes_the_provider():
+    a, b = fake("a", failure_rate=1.0), fake("b")
+    fb = FallbackProvider([a, b], breaker_min_calls=2, breaker_cooldown=60.0)
+    assert fb._order("generate") == [a, b]
+
+    for _ in range(3):
+        assert await fb.generate_text("text", PROMPT) == "b"
+
+    assert fb.health[id(a)].breaker.state == "open"
+    assert fb._order("generate") == [b, a]
+    # Straight to b: no failover once a is demoted
+    failovers = fb.failovers
+    assert await fb.generate_text("text", PROMPT) == "b"
+    assert fb.failovers == failovers
@@ -0,0 +1,85 @@
+"""encode_graph aliases and their mapping back through IdAliases.resolve."""
+import json
+
+from pydantic import TypeAdapter
+
+from app.models.actions import GraphAction
+from app.models.graph import GraphState
+from app.services.graph_encoding import encode_graph
+
+_actions = TypeAdapter(list[GraphAction])
+
+API = "service-api-7f3c2a9e"
+DB = "database-orders-1b2c3d4e"
+EDGE = "edge-api-orders-5a6b7c8d"
+
+
+def _graph() -> GraphState:
+    return GraphState.model_validate({
+        "nodes": [
+            {"id": API, "position": {"x": 0, "y": 0}, "data": {"label": "API", "nodeType": "service"}},
+            {"id": DB, "position": {"x": 200, "y": 0}, "data": {"label": "Orders", "nodeType": "database"}},
+        ],
+        "edges": [{"id": EDGE, "source": API, "target": DB}],
+    })
+
+
+def test_encoded_graph_uses_aliases_consistently():
+    text, aliases = encode_graph(_graph())
+    encoded = json.loads(text)
+
+    node_ids = [n["id"] for n in encoded["nodes"]]
+    edge = encoded["edges"][0]
+    assert node_ids == ["n1", "n2"]
+    assert (edge["id"], edge["source"], edge["target"]) == ("e1", "n1", "n2")
+    assert [aliases.real(a) for a in (*node_ids, edge["id"])] == [API, DB, EDGE]
+
+
+def test_resolve_maps_aliases_back_in_every_action():
+    _, aliases = encode_graph(_graph())
+    actions = _actions.validate_python([
+        {"op": "add_node", "id": "n3", "type": "cache", "data": {"label": "Cache", "nodeType": "cache"}},
+        {"op": "add_edge", "id": "e2", "source": "n1", "target": "n2"},
+        {"op": "update_node", "id": "n1", "data": {"label": "Gateway API"}},
+        {"op": "update_edge", "id": "e1", "data": {"label": "reads"}},
+        {"op": "move_node", "id": "n2", "position": {"x": 10, "y": 20}},
+        {"op": "remove_edge", "id": "e1"},
+        {"op": "remove_node", "id": "n2"},
+    ])
+
+    resolved = [aliases.resolve(a) for a in actions]
+
+    # New IDs the model made up are not aliases and pass through unchanged
+    assert resolved[0].id == "n3"
+    assert (resolved[1].id, resolved[1].source, resolved[1].target) == ("e2", API, DB)
+    assert [a.id for a in resolved[2:]] == [API, EDGE, DB, EDGE, DB]
+
+
+def test_resolve_leaves_unknown_ids_alone():
+    _, aliases = encode_graph(_graph())
+    [edge] = _actions.validate_python([{"op": "add_edge", "id": "edge-new", "source": "n1", "target": "cache-x"}])
+
+    aliases.resolve(edge)
+
+    assert (edge.id, edge.source, edge.target) == ("edge-new", API, "cache-x")
+
+
+def test_aliases_never_collide_with_real_ids():
+    graph = _graph()
+    graph.nodes[1].id = "n1"
+    graph.edges[0].target = "n1"
+    text, aliases = encode_graph(graph)
+    encoded = json.loads(text)
+
+    api_alias = encoded["nodes"][0]["id"]
+    assert api_alias != "n1"
+    assert encoded["edges"][0]["source"] == api_alias
+    # "n1" is short already and stays itself
+    assert aliases.real("n1") == "n1" and aliases.real(api_alias) == API
+
+
+def test_without_aliases_ids_are_sent_as_is():
+    text, aliases = encode_graph(_graph(), use_aliases=False)
+
+    assert [n["id"] for n in json.loads(text)["nodes"]] == [API, DB]
+    assert aliases.to_real == {}
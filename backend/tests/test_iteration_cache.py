@@ -0,0 +1,73 @@
+"""Loading iterations through the read-through cache."""
+import pytest
+
+from app.models.actions import MoveNodeAction
+from app.models.graph import Position
+from app.services import projects
+from app.services.cache_backend import MemoryCacheBackend
+from app.services.projects import iteration_cache
+from tests.test_nonblocking_persistence import SlowSupabase, _Result
+
+pytestmark = pytest.mark.anyio
+
+
+class _RpcSupabase(SlowSupabase):
+    """Runs append_iteration_ops the way migrations/006 does."""
+
+    def rpc(self, name: str, params: dict):
+        db = self
+
+        class _Call:
+            async def execute(self):
+                if db.row["head_seq"] != params["p_expected_seq"]:
+                    return _Result(None)
+                db.row.update(params["p_updates"], head_seq=params["p_expected_seq"] + len(params["p_actions"]))
+                db.row["updated_at"] = f"server time {db.row['head_seq']}"
+                return _Result({k: v for k, v in db.row.items() if k not in ("nodes", "edges")})
+
+        return _Call()
+
+
+_NODES = [{"id": "n1", "type": "service", "position": {"x": 0, "y": 0}, "data": {"label": "API"}}]
+
+
+@pytest.fixture(autouse=True)
+def _empty_cache(monkeypatch):
+    monkeypatch.setattr(iteration_cache, "backend", MemoryCacheBackend(16))
+
+
+@pytest.fixture
+def db():
+    return SlowSupabase(_NODES)
+
+
+async def test_cache_hit_skips_the_database(db):
+    first = await projects._load_iteration(db, "it-1")
+    trips = db.round_trips
+    again = await projects._load_iteration(db, "it-1")
+
+    assert again == first
+    assert db.round_trips == trips
+
+
+async def test_write_drops_the_cached_head(db, monkeypatch):
+    monkeypatch.setattr(projects, "_client", db)
+    await projects._load_iteration(db, "it-1")
+    head = await projects.save_iteration("it-1", [], [])
+    row = await projects._load_iteration(db, "it-1")
+
+    assert row["head_seq"] == head
+    assert row["nodes"] == []
+
+
+async def test_patch_caches_the_row_the_database_returns(monkeypatch):
+    db = _RpcSupabase(_NODES)
+    db.row["updated_at"] = "server time 0"
+    monkeypatch.setattr(projects, "_client", db)
+    move = MoveNodeAction(op="move_node", id="n1", position=Position(x=5, y=5))
+    head = await projects.patch_iteration("it-1", [move], 0)
+    row = await iteration_cache.get("it-1")
+
+    assert row["head_seq"] == head == 1
+    assert row["updated_at"] == "server time 1"
+    assert row["nodes"][0]["position"] == {"x": 5, "y": 5}
@@ -0,0 +1,70 @@
+"""Charging the shared per-user LLM budget."""
+import httpx
+import pytest
+
+from app.main import app
+from app.middleware.rate_limit import _LLM_UNITS, _TOKENS_PER_UNIT, limiter
+from app.services import llm
+from app.services.providers.fake_provider import FakeProvider
+
+pytestmark = pytest.mark.anyio
+
+# A prompt big enough to cost the whole budget
+_HUGE = "x" * (4 * _TOKENS_PER_UNIT * _LLM_UNITS)
+
+
+@pytest.fixture(autouse=True)
+def _setup(monkeypatch):
+    limiter.reset()
+    monkeypatch.setattr(llm, "provider", FakeProvider(respond=lambda system, user: llm._demo_text(system)))
+    yield
+    # Leave no exhausted budget behind for the next test module
+    limiter.reset()
+
+
+async def _post(client: httpx.AsyncClient, path: str, prompt: str, **headers) -> httpx.Response:
+    response = await client.post(path, json={"prompt": prompt, "history": []}, headers=headers)
+    await response.aread()
+    return response
+
+
+def _client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+async def test_last_event_id_does_not_waive_the_cost():
+    async with _client() as client:
+        assert (await _post(client, "/api/generate", _HUGE)).status_code == 200
+        plain = await _post(client, "/api/generate", "again", **{"Last-Event-ID": "1"})
+        unknown = await _post(client, "/api/generate/stream", "again", **{"Last-Event-ID": "gone:1"})
+
+    assert plain.status_code == 429
+    assert unknown.status_code == 429
+
+
+async def test_resuming_a_known_stream_is_free():
+    async with _client() as client:
+        first = await _post(client, "/api/generate/stream", "resume me")
+        last_id = [line[4:] for line in first.text.splitlines() if line.startswith("id: ")][0]
+        # Spend what the first stream left of the budget
+        rest = "x" * (4 * _TOKENS_PER_UNIT * (_LLM_UNITS - 2))
+        assert (await _post(client, "/api/generate", rest)).status_code == 200
+        resumed = await _post(client, "/api/generate/stream", "resume me", **{"Last-Event-ID": last_id})
+        fresh = await _post(client, "/api/generate/stream", "resume me")
+
+    assert fresh.status_code == 429
+    assert resumed.status_code == 200
+    assert "done" in resumed.text
+
+
+async def test_chunked_body_costs_the_whole_budget():
+    async def chunks():
+        yield b'{"prompt": "streamed", "history": []}'
+
+    async with _client() as client:
+        first = await client.post("/api/generate", content=chunks(), headers={"Content-Type": "application/json"})
+        second = await _post(client, "/api/generate", "again")
+
+    assert "content-length" not in first.request.headers
+    assert first.status_code == 200
+    assert second.status_code == 429
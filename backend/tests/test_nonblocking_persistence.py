@@ -0,0 +1,122 @@
+"""Autosaves must not stall SSE streams running on the same event loop."""
+import asyncio
+import json
+
+import pytest
+
+from app.main import app
+from app.middleware.rate_limit import limiter
+from app.services import llm, projects
+from app.services.providers.fake_provider import FakeProvider
+
+pytestmark = pytest.mark.anyio
+
+# Simulated database round-trip; longer than any gap a healthy stream has
+DB_LATENCY = 0.15
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    """Chainable stand-in for a postgrest query; execute() takes DB_LATENCY."""
+
+    def __init__(self, db: "SlowSupabase", table: str):
+        self.db = db
+        self.table = table
+        self.values: dict | None = None
+
+    def __getattr__(self, name):
+        # select / eq / gt / lte / order / single / delete: filters we can ignore
+        return lambda *args, **kwargs: self
+
+    def update(self, values: dict) -> "_Query":
+        self.values = values
+        return self
+
+    async def execute(self) -> _Result:
+        await asyncio.sleep(DB_LATENCY)
+        self.db.round_trips += 1
+        if self.table == "iterations":
+            if self.values is not None:
+                self.db.row.update(self.values)
+                return _Result([self.db.row])
+            return _Result(dict(self.db.row))
+        return _Result([])
+
+
+class SlowSupabase:
+    def __init__(self, nodes: list):
+        self.row = {"id": "it-1", "nodes": nodes, "edges": [], "snapshot_seq": 0, "head_seq": 0}
+        self.round_trips = 0
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+
+def _scope(body: bytes) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.4"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/api/generate/stream",
+        "raw_path": b"/api/generate/stream",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"host", b"test"),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("test", 80),
+    }
+
+
+async def test_autosaves_do_not_stall_token_stream(monkeypatch):
+    limiter.reset()
+    nodes = [
+        {"id": f"n{i}", "type": "service", "position": {"x": i * 10, "y": 0}, "data": {"label": f"Service {i}"}}
+        for i in range(500)
+    ]
+    db = SlowSupabase(nodes)
+    monkeypatch.setattr(projects, "_client", db)
+    fake = FakeProvider(respond=lambda system, user: llm._demo_text(system), token_interval=0.01)
+    monkeypatch.setattr(llm, "provider", fake)
+
+    loop = asyncio.get_running_loop()
+    body = json.dumps({"prompt": "stream during autosaves", "history": []}).encode()
+    arrivals: list[float] = []
+
+    async def receive():
+        nonlocal body
+        if body is not None:
+            chunk, body = body, None
+            return {"type": "http.request", "body": chunk, "more_body": False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            arrivals.append(loop.time())
+
+    async def autosave():
+        # Back to back, like several clients autosaving
+        while True:
+            await projects.save_iteration("it-1", nodes, [])
+            await asyncio.sleep(0.01)
+
+    saver = asyncio.create_task(autosave())
+    try:
+        await asyncio.wait_for(app(_scope(body), receive, send), 10.0)
+    finally:
+        saver.cancel()
+
+    gaps = [b - a for a, b in zip(arrivals, arrivals[1:])]
+    assert len(gaps) > 10
+    # Saves ran the whole time, yet no frame waited for a database round-trip
+    assert db.round_trips >= 3
+    assert max(gaps) < DB_LATENCY
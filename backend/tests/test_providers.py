@@ -0,0 +1,63 @@
+"""SDK providers built with a quota pacer, as the provider factory builds them."""
+import httpx
+import pytest
+
+from app.services import llm
+from app.services.providers.anthropic_provider import AnthropicProvider
+from app.services.providers.base import Prompt
+from app.services.providers.fallback_provider import FallbackProvider
+from app.services.providers.gemini_provider import GeminiProvider
+from app.services.providers.groq_provider import GroqProvider
+from app.services.providers.quota import QuotaPacer
+
+ANTHROPIC = {
+    "id": "msg_1", "type": "message", "role": "assistant", "model": "claude",
+    "content": [{"type": "text", "text": "hi"}],
+    "stop_reason": "end_turn", "stop_sequence": None,
+    "usage": {"input_tokens": 1, "output_tokens": 1},
+}
+GROQ = {
+    "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "llama",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "hi"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}
+GEMINI = {
+    "candidates": [{"content": {"role": "model", "parts": [{"text": "hi"}]}, "finishReason": "STOP"}],
+    "usageMetadata": {"promptTokenCount": 1, "candidatesTokenCount": 1},
+}
+
+PROVIDERS = [
+    (AnthropicProvider, lambda p: p.client._client._transport, ANTHROPIC),
+    (GroqProvider, lambda p: p.client._client._transport, GROQ),
+    (GeminiProvider, lambda p: p._http._transport, GEMINI),
+]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize(("provider_class", "transport_of", "body"), PROVIDERS)
+async def test_calls_go_through_the_pacer(provider_class, transport_of, body):
+    pacer = QuotaPacer("test", requests_per_minute=10)
+    provider = provider_class(api_key="test-key", model="test-model", pacer=pacer)
+    transport = transport_of(provider)
+    assert transport.pacer is pacer
+
+    # Stand in for the API at the bottom of the paced transport
+    transport._transport = httpx.MockTransport(lambda request: httpx.Response(200, json=body))
+    try:
+        assert await provider.generate_text("system", Prompt(prefix="prompt")) == "hi"
+    finally:
+        await provider.aclose()
+
+    assert pacer.buckets["requests"].level == pytest.approx(9, abs=0.01)
+
+
+def test_factory_builds_every_configured_provider(monkeypatch):
+    monkeypatch.setattr(llm, "ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+
+    provider = llm._create_provider()
+
+    assert isinstance(provider, FallbackProvider)
+    assert sorted(type(p).__name__ for p in provider.providers) == ["AnthropicProvider", "GeminiProvider", "GroqProvider"]
+    assert all(p.pacer is not None for p in provider.providers)
@@ -0,0 +1,82 @@
+"""Client-side pacing: budgets learned from headers and throttled retries."""
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.providers.quota import PacedTransport, QuotaPacer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _headers(limit: int, remaining: int, reset: str) -> httpx.Headers:
+    return httpx.Headers({
+        "x-ratelimit-limit-requests": str(limit),
+        "x-ratelimit-remaining-requests": str(remaining),
+        "x-ratelimit-reset-requests": reset,
+    })
+
+
+def test_groq_request_limit_is_paced_per_day():
+    pacer = QuotaPacer("groq", clock=FakeClock())
+
+    pacer.observe(200, _headers(14400, 14400, "0s"), attempt=0)
+
+    assert pacer.buckets["requests"].rate == pytest.approx(14400 / 86400)
+
+
+def test_rate_follows_the_reset_header():
+    pacer = QuotaPacer("groq", clock=FakeClock())
+
+    # One request used, back in 6s: the same 14,400 a day
+    pacer.observe(200, _headers(14400, 14399, "6s"), attempt=0)
+
+    assert pacer.buckets["requests"].rate == pytest.approx(1 / 6)
+
+
+@pytest.mark.anyio
+async def test_throttled_attempt_is_refunded_before_the_retry():
+    pacer = QuotaPacer("test", requests_per_minute=10, backoff=0.0, clock=FakeClock())
+    statuses = iter([429, 200])
+
+    def upstream(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(next(statuses), headers={"retry-after": "0"})
+
+    transport = PacedTransport(pacer)
+    transport._transport = httpx.MockTransport(upstream)
+    async with httpx.AsyncClient(transport=transport) as client:
+        response = await client.post("https://provider.test/v1/messages", content=b"{}")
+
+    assert response.status_code == 200
+    assert pacer.retried == 1
+    # Only the call that went through is charged
+    assert pacer.buckets["requests"].level == 9
+
+
+def test_refund_does_not_overfill_the_bucket():
+    pacer = QuotaPacer("test", requests_per_minute=10, clock=FakeClock())
+
+    pacer.refund(0)
+
+    assert pacer.buckets["requests"].level == 10
+
+
+@pytest.mark.anyio
+async def test_call_cancelled_while_paced_gives_its_reservation_back():
+    pacer = QuotaPacer("test", requests_per_minute=1, retry_budget=120.0)
+    transport = PacedTransport(pacer)
+    transport._transport = httpx.MockTransport(lambda request: httpx.Response(200))
+    async with httpx.AsyncClient(transport=transport) as client:
+        await client.post("https://provider.test/v1/messages", content=b"{}")
+        # The next call waits a minute for the budget; its caller gives up
+        with pytest.raises(TimeoutError):
+            await asyncio.wait_for(client.post("https://provider.test/v1/messages", content=b"{}"), 0.05)
+
+    assert pacer.paced == 1
+    assert pacer.buckets["requests"].level == pytest.approx(0, abs=0.01)
@@ -0,0 +1,48 @@
+"""Sharing one upstream stream between identical calls."""
+import asyncio
+
+import pytest
+
+from app.services.single_flight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+async def _count(n: int):
+    for i in range(n):
+        yield {"i": i}
+        await asyncio.sleep(0)
+
+
+async def test_buffer_stays_within_the_slowest_subscribers_lag():
+    flights = SingleFlight(max_lag=8)
+    fast, slow = flights.stream("k", lambda: _count(200)), flights.stream("k", lambda: _count(200))
+    broadcast = flights._streams["k"]
+    buffered: list[int] = []
+
+    async def read(events, delay):
+        seen = []
+        async for event in events:
+            seen.append(event["i"])
+            buffered.append(len(broadcast.events))
+            await asyncio.sleep(delay)
+        return seen
+
+    got_fast, got_slow = await asyncio.gather(read(fast, 0), read(slow, 0.001))
+
+    assert got_fast == got_slow == list(range(200))
+    assert flights.upstream_calls == 1
+    assert max(buffered) <= 8
+
+
+async def test_stream_that_dropped_events_is_not_joined():
+    flights = SingleFlight(max_lag=4)
+    first = flights.stream("k", lambda: _count(50))
+    assert (await anext(first))["i"] == 0
+    assert (await anext(first))["i"] == 1
+
+    late = [event["i"] async for event in flights.stream("k", lambda: _count(50))]
+    await first.aclose()
+
+    assert late == list(range(50))
+    assert flights.upstream_calls == 2
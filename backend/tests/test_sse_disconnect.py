@@ -0,0 +1,74 @@
+"""A client leaving a stream must cancel the upstream LLM call."""
+import asyncio
+import json
+
+import pytest
+
+from app.main import app
+from app.services import llm
+from app.services.providers.fake_provider import FakeProvider
+from app.services.sse import replays
+
+GRACE = 0.2
+
+
+def _scope(spec_version: str, body: bytes) -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": spec_version},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/api/generate/stream",
+        "raw_path": b"/api/generate/stream",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"host", b"test"),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("test", 80),
+    }
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("spec_version", ["2.3", "2.4"])
+async def test_disconnect_closes_upstream_stream(monkeypatch, spec_version):
+    # Slow enough that the stream is still going when the client leaves
+    fake = FakeProvider(respond=lambda system, user: llm._demo_text(system), chunk_size=4, token_interval=0.05)
+    monkeypatch.setattr(llm, "provider", fake)
+    monkeypatch.setattr(replays, "grace", GRACE)
+
+    body = json.dumps({"prompt": f"disconnect over ASGI {spec_version}", "history": []}).encode()
+    disconnected = asyncio.Event()
+    frames = 0
+
+    async def receive():
+        nonlocal body
+        if body is not None:
+            chunk, body = body, None
+            return {"type": "http.request", "body": chunk, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        # Like a 2.4 server, writes after the disconnect do not raise
+        nonlocal frames
+        if message["type"] == "http.response.body":
+            frames += 1
+
+    task = asyncio.create_task(app(_scope(spec_version, body), receive, send))
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + 2.0
+    while not (frames and fake.open_streams) and loop.time() < deadline:
+        await asyncio.sleep(0.01)
+    assert frames and fake.open_streams == 1
+
+    disconnected.set()
+    left = loop.time()
+    while fake.open_streams and loop.time() - left < GRACE + 0.5:
+        await asyncio.sleep(0.01)
+    assert fake.open_streams == 0
+    await asyncio.wait_for(task, 1.0)
@@ -0,0 +1,71 @@
+"""Scheduler admission of streamed calls, as seen by the client."""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.main import app
+from app.middleware.rate_limit import limiter
+from app.services import llm
+from app.services.providers.fake_provider import FakeProvider
+from app.services.sse import replays
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def _setup(monkeypatch):
+    limiter.reset()
+    monkeypatch.setattr(llm, "provider", FakeProvider(respond=lambda system, user: llm._demo_text(system)))
+    monkeypatch.setattr(llm.scheduler, "capacity", 1)
+    # Heartbeats well within the time a call waits in the queue
+    monkeypatch.setattr(replays, "heartbeat", 0.02)
+
+
+async def _stream(prompt: str) -> httpx.Response:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/api/generate/stream", json={"prompt": prompt, "history": []})
+        await response.aread()
+        return response
+
+
+async def _hold_slot(release: asyncio.Event) -> None:
+    async with llm.scheduler.slot("someone else"):
+        await release.wait()
+
+
+async def test_call_shed_after_heartbeats_still_gets_429(monkeypatch):
+    monkeypatch.setattr(llm.scheduler, "queue_timeout", 0.2)
+    release = asyncio.Event()
+    holder = asyncio.create_task(_hold_slot(release))
+    await asyncio.sleep(0)
+    try:
+        response = await _stream("queued until shed")
+    finally:
+        release.set()
+        await holder
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+async def test_cache_hit_is_not_shed(monkeypatch):
+    first = await _stream("cached answer")
+    assert first.status_code == 200
+
+    release = asyncio.Event()
+    holder = asyncio.create_task(_hold_slot(release))
+    await asyncio.sleep(0)
+    # Every new upstream call would be refused now
+    monkeypatch.setattr(llm.scheduler, "max_queue", 0)
+    try:
+        response = await _stream("cached answer")
+    finally:
+        release.set()
+        await holder
+
+    assert response.status_code == 200
+    frames = [json.loads(line[6:]) for line in response.text.splitlines() if line.startswith("data: {")]
+    assert frames[-1]["type"] == "done"
@@ -0,0 +1,82 @@
+"""SSE frames produced from provider stream events."""
+import json
+
+import pytest
+
+from app.models.actions import AddNodeAction, AIResponse
+from app.models.graph import NodeData
+from app.routes.graph import _stream_sse
+from app.services.layout import GRID_Y
+from app.services.providers.base import ActionEvent, DoneEvent
+
+pytestmark = pytest.mark.anyio
+
+
+def _response() -> AIResponse:
+    return AIResponse.model_validate({
+        "thought_process": "",
+        "summary": "API in front of a database",
+        "actions": [
+            {"op": "add_node", "id": "db", "type": "architecture", "data": {"label": "DB", "nodeType": "database"}},
+            {"op": "add_node", "id": "api", "type": "architecture", "data": {"label": "API", "nodeType": "service"}},
+            {"op": "add_edge", "id": "api-db", "source": "api", "target": "db"},
+            {"op": "update_node", "id": "api", "data": {"label": "Orders API"}},
+        ],
+    })
+
+
+async def _frames(events) -> list[dict]:
+    async def stream():
+        for event in events:
+            yield event
+
+    frames = []
+    async for frame in _stream_sse(stream(), current_graph=None):
+        for line in frame.decode().splitlines():
+            if line.startswith("data: {"):
+                frames.append(json.loads(line[6:]))
+    return frames
+
+
+async def test_done_sends_only_actions_not_streamed_yet():
+    response = _response()
+    # Streamed actions need not be the first ones of the final response
+    streamed = [ActionEvent(action=response.actions[i].model_copy()) for i in (1, 3)]
+
+    frames = await _frames([*streamed, DoneEvent(response=response)])
+
+    sent = [(f["action"]["op"], f["action"]["id"]) for f in frames if f["type"] == "action"]
+    assert sorted(a for a in sent if a[0] != "move_node") == [
+        ("add_edge", "api-db"), ("add_node", "api"), ("add_node", "db"), ("update_node", "api"),
+    ]
+
+
+async def test_action_ids_are_unique():
+    frames = await _frames([DoneEvent(response=_response())])
+
+    done = frames[-1]
+    assert done["type"] == "done"
+    ids = done["response"]["action_ids"]
+    assert ids == list(dict.fromkeys(ids))
+    assert set(ids) == {"db", "api", "api-db"}
+    # The layout moved at least one node, which now appears once
+    assert any(f["type"] == "action" and f["action"]["op"] == "move_node" for f in frames)
+
+
+async def test_rejected_node_leaves_its_provisional_spot_free():
+    def add(node_id: str) -> ActionEvent:
+        data = NodeData(label=node_id, node_type="database")
+        return ActionEvent(action=AddNodeAction(op="add_node", id=node_id, type="architecture", data=data))
+
+    duplicate = add("a")
+    done = DoneEvent(response=AIResponse(thought_process="", summary="", actions=[]))
+    frames = await _frames([add("a"), duplicate, add("b"), done])
+
+    added = {
+        f["action"]["id"]: f["action"]["position"]
+        for f in frames if f["type"] == "action" and f["action"]["op"] == "add_node"
+    }
+    # Second in its column, not third
+    assert added["b"]["y"] == GRID_Y
+    assert duplicate.action.position is None
+    assert frames[-1]["response"]["dropped"] == [{"id": "a", "reason": "Duplicate node ID: a"}]
@@ -69,6 +69,8 @@ export function Dashboard() {
   const projects = useStore((s) => s.projects);
   const projectsLoading = useStore((s) => s.projectsLoading);
   const fetchProjects = useStore((s) => s.fetchProjects);
+  const fetchMoreProjects = useStore((s) => s.fetchMoreProjects);
+  const projectsCursor = useStore((s) => s.projectsCursor);
   const createProject = useStore((s) => s.createProject);
   const deleteProject = useStore((s) => s.deleteProject);
   const renameProject = useStore((s) => s.renameProject);
@@ -275,6 +277,18 @@ export function Dashboard() {
           </motion.div>
         )}
 
+        {/* Older projects are fetched a page at a time */}
+        {!projectsLoading && projectsCursor && (
+          <div className="flex justify-center mt-6">
+            <button
+              onClick={() => fetchMoreProjects().catch(() => toast.error('Failed to load projects'))}
+              className="px-4 py-2 text-sm font-medium text-gray-600 bg-white border border-gray-200 rounded-lg hover:bg-gray-50 transition-colors"
+            >
+              Load more
+            </button>
+          </div>
+        )}
+
         {/* No results for search */}
         {!projectsLoading && projects.length > 0 && filtered.length === 0 && (
           <div className="text-center py-16">
@@ -1,6 +1,6 @@
 import { API_BASE_URL } from './constants';
 import { supabase } from './supabase';
-import type { AIResponse, StreamEvent, ArchReview } from '@/types/actions';
+import type { AIResponse, StreamEvent, ArchReview, GraphAction } from '@/types/actions';
 import type { AppNode, AppEdge } from '@/types/graph';
 import type { Project, Iteration } from '@/types/projects';
 
@@ -41,12 +41,22 @@ async function request<T>(path: string, body: unknown): Promise<T> {
   return res.json();
 }
 
+/** A non-2xx API response; `status` is its HTTP status. */
+export class ApiError extends Error {
+  status: number;
+
+  constructor(message: string, status: number) {
+    super(message);
+    this.status = status;
+  }
+}
+
 async function fetchApi<T>(
   path: string,
-  options: { method?: string; body?: unknown } = {}
+  options: { method?: string; body?: unknown; headers?: Record<string, string> } = {}
 ): Promise<T> {
   const { method = 'GET', body } = options;
-  const headers = await authHeaders();
+  const headers = { ...(await authHeaders()), ...options.headers };
   if (!body) delete headers['Content-Type'];
   const res = await fetch(`${API_BASE_URL}${path}`, {
     method,
@@ -55,9 +65,9 @@ async function fetchApi<T>(
   });
 
   if (!res.ok) {
-    if (res.status === 429) throw new Error('Too many requests. Please wait a moment and try again.');
+    if (res.status === 429) throw new ApiError('Too many requests. Please wait a moment and try again.', 429);
     const error = await res.json().catch(() => ({ detail: 'Network error' }));
-    throw new Error(error.detail ?? `Request failed (${res.status})`);
+    throw new ApiError(error.detail ?? `Request failed (${res.status})`, res.status);
   }
 
   if (method === 'DELETE') return undefined as T;
@@ -82,7 +92,11 @@ export async function modifyGraph(
 
 // ── SSE Streaming API ────────────────────────────────────
 
-async function* readSSE(res: Response): AsyncGenerator<StreamEvent> {
+// A dropped stream is re-requested with Last-Event-ID this many times; the
+// server replays what was missed instead of generating again
+const MAX_STREAM_RESUMES = 3;
+
+async function* readSSE(res: Response, cursor: { lastEventId: string }): AsyncGenerator<StreamEvent> {
   const reader = res.body!.getReader();
   const decoder = new TextDecoder();
   let buffer = '';
@@ -92,33 +106,56 @@ async function* readSSE(res: Response): AsyncGenerator<StreamEvent> {
     if (done) break;
 
     buffer += decoder.decode(value, { stream: true });
-    const lines = buffer.split('\n\n');
-    buffer = lines.pop()!;
-
-    for (const line of lines) {
-      if (line.startsWith('data: ')) {
-        const data = JSON.parse(line.slice(6));
-        yield data as StreamEvent;
+    const blocks = buffer.split('\n\n');
+    buffer = blocks.pop()!;
+
+    for (const block of blocks) {
+      let data = '';
+      for (const line of block.split('\n')) {
+        // Lines starting with ':' are heartbeats
+        if (line.startsWith('data: ')) data += line.slice(6);
+        else if (line.startsWith('id: ')) cursor.lastEventId = line.slice(4);
       }
+      if (data) yield JSON.parse(data) as StreamEvent;
     }
   }
 }
 
-export async function* streamGenerate(prompt: string, history: { role: string; content: string }[] = []): AsyncGenerator<StreamEvent> {
-  const headers = await authHeaders();
-  const res = await fetch(`${API_BASE_URL}/api/generate/stream`, {
-    method: 'POST',
-    headers,
-    body: JSON.stringify({ prompt, history }),
-  });
+async function* streamSSE(path: string, body: unknown): AsyncGenerator<StreamEvent> {
+  const cursor = { lastEventId: '' };
+
+  for (let attempt = 0; ; attempt++) {
+    const headers = await authHeaders();
+    if (cursor.lastEventId) headers['Last-Event-ID'] = cursor.lastEventId;
+    const res = await fetch(`${API_BASE_URL}${path}`, {
+      method: 'POST',
+      headers,
+      body: JSON.stringify(body),
+    });
+
+    if (!res.ok) {
+      if (res.status === 429) throw new Error('Too many requests. Please wait a moment and try again.');
+      const error = await res.json().catch(() => ({ detail: 'Network error' }));
+      throw new Error(error.detail ?? `Request failed (${res.status})`);
+    }
 
-  if (!res.ok) {
-    if (res.status === 429) throw new Error('Too many requests. Please wait a moment and try again.');
-    const error = await res.json().catch(() => ({ detail: 'Network error' }));
-    throw new Error(error.detail ?? `Request failed (${res.status})`);
+    try {
+      for await (const event of readSSE(res, cursor)) {
+        yield event;
+        if (event.type === 'done' || event.type === 'error') return;
+      }
+    } catch (err) {
+      if (!cursor.lastEventId || attempt >= MAX_STREAM_RESUMES) throw err;
+      continue;
+    }
+    // Connection closed before the final event
+    if (!cursor.lastEventId || attempt >= MAX_STREAM_RESUMES) return;
   }
+}
 
-  yield* readSSE(res);
+export async function* streamGenerate(prompt: string, history: { role: string; content: string }[] = []): AsyncGenerator<StreamEvent> {
+  const body: GenerateRequest = { prompt, history };
+  yield* streamSSE('/api/generate/stream', body);
 }
 
 export async function* streamModify(
@@ -127,20 +164,7 @@ export async function* streamModify(
   history: { role: string; content: string }[]
 ): AsyncGenerator<StreamEvent> {
   const body: ModifyRequest = { graph, prompt, history };
-  const headers = await authHeaders();
-  const res = await fetch(`${API_BASE_URL}/api/modify/stream`, {
-    method: 'POST',
-    headers,
-    body: JSON.stringify(body),
-  });
-
-  if (!res.ok) {
-    if (res.status === 429) throw new Error('Too many requests. Please wait a moment and try again.');
-    const error = await res.json().catch(() => ({ detail: 'Network error' }));
-    throw new Error(error.detail ?? `Request failed (${res.status})`);
-  }
-
-  yield* readSSE(res);
+  yield* streamSSE('/api/modify/stream', body);
 }
 
 // ── Review / Scoring ─────────────────────────────────────
@@ -154,9 +178,11 @@ export async function reviewArchitecture(
 
 // ── Projects API ─────────────────────────────────────────
 
-export async function listProjects(): Promise<Project[]> {
-  const data = await fetchApi<{ projects: Project[] }>('/api/projects');
-  return data.projects;
+export type ProjectPage = { projects: Project[]; nextCursor: string | null };
+
+export async function listProjects(cursor?: string | null): Promise<ProjectPage> {
+  const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+  return fetchApi<ProjectPage>(`/api/projects${query}`);
 }
 
 export async function createProject(name: string, description?: string): Promise<Project> {
@@ -189,8 +215,17 @@ export async function createIteration(projectId: string, name: string, nodes: Ap
   });
 }
 
-export async function saveIteration(id: string, nodes: AppNode[], edges: AppEdge[]): Promise<void> {
-  await fetchApi(`/api/iterations/${id}`, { method: 'PUT', body: { nodes, edges } });
+/** Replace the iteration's graph; with `baseSeq` it fails with 412 if the iteration moved past it. */
+export async function saveIteration(id: string, nodes: AppNode[], edges: AppEdge[], baseSeq?: number): Promise<number> {
+  const headers: Record<string, string> = baseSeq === undefined ? {} : { 'If-Match': `"v${baseSeq}"` };
+  const data = await fetchApi<{ seq: number }>(`/api/iterations/${id}`, { method: 'PUT', body: { nodes, edges }, headers });
+  return data.seq;
+}
+
+/** Append edits to the iteration's op log; fails with 409 if it moved past baseSeq. */
+export async function patchIteration(id: string, actions: GraphAction[], baseSeq: number): Promise<number> {
+  const data = await fetchApi<{ seq: number }>(`/api/iterations/${id}`, { method: 'PATCH', body: { actions, baseSeq } });
+  return data.seq;
 }
 
 // ── Legacy graph API (kept for backward compat) ──────────
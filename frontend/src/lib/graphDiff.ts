@@ -0,0 +1,57 @@
+import type { AppNode, AppEdge } from '@/types/graph';
+import type { GraphAction } from '@/types/actions';
+
+const same = (a: unknown, b: unknown) => JSON.stringify(a) === JSON.stringify(b);
+
+/** Actions that turn the `prev` graph into the `next` one (for iteration patches). */
+export function diffGraph(
+  prev: { nodes: AppNode[]; edges: AppEdge[] },
+  next: { nodes: AppNode[]; edges: AppEdge[] },
+): GraphAction[] {
+  const actions: GraphAction[] = [];
+  const prevNodes = new Map(prev.nodes.map((n) => [n.id, n]));
+  const prevEdges = new Map(prev.edges.map((e) => [e.id, e]));
+  const nextNodeIds = new Set(next.nodes.map((n) => n.id));
+  const nextEdgeIds = new Set(next.edges.map((e) => e.id));
+
+  // Removing a node also removes its edges on the server, so edges go first
+  for (const e of prev.edges) {
+    if (!nextEdgeIds.has(e.id)) actions.push({ op: 'remove_edge', id: e.id });
+  }
+  for (const n of prev.nodes) {
+    if (!nextNodeIds.has(n.id)) actions.push({ op: 'remove_node', id: n.id });
+  }
+
+  for (const n of next.nodes) {
+    const old = prevNodes.get(n.id);
+    if (!old) {
+      actions.push({ op: 'add_node', id: n.id, type: n.type ?? n.data.nodeType, position: n.position, data: n.data });
+      continue;
+    }
+    if (old.position.x !== n.position.x || old.position.y !== n.position.y) {
+      actions.push({ op: 'move_node', id: n.id, position: n.position });
+    }
+    if (!same(old.data, n.data)) {
+      actions.push({ op: 'update_node', id: n.id, data: n.data });
+    }
+  }
+
+  for (const e of next.edges) {
+    const old = prevEdges.get(e.id);
+    if (!old) {
+      actions.push({
+        op: 'add_edge',
+        id: e.id,
+        source: e.source,
+        target: e.target,
+        data: e.data,
+        sourceHandle: e.sourceHandle ?? undefined,
+        targetHandle: e.targetHandle ?? undefined,
+      });
+    } else if (!same(old.data, e.data)) {
+      actions.push({ op: 'update_edge', id: e.id, data: e.data ?? {} });
+    }
+  }
+
+  return actions;
+}
@@ -1,5 +1,5 @@
 import type { StateCreator } from 'zustand';
-import type { ChatMessage, ToolCallState } from '@/types/actions';
+import type { ChatMessage, StreamDoneResponse, ToolCallState } from '@/types/actions';
 import type { AppStore } from './index';
 import { streamGenerate, streamModify } from '@/lib/api';
 import { toast } from 'sonner';
@@ -70,7 +70,8 @@ export const createChatSlice: StateCreator<AppStore, [['zustand/immer', never]],
         ? streamGenerate(prompt, chatHistory)
         : streamModify({ nodes, edges }, prompt, chatHistory);
 
-      let finalResponse = null;
+      let finalResponse: StreamDoneResponse | null = null;
+      let hasNewNodes = false;
 
       for await (const event of stream) {
         switch (event.type) {
@@ -102,6 +103,12 @@ export const createChatSlice: StateCreator<AppStore, [['zustand/immer', never]],
             });
             break;
 
+          case 'action':
+            // Apply each validated action as soon as it arrives
+            get().applyPatch([event.action]);
+            if (event.action.op === 'add_node') hasNewNodes = true;
+            break;
+
           case 'done':
             finalResponse = event.response;
             break;
@@ -115,11 +122,7 @@ export const createChatSlice: StateCreator<AppStore, [['zustand/immer', never]],
         throw new Error('Stream ended without a response');
       }
 
-      // Apply the patch
-      const hasNewNodes = finalResponse.actions.some((a) => a.op === 'add_node');
-      if (finalResponse.actions.length > 0) {
-        get().applyPatch(finalResponse.actions);
-      } else {
+      if (finalResponse.action_ids.length === 0) {
         // No actions = undo the empty snapshot
         set((state) => {
           if (state.past.length > 0) {
@@ -129,7 +132,7 @@ export const createChatSlice: StateCreator<AppStore, [['zustand/immer', never]],
       }
 
       const summary = finalResponse.summary
-        || (finalResponse.actions.length === 0
+        || (finalResponse.action_ids.length === 0
           ? "I understood your request but didn't generate any changes. Could you be more specific?"
           : 'Done.');
 
@@ -161,10 +164,13 @@ export const createChatSlice: StateCreator<AppStore, [['zustand/immer', never]],
         state.error = message;
         state.lastFailedPrompt = prompt;
       });
-      // Remove the snapshot since we failed
+      // Remove the snapshot since we failed, rolling back any actions
+      // that were already applied mid-stream
       set((state) => {
-        if (state.past.length > 0) {
-          state.past.pop();
+        const snapshot = state.past.pop();
+        if (snapshot) {
+          state.nodes = snapshot.nodes;
+          state.edges = snapshot.edges;
         }
       });
       toast.error('AI request failed', { description: message });
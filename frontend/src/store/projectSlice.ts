@@ -9,16 +9,28 @@ import {
   getIteration,
   createIteration as apiCreateIteration,
   saveIteration,
+  patchIteration,
+  ApiError,
 } from '@/lib/api';
+import { diffGraph } from '@/lib/graphDiff';
+import type { AppNode, AppEdge } from '@/types/graph';
 import { toast } from 'sonner';
 
+// The server copy moved on since `savedGraph` was loaded (edited elsewhere)
+const isConflict = (err: unknown) => err instanceof ApiError && (err.status === 409 || err.status === 412);
+
 export type ProjectSlice = {
   projects: Project[];
   projectsLoading: boolean;
+  /** Cursor of the next page of projects, null when all are loaded */
+  projectsCursor: string | null;
   currentProject: Project | null;
   currentIteration: Iteration | null;
+  /** Graph as last loaded/saved, the base for delta saves */
+  savedGraph: { nodes: AppNode[]; edges: AppEdge[]; seq: number } | null;
 
   fetchProjects: () => Promise<void>;
+  fetchMoreProjects: () => Promise<void>;
   createProject: (name: string, description?: string) => Promise<string>;
   deleteProject: (id: string) => Promise<void>;
   renameProject: (id: string, name: string) => Promise<void>;
@@ -31,15 +43,18 @@ export type ProjectSlice = {
 export const createProjectSlice: StateCreator<AppStore, [['zustand/immer', never]], [], ProjectSlice> = (set, get) => ({
   projects: [],
   projectsLoading: false,
+  projectsCursor: null,
   currentProject: null,
   currentIteration: null,
+  savedGraph: null,
 
   fetchProjects: async () => {
     set((state) => { state.projectsLoading = true; });
     try {
-      const projects = await listProjects();
+      const page = await listProjects();
       set((state) => {
-        state.projects = projects;
+        state.projects = page.projects;
+        state.projectsCursor = page.nextCursor;
         state.projectsLoading = false;
       });
     } catch {
@@ -47,6 +62,17 @@ export const createProjectSlice: StateCreator<AppStore, [['zustand/immer', never
     }
   },
 
+  fetchMoreProjects: async () => {
+    const cursor = get().projectsCursor;
+    if (!cursor) return;
+    const page = await listProjects(cursor);
+    set((state) => {
+      const seen = new Set(state.projects.map((p) => p.id));
+      state.projects.push(...page.projects.filter((p) => !seen.has(p.id)));
+      state.projectsCursor = page.nextCursor;
+    });
+  },
+
   createProject: async (name, description) => {
     const project = await apiCreateProject(name, description);
     set((state) => {
@@ -87,6 +113,7 @@ export const createProjectSlice: StateCreator<AppStore, [['zustand/immer', never
       // Load nodes/edges into graph state
       state.nodes = detail.nodes;
       state.edges = detail.edges;
+      state.savedGraph = { nodes: detail.nodes, edges: detail.edges, seq: detail.seq ?? 0 };
     });
   },
 
@@ -95,6 +122,7 @@ export const createProjectSlice: StateCreator<AppStore, [['zustand/immer', never
     const iter = await apiCreateIteration(projectId, name, nodes, edges);
     set((state) => {
       state.currentIteration = iter;
+      state.savedGraph = { nodes, edges, seq: iter.seq ?? 0 };
       const p = state.projects.find((p) => p.id === projectId);
       if (p) p.iterationCount = (p.iterationCount ?? 0) + 1;
     });
@@ -102,9 +130,33 @@ export const createProjectSlice: StateCreator<AppStore, [['zustand/immer', never
   },
 
   saveCurrentIteration: async () => {
-    const { currentIteration, nodes, edges } = get();
+    const { currentIteration, savedGraph, nodes, edges } = get();
     if (!currentIteration) return;
-    await saveIteration(currentIteration.id, nodes, edges);
+    let seq: number;
+    if (savedGraph) {
+      // Send only what changed since the last save; fall back to a full
+      // save if the patch failed for any reason but a conflict. Both are
+      // conditional on the copy we started from.
+      const actions = diffGraph(savedGraph, { nodes, edges });
+      if (actions.length === 0) return;
+      try {
+        try {
+          seq = await patchIteration(currentIteration.id, actions, savedGraph.seq);
+        } catch (err) {
+          if (isConflict(err)) throw err;
+          seq = await saveIteration(currentIteration.id, nodes, edges, savedGraph.seq);
+        }
+      } catch (err) {
+        if (!isConflict(err)) throw err;
+        // Overwriting would drop the other edits: show the server copy instead
+        toast.error(`"${currentIteration.name}" was changed elsewhere; reloaded the latest version`);
+        await get().loadIteration(currentIteration.id);
+        return;
+      }
+    } else {
+      seq = await saveIteration(currentIteration.id, nodes, edges);
+    }
+    set((state) => { state.savedGraph = { nodes, edges, seq }; });
   },
 
   setCurrentProject: (project) => {
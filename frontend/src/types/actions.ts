@@ -31,6 +31,8 @@ export type AddEdgeAction = {
   source: string;
   target: string;
   data?: EdgeData;
+  sourceHandle?: string;
+  targetHandle?: string;
 };
 
 export type RemoveEdgeAction = {
@@ -59,6 +61,14 @@ export type AIResponse = {
   summary: string;
 };
 
+// Final stream payload: actions were already delivered as `action` events
+export type StreamDoneResponse = {
+  thought_process: string;
+  summary: string;
+  action_ids: string[];
+  dropped: { id: string; reason: string }[];
+};
+
 export type ChatMessage = {
   id: string;
   role: 'user' | 'assistant';
@@ -73,7 +83,8 @@ export type StreamEvent =
   | { type: 'token'; token: string }
   | { type: 'tool_start'; name: string; input: Record<string, unknown> }
   | { type: 'tool_end'; name: string; output: Record<string, unknown> }
-  | { type: 'done'; response: AIResponse }
+  | { type: 'action'; action: GraphAction }
+  | { type: 'done'; response: StreamDoneResponse }
   | { type: 'error'; message: string };
 
 export type ToolCallState = {
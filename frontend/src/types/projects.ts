@@ -23,4 +23,6 @@ export type Iteration = {
   ordinal: number;
   createdAt: string;
   updatedAt: string;
+  /** Op-log position of the saved graph (see PATCH /api/iterations/{id}) */
+  seq?: number;
 };